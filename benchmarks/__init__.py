@@ -0,0 +1,13 @@
+"""
+Benchmarks for the slowest steps of a model build.
+
+The benchmarks run on synthetic data (see generators.py) shaped like the real
+inputs - facility emissions, EIA-923 generation, EPA CEMS daily files, the EIA
+bulk EBA.txt file and upstream inventories - so they run offline and at any
+size from a thousand to ten million rows. run.py times each function and can
+compare the timings with a saved baseline to catch performance regressions.
+
+Usage:
+    python -m benchmarks.run --rows 100k --output results.json
+    python -m benchmarks.run --rows 100k --baseline results.json
+"""
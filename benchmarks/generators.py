@@ -0,0 +1,995 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic inputs for the benchmarks.
+
+Each generator returns data with the columns, dtypes and value patterns of one
+of the real inputs of a model build, with a given number of rows (anywhere
+from 1k to 10M). Balancing authorities, eGRID subregions and states are the
+real ones from the data folder; plants, flows and amounts are random. The
+generators are seeded, so the same arguments always give the same data.
+"""
+import json
+import uuid
+import zipfile
+from functools import lru_cache
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from electricitylci.globals import data_dir, set_dir
+
+# Fuel categories with the EIA-923 fuel codes used for them and the share of
+# plants that have them as primary fuel.
+FUELS = {
+    "COAL": (["BIT", "SUB", "LIG"], 0.12),
+    "GAS": (["NG"], 0.30),
+    "OIL": (["DFO", "RFO"], 0.08),
+    "NUCLEAR": (["NUC"], 0.02),
+    "HYDRO": (["WAT"], 0.12),
+    "WIND": (["WND"], 0.12),
+    "SOLAR": (["SUN"], 0.12),
+    "BIOMASS": (["WDS", "LFG"], 0.07),
+    "GEOTHERMAL": (["GEO"], 0.02),
+    "OTHF": (["WH"], 0.03),
+}
+
+PRIME_MOVERS = {
+    "BIT": ["ST"],
+    "SUB": ["ST"],
+    "LIG": ["ST"],
+    "NG": ["CT", "CA", "GT", "ST"],
+    "DFO": ["IC", "GT"],
+    "RFO": ["ST"],
+    "NUC": ["ST"],
+    "WAT": ["HY"],
+    "WND": ["WT"],
+    "SUN": ["PV"],
+    "WDS": ["ST"],
+    "LFG": ["IC"],
+    "GEO": ["ST"],
+    "WH": ["CA"],
+}
+
+# Upstream processes (stage codes as used by the upstream modules) for the
+# fuels that have them, with the product flow and unit of their reference
+# exchange.
+UPSTREAM_STAGES = {
+    "COAL": (
+        ["CA-B-U", "NA-B-U", "IB-B-U", "PRB-S-S", "GL-L-S", "RM-S-S"],
+        "coal, through cleaning",
+        "sh tn",
+    ),
+    "GAS": (
+        ["Appalachian", "Permian", "Gulf", "Anadarko", "East Texas", "Uinta"],
+        "natural gas, through transmission",
+        "MJ",
+    ),
+    "OIL": (
+        ["DFO_1", "DFO_3", "RFO_1", "RFO_5"],
+        "petroleum fuel, through transportation",
+        "MJ",
+    ),
+    "NUCLEAR": (["Nuclear"], "nuclear fuel, through transportation", "MWh"),
+}
+
+UPSTREAM_CATEGORIES = {
+    "COAL": "21: Mining, Quarrying, and Oil and Gas Extraction/2121: Coal Mining",
+    "GAS": "21: Mining, Quarrying, and Oil and Gas Extraction/2111: Oil and Gas Extraction",
+    "OIL": "21: Mining, Quarrying, and Oil and Gas Extraction/2111: Oil and Gas Extraction",
+    "NUCLEAR": "21: Mining, Quarrying, and Oil and Gas Extraction/2122: Metal Ore Mining",
+}
+
+# Flows reported by power plants: name, compartment, inventories that report
+# it and a typical emission factor in kg/MWh.
+NAMED_FLOWS = [
+    ("Carbon dioxide", "air", ("eGRID", "NEI"), 500.0),
+    ("Sulfur dioxide", "air", ("eGRID", "NEI"), 0.5),
+    ("Nitrogen oxides", "air", ("eGRID", "NEI"), 0.4),
+    ("Methane", "air", ("eGRID", "NEI"), 0.01),
+    ("Nitrous oxide", "air", ("eGRID", "NEI"), 0.005),
+    ("Carbon monoxide", "air", ("NEI",), 0.2),
+    ("Particulate matter, < 2.5 um", "air", ("NEI",), 0.05),
+    ("Particulate matter, < 10 um", "air", ("NEI",), 0.07),
+    ("Volatile organic compounds", "air", ("NEI",), 0.01),
+    ("Ammonia", "air", ("NEI", "TRI"), 0.005),
+    ("Mercury", "air", ("NEI", "TRI"), 1e-5),
+    ("Lead", "air", ("NEI", "TRI"), 1e-5),
+    ("Hydrochloric acid", "air", ("NEI", "TRI"), 0.01),
+    ("Sulfuric acid", "air", ("NEI", "TRI"), 0.01),
+    ("Barium", "water", ("TRI",), 1e-4),
+    ("Zinc", "water", ("TRI",), 1e-4),
+    ("Arsenic", "ground", ("TRI",), 1e-5),
+]
+N_CHEMICALS = 300
+N_WASTES = 30
+
+# Average number of rows per plant in the facility-level frames
+ROWS_PER_FACILITY = 40
+
+CEMS_COLUMNS = [
+    "STATE",
+    "FACILITY_NAME",
+    "ORISPL_CODE",
+    "UNITID",
+    "OP_DATE",
+    "SUM_OP_TIME",
+    "COUNT_OP_TIME",
+    "GLOAD (MWh)",
+    "SLOAD (1000 lbs)",
+    "SO2_MASS (tons)",
+    "SO2_RATE (lbs/mmBtu)",
+    "NOX_RATE (lbs/mmBtu)",
+    "NOX_MASS (tons)",
+    "CO2_MASS (tons)",
+    "CO2_RATE (tons/mmBtu)",
+    "HEAT_INPUT (mmBtu)",
+    "FAC_ID",
+    "UNIT_ID",
+]
+
+
+def parse_rows(text):
+    """Read a row count such as "5000", "100k" or "10M"."""
+    text = str(text).strip()
+    factor = {"k": 1000, "m": 1000000}.get(text[-1:].lower())
+    if factor:
+        return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+@lru_cache(maxsize=1)
+def balancing_authorities():
+    """US balancing authorities with their FERC and EIA regions."""
+    df = pd.read_excel(
+        join(data_dir, "BA_Codes_930.xlsx"), sheet_name="US", header=4
+    )
+    df = df.rename(
+        columns={
+            "etag ID": "Balancing Authority Code",
+            "Entity Name": "Balancing Authority Name",
+        }
+    )
+    return df[
+        [
+            "Balancing Authority Code",
+            "Balancing Authority Name",
+            "FERC_Region",
+            "EIA_Region",
+        ]
+    ].reset_index(drop=True)
+
+
+@lru_cache(maxsize=1)
+def egrid_subregions():
+    """eGRID subregions and their NERC regions."""
+    return pd.read_csv(join(data_dir, "egrid_subregion_to_NERC.csv"))
+
+
+def _flow_uuid(name, compartment_path):
+    return str(uuid.uuid3(uuid.NAMESPACE_OID, f"{name}/{compartment_path}"))
+
+
+@lru_cache(maxsize=1)
+def flow_pool():
+    """
+    The flows used in the synthetic inventories: a set of real criteria
+    pollutants, greenhouse gases and metals, plus numbered TRI chemicals and
+    RCRAInfo wastes. A few chemicals have no flow UUID, as happens with flows
+    that can't be mapped to the federal flow list.
+
+    Returns
+    -------
+    dataframe
+        FlowName, FlowUUID, Compartment, Compartment_path, Sources (a
+        tuple), n_sources and EF (typical kg/MWh).
+    """
+    rng = np.random.default_rng(0)
+    flows = list(NAMED_FLOWS)
+    compartments = ["air", "water", "ground"]
+    for i in range(N_CHEMICALS):
+        compartment = compartments[i % 3]
+        sources = ("NEI", "TRI") if compartment == "air" and i % 2 else ("TRI",)
+        flows.append(
+            (f"Chemical {i:03d}", compartment, sources, 10 ** rng.uniform(-7, -3))
+        )
+    for i in range(N_WASTES):
+        flows.append(
+            (f"Hazardous waste {i:02d}", "waste", ("RCRAInfo",), 10 ** rng.uniform(-4, 0))
+        )
+    df = pd.DataFrame(
+        flows, columns=["FlowName", "Compartment", "Sources", "EF"]
+    )
+    df["Compartment_path"] = np.where(
+        df["Compartment"] == "waste", "waste", "emission/" + df["Compartment"]
+    )
+    df["FlowUUID"] = [
+        _flow_uuid(n, c) for n, c in zip(df["FlowName"], df["Compartment_path"])
+    ]
+    unmapped = df["FlowName"].str.startswith("Chemical") & (df.index % 25 == 0)
+    df.loc[unmapped, "FlowUUID"] = np.nan
+    df["n_sources"] = df["Sources"].map(len)
+    return df
+
+
+def _pick(rng, values, size, p=None):
+    values = np.asarray(values, dtype=object)
+    return values[rng.choice(len(values), size, p=p)]
+
+
+def plants(n_plants, seed=0):
+    """
+    Power plants with their location, primary fuel and annual generation.
+
+    Parameters
+    ----------
+    n_plants : int
+    seed : int, optional
+
+    Returns
+    -------
+    dataframe
+        Plant Id, Plant Name, State, Subregion, NERC, Balancing Authority
+        Code, Balancing Authority Name, FERC_Region, EIA_Region,
+        FuelCategory, PrimaryFuel and Electricity (MWh).
+    """
+    from electricitylci.cems_data import cems_states
+
+    rng = np.random.default_rng(seed)
+    bas = balancing_authorities()
+    subregions = egrid_subregions()
+    fuel_names = list(FUELS)
+    shares = np.array([FUELS[f][1] for f in fuel_names])
+    fuel = _pick(rng, fuel_names, n_plants, p=shares / shares.sum())
+    primary_fuel = np.empty(n_plants, dtype=object)
+    for name in fuel_names:
+        is_fuel = fuel == name
+        primary_fuel[is_fuel] = _pick(rng, FUELS[name][0], is_fuel.sum())
+    ba_idx = rng.integers(0, len(bas), n_plants)
+    sub_idx = rng.integers(0, len(subregions), n_plants)
+    # Unique, increasing but not consecutive plant ids
+    plant_id = 1 + 3 * np.arange(n_plants) + rng.integers(0, 3, n_plants)
+    df = pd.DataFrame(
+        {
+            "Plant Id": plant_id,
+            "Plant Name": [f"Plant {i}" for i in plant_id],
+            "State": _pick(rng, list(cems_states), n_plants),
+            "Subregion": subregions["Subregion"].to_numpy()[sub_idx],
+            "NERC": subregions["NERC"].to_numpy()[sub_idx],
+            "FuelCategory": fuel,
+            "PrimaryFuel": primary_fuel,
+            "Electricity": np.round(rng.lognormal(12, 1.5, n_plants), 3),
+        }
+    )
+    for col in bas.columns:
+        df[col] = bas[col].to_numpy()[ba_idx]
+    return df
+
+
+def _upstream_input_rows(rng, fuel):
+    """Stage codes, flow names and units for fuel input rows of plants."""
+    n = len(fuel)
+    stage_code = np.empty(n, dtype=object)
+    flow_name = np.empty(n, dtype=object)
+    unit = np.empty(n, dtype=object)
+    for name, (stages, product, product_unit) in UPSTREAM_STAGES.items():
+        is_fuel = fuel == name
+        stage_code[is_fuel] = _pick(rng, stages, is_fuel.sum())
+        flow_name[is_fuel] = product
+        unit[is_fuel] = product_unit
+    return stage_code, flow_name, unit
+
+
+def facility_emissions(n_rows, year=2016, seed=0):
+    """
+    Facility-level emissions, as returned by
+    alt_generation.create_generation_process_df: one row per plant, flow and
+    source inventory, plus fuel input rows for coal, gas, oil and nuclear
+    plants whose stage_code is an upstream process.
+
+    Parameters
+    ----------
+    n_rows : int
+    year : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    dataframe
+    """
+    rng = np.random.default_rng(seed)
+    plant_df = plants(max(10, n_rows // ROWS_PER_FACILITY), seed)
+    flows = flow_pool()
+
+    fuel = plant_df["FuelCategory"].to_numpy()
+    upstream_plants = np.flatnonzero(np.isin(fuel, list(UPSTREAM_STAGES)))
+    n_inputs = n_rows // 50 if len(upstream_plants) else 0
+    n_emissions = n_rows - n_inputs
+
+    # Emissions: each row reports a random flow in one of the inventories
+    # that cover it, so flows reported by several inventories show up with
+    # different sources at different plants.
+    plant_idx = rng.integers(0, len(plant_df), n_emissions)
+    flow_idx = rng.integers(0, len(flows), n_emissions)
+    sources = np.array(
+        [list(s) + [s[0]] * (3 - len(s)) for s in flows["Sources"]], dtype=object
+    )
+    source_pos = (
+        rng.random(n_emissions) * flows["n_sources"].to_numpy()[flow_idx]
+    ).astype(int)
+    emissions = pd.DataFrame(
+        {
+            "plant": plant_idx,
+            "Source": sources[flow_idx, source_pos],
+            "FlowName": flows["FlowName"].to_numpy()[flow_idx],
+            "FlowUUID": flows["FlowUUID"].to_numpy()[flow_idx],
+            "Compartment": flows["Compartment"].to_numpy()[flow_idx],
+            "Compartment_path": flows["Compartment_path"].to_numpy()[flow_idx],
+            "FlowAmount": (
+                plant_df["Electricity"].to_numpy()[plant_idx]
+                * flows["EF"].to_numpy()[flow_idx]
+                * rng.lognormal(0, 1, n_emissions)
+            ),
+            "Unit": "kg",
+            "stage_code": "Power plant",
+        }
+    )
+
+    input_plant_idx = (
+        rng.choice(upstream_plants, n_inputs) if n_inputs else np.array([], dtype=int)
+    )
+    stage_code, flow_name, unit = _upstream_input_rows(
+        rng, fuel[input_plant_idx]
+    )
+    inputs = pd.DataFrame(
+        {
+            "plant": input_plant_idx,
+            "Source": "netl",
+            "FlowName": flow_name,
+            "FlowUUID": np.nan,
+            "Compartment": "input",
+            "Compartment_path": "input",
+            "FlowAmount": (
+                plant_df["Electricity"].to_numpy()[input_plant_idx]
+                * rng.lognormal(2, 0.5, n_inputs)
+            ),
+            "Unit": unit,
+            "stage_code": stage_code,
+        }
+    )
+    df = pd.concat([emissions, inputs], ignore_index=True)
+    plant_rows = plant_df.iloc[df["plant"].to_numpy()].reset_index(drop=True)
+    df = pd.concat([plant_rows, df.drop(columns="plant")], axis=1)
+    df = df.rename(columns={"Plant Id": "eGRID_ID"})
+    df["FacilityID"] = df["eGRID_ID"]
+    df["Year"] = year
+    for col in ["ReliabilityScore", "TemporalCorrelation", "TechnologicalCorrelation"]:
+        df[col] = rng.integers(1, 6, len(df)).astype(float)
+    df["DataCollection"] = 5
+    df["GeographicalCorrelation"] = 1
+    df = df.drop(columns="Plant Name")
+    df.sort_values(
+        by=["eGRID_ID", "Compartment", "FlowName"], inplace=True, kind="stable"
+    )
+    return df.reset_index(drop=True)
+
+
+def aggregated_emissions(n_rows, year=2016, seed=0):
+    """
+    Emission factors by balancing authority and fuel category, as returned by
+    alt_generation.aggregate_data(subregion="BA"), the input of
+    alt_generation.olcaschema_genprocess.
+
+    Parameters
+    ----------
+    n_rows : int
+    year : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    dataframe
+    """
+    rng = np.random.default_rng(seed)
+    flows = flow_pool()
+    ba_names = balancing_authorities()["Balancing Authority Name"].to_numpy()
+    fuel_names = np.array(list(FUELS), dtype=object)
+    n_combinations = len(ba_names) * len(fuel_names)
+    n_processes = min(max(1, n_rows // 100), n_combinations)
+    process = rng.choice(n_combinations, n_processes, replace=False)
+    process_idx = np.sort(rng.integers(0, n_processes, n_rows))
+    region = ba_names[process[process_idx] // len(fuel_names)]
+    fuel = fuel_names[process[process_idx] % len(fuel_names)]
+
+    flow_idx = rng.integers(0, len(flows), n_rows)
+    is_input = (rng.random(n_rows) < 0.05) & np.isin(fuel, list(UPSTREAM_STAGES))
+    stage_code, input_name, _ = _upstream_input_rows(rng, np.where(is_input, fuel, ""))
+    source_string = np.array(
+        ["_".join(sorted(s)) for s in flows["Sources"]], dtype=object
+    )
+    df = pd.DataFrame(
+        {
+            "Balancing Authority Name": region,
+            "FuelCategory": fuel,
+            "stage_code": np.where(is_input, stage_code, "Power plant"),
+            "FlowName": np.where(
+                is_input, input_name, flows["FlowName"].to_numpy()[flow_idx]
+            ),
+            "Compartment": np.where(
+                is_input, "input", flows["Compartment"].to_numpy()[flow_idx]
+            ),
+            "FlowUUID": np.where(
+                is_input, np.nan, flows["FlowUUID"].to_numpy()[flow_idx]
+            ),
+            "Year": year,
+            "source_string": np.where(
+                is_input, "netl", source_string[flow_idx]
+            ),
+        }
+    )
+    count = rng.integers(1, 40, n_rows)
+    emission_factor = flows["EF"].to_numpy()[flow_idx] * rng.lognormal(0, 1, n_rows)
+    emission_factor[is_input] = rng.lognormal(2, 0.5, is_input.sum())
+    electricity_sum = rng.lognormal(15, 1.5, n_rows)
+    df["FlowAmount"] = emission_factor * electricity_sum
+    df["FlowAmountCount"] = count
+    for col in [
+        "TemporalCorrelation",
+        "TechnologicalCorrelation",
+        "GeographicalCorrelation",
+        "DataCollection",
+        "ReliabilityScore",
+    ]:
+        df[col] = rng.uniform(1, 5, n_rows)
+    df["uncertaintyMin"] = emission_factor * rng.uniform(0.1, 0.9, n_rows)
+    df["uncertaintyMax"] = emission_factor * rng.uniform(1.1, 5, n_rows)
+    has_params = (count > 3) & ~is_input
+    upper = emission_factor * rng.uniform(1.5, 4, n_rows)
+    df["electricity_sum"] = electricity_sum
+    df["electricity_mean"] = electricity_sum / count
+    df["facility_count"] = count
+    df["Emission_factor"] = emission_factor
+    geom_sd = np.exp(np.log(upper / emission_factor) / 1.6448536269514722)
+    df["GeomMean"] = np.where(has_params, emission_factor, np.nan)
+    df["GeomSD"] = np.where(has_params, geom_sd, np.nan)
+    return df
+
+
+def eia_generation(n_rows, year=2016, seed=0):
+    """
+    EIA-923 generation and fuel data and the matching EIA-860 plant data.
+
+    Parameters
+    ----------
+    n_rows : int
+        Approximate number of EIA-923 rows.
+    year : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    tuple
+        (EIA-923 dataframe, as returned by
+        eia923_generation.eia923_download_extract, EIA-860 dataframe, as
+        returned by eia860_facilities.eia860_plant)
+    """
+    rng = np.random.default_rng(seed)
+    plant_df = plants(max(10, n_rows // 3), seed)
+    plant_idx = np.sort(rng.integers(0, len(plant_df), n_rows))
+    all_codes = [code for codes, _ in FUELS.values() for code in codes]
+    # Most of a plant's generation is from its primary fuel
+    fuel_code = np.where(
+        rng.random(n_rows) < 0.8,
+        plant_df["PrimaryFuel"].to_numpy()[plant_idx],
+        _pick(rng, all_codes, n_rows),
+    )
+    prime_mover = np.empty(n_rows, dtype=object)
+    for code, movers in PRIME_MOVERS.items():
+        is_code = fuel_code == code
+        prime_mover[is_code] = _pick(rng, movers, is_code.sum())
+    generation = (
+        plant_df["Electricity"].to_numpy()[plant_idx]
+        * rng.uniform(0.05, 1, n_rows)
+    )
+    efficiency = rng.uniform(25, 45, n_rows)
+    eia923 = pd.DataFrame(
+        {
+            "Plant Id": plant_df["Plant Id"].to_numpy()[plant_idx].astype(str),
+            "Plant Name": plant_df["Plant Name"].to_numpy()[plant_idx],
+            "State": plant_df["State"].to_numpy()[plant_idx],
+            "NAICS Code": "22",
+            "Reported Prime Mover": prime_mover,
+            "Reported Fuel Type Code": fuel_code,
+            "YEAR": str(year),
+            "Total Fuel Consumption MMBtu": generation * 1000 / (3.412 * efficiency),
+            "Net Generation (Megawatthours)": generation,
+        }
+    )
+    group_cols = list(eia923.columns[:7])
+    eia923 = eia923.groupby(group_cols, as_index=False)[
+        ["Total Fuel Consumption MMBtu", "Net Generation (Megawatthours)"]
+    ].sum()
+    eia860 = plant_df.rename(columns={"NERC": "NERC Region"})[
+        [
+            "Plant Id",
+            "Plant Name",
+            "State",
+            "NERC Region",
+            "Balancing Authority Code",
+            "Balancing Authority Name",
+        ]
+    ].copy()
+    eia860["Plant Id"] = eia860["Plant Id"].astype(str)
+    return eia923, eia860
+
+
+def cems_daily(n_rows, state="OH", year=2016, qtr=1, seed=0):
+    """
+    One EPA CEMS daily emissions file (the contents of
+    epacems<year><state><qtr>.zip): a row per unit and operating day.
+
+    Parameters
+    ----------
+    n_rows : int
+    state : str, optional
+    year : int, optional
+    qtr : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    dataframe
+        With the column names of the CSV file.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(year=year, month=3 * qtr - 2, day=1)
+    days = pd.date_range(start, start + pd.offsets.QuarterEnd(), freq="D")
+    day_idx = np.arange(n_rows) % len(days)
+    unit = np.arange(n_rows) // len(days)
+    # About four units per plant
+    plant = unit // 4
+    plant_id = 1 + 3 * plant + seed % 3
+    op_time = np.round(rng.uniform(0, 24, n_rows), 2)
+    heat_input = op_time * rng.lognormal(7, 1, n_rows)
+    gross_load = heat_input / rng.uniform(8, 12, n_rows)
+    so2_rate = rng.lognormal(-3, 1.5, n_rows)
+    nox_rate = rng.lognormal(-2.5, 0.8, n_rows)
+    co2_rate = rng.uniform(0.055, 0.105, n_rows)
+    steam_load = np.where(rng.random(n_rows) < 0.1, gross_load * 7, np.nan)
+    return pd.DataFrame(
+        {
+            "STATE": state,
+            "FACILITY_NAME": [f"Plant {i}" for i in plant_id],
+            "ORISPL_CODE": plant_id,
+            "UNITID": (unit % 4 + 1).astype(str),
+            "OP_DATE": days.strftime("%m-%d-%Y")[day_idx],
+            "SUM_OP_TIME": op_time,
+            "COUNT_OP_TIME": np.ceil(op_time).astype(int),
+            "GLOAD (MWh)": np.round(gross_load, 1),
+            "SLOAD (1000 lbs)": np.round(steam_load, 1),
+            "SO2_MASS (tons)": np.round(so2_rate * heat_input / 2000, 4),
+            "SO2_RATE (lbs/mmBtu)": np.round(so2_rate, 3),
+            "NOX_RATE (lbs/mmBtu)": np.round(nox_rate, 3),
+            "NOX_MASS (tons)": np.round(nox_rate * heat_input / 2000, 4),
+            "CO2_MASS (tons)": np.round(co2_rate * heat_input, 3),
+            "CO2_RATE (tons/mmBtu)": np.round(co2_rate, 3),
+            "HEAT_INPUT (mmBtu)": np.round(heat_input, 1),
+            "FAC_ID": plant_id + 100000,
+            "UNIT_ID": unit + 100000 * (seed + 1),
+        },
+        columns=CEMS_COLUMNS,
+    )
+
+
+def write_cems_files(directory, n_rows, year=2016, states=None, seed=0):
+    """
+    Write zipped CEMS daily files for a year, named and laid out like the
+    EPA downloads in the data folder (epacems<year>/epacems<year><state><qtr>.zip).
+
+    Parameters
+    ----------
+    directory : str
+        Folder in which the epacems<year> folder is created.
+    n_rows : int
+        Total number of rows, split evenly between the files.
+    year : int, optional
+    states : list, optional
+        State abbreviations, by default all the states covered by CEMS.
+    seed : int, optional
+
+    Returns
+    -------
+    list
+        Paths of the files.
+    """
+    from electricitylci.cems_data import cems_states
+
+    if states is None:
+        states = list(cems_states)
+    year_dir = join(directory, f"epacems{year}")
+    set_dir(year_dir)
+    rows_per_file = max(1, n_rows // (4 * len(states)))
+    paths = []
+    for i, state in enumerate(states):
+        for qtr in range(1, 5):
+            df = cems_daily(rows_per_file, state, year, qtr, seed + 4 * i + qtr)
+            path = join(year_dir, f"epacems{year}{state.lower()}{qtr}.zip")
+            df.to_csv(
+                path,
+                index=False,
+                compression={
+                    "method": "zip",
+                    "archive_name": f"DLY_{year}{state.lower()}Q{qtr}.csv",
+                },
+            )
+            paths.append(path)
+    return paths
+
+
+def eba_lines(n_rows, year=2016, seed=0):
+    """
+    Lines of the EIA bulk data file EBA.txt: hourly net generation, demand
+    and interchange with neighbouring balancing authorities for each US
+    balancing authority, plus series for aggregate regions that the model
+    filters out.
+
+    Parameters
+    ----------
+    n_rows : int
+        Total number of hourly values. When there are more than a year's
+        worth per series, the series extend into the years before and after.
+    year : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    list
+        JSON lines as bytes.
+    """
+    rng = np.random.default_rng(seed)
+    codes = balancing_authorities()["Balancing Authority Code"].tolist()
+    regions = codes + ["CAL", "MIDA", "US48"]
+    n_codes = len(codes)
+    pairs = [
+        (codes[i], codes[(i + k) % n_codes]) for i in range(n_codes) for k in (1, 2, 3)
+    ]
+    n_series = 2 * len(regions) + 2 * len(pairs)
+    n_hours = max(1, n_rows // n_series)
+    hours_in_year = 24 * (366 if year % 4 == 0 else 365)
+    start = pd.Timestamp(f"{year}-01-01") - pd.Timedelta(
+        hours=max(0, n_hours - hours_in_year) // 2
+    )
+    hours = pd.date_range(start, periods=n_hours, freq="H")
+    stamps = hours.strftime("%Y%m%dT%HZ").tolist()
+    daily_cycle = 1 + 0.3 * np.sin(2 * np.pi * (hours.hour.to_numpy() - 6) / 24)
+
+    def line(series_id, name, values):
+        # The model selects the series by their geoset id, e.g. EBA.NG.H
+        series_type = series_id.split(".")[-2]
+        return json.dumps(
+            {
+                "series_id": series_id,
+                "name": name,
+                "units": "megawatthours",
+                "f": "H",
+                "geoset_id": f"EBA.{series_type}.H",
+                "data": list(zip(stamps, values.tolist())),
+            }
+        ).encode()
+
+    lines = []
+    for region in regions:
+        scale = rng.lognormal(7, 1)
+        generation = np.round(scale * daily_cycle * rng.uniform(0.8, 1.2, n_hours))
+        demand = np.round(generation * rng.uniform(0.9, 1.1, n_hours))
+        lines.append(
+            line(f"EBA.{region}-ALL.NG.H", f"Net generation for {region}", generation)
+        )
+        lines.append(line(f"EBA.{region}-ALL.D.H", f"Demand for {region}", demand))
+    for from_ba, to_ba in pairs:
+        scale = rng.lognormal(4, 1)
+        exchange = scale * rng.normal(0.3, 1, n_hours)
+        # Both sides report the exchange, with opposite signs and some noise
+        reported = [exchange, -exchange * rng.uniform(0.9, 1.1, n_hours)]
+        for (a, b), values in zip([(from_ba, to_ba), (to_ba, from_ba)], reported):
+            lines.append(
+                line(
+                    f"EBA.{a}-{b}.ID.H",
+                    f"Actual net interchange for {a}-{b}",
+                    np.round(values),
+                )
+            )
+    return lines
+
+
+def write_eba_zip(path, lines):
+    """Write lines from eba_lines to a zip file laid out like EBA.zip."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("EBA.txt", b"\n".join(lines) + b"\n")
+    return path
+
+
+def upstream_inventory(n_rows, year=2016, seed=0):
+    """
+    Upstream emissions for the coal, natural gas, petroleum and nuclear fuel
+    supply chains, as returned by combinator.concat_map_upstream_databases.
+
+    Parameters
+    ----------
+    n_rows : int
+    year : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    dataframe
+    """
+    rng = np.random.default_rng(seed)
+    flows = flow_pool()
+    flows = flows[flows["Compartment"] != "waste"].reset_index(drop=True)
+    fuel_names = list(UPSTREAM_STAGES)
+    fuel = _pick(rng, fuel_names, n_rows)
+    stage_code, _, unit = _upstream_input_rows(rng, fuel)
+    plant_id = 1 + 3 * rng.integers(0, max(10, n_rows // ROWS_PER_FACILITY), n_rows)
+    flow_idx = rng.integers(0, len(flows), n_rows)
+    quantity = rng.lognormal(12, 1, n_rows)
+    return pd.DataFrame(
+        {
+            "FuelCategory": fuel,
+            "stage_code": stage_code,
+            "Compartment": flows["Compartment"].to_numpy()[flow_idx],
+            "plant_id": plant_id,
+            "Unit": unit,
+            "FlowAmount": quantity * flows["EF"].to_numpy()[flow_idx]
+            * rng.lognormal(-3, 1, n_rows),
+            "quantity": quantity,
+            "Electricity": rng.lognormal(12, 1.5, n_rows),
+            "FlowName": flows["FlowName"].to_numpy()[flow_idx],
+            "FlowUUID": flows["FlowUUID"].to_numpy()[flow_idx],
+            "Compartment_path": flows["Compartment_path"].to_numpy()[flow_idx],
+            "ElementaryFlowPrimeContext": "emission",
+            "Source": "netl",
+            "Year": year,
+        }
+    )
+
+
+def _upstream_name(fuel, stage_code):
+    if fuel == "COAL":
+        return f"coal extraction and processing - {stage_code}"
+    if fuel == "GAS":
+        return f"natural gas extraction and processing - {stage_code}"
+    if fuel == "OIL":
+        fuel_code, padd = stage_code.split("_")
+        return f"petroleum extraction and processing - {fuel_code} PADD {padd}"
+    return "nuclear fuel extraction, processing, and transportation"
+
+
+def upstream_processes(inventory):
+    """
+    Upstream process dictionaries for an upstream inventory, in the form
+    returned by write_upstream_dicts_to_jsonld: keyed by stage code, with
+    the process UUID and reference flow added.
+
+    Parameters
+    ----------
+    inventory : dataframe
+        As generated by upstream_inventory.
+
+    Returns
+    -------
+    dict
+    """
+    from electricitylci.process_dictionary_writer import unit
+
+    summary = inventory.groupby(
+        ["FuelCategory", "stage_code", "FlowName", "FlowUUID", "Compartment", "Unit"],
+        as_index=False,
+        dropna=False,
+    ).agg({"FlowAmount": "sum", "quantity": "sum"})
+    summary["emission_factor"] = summary["FlowAmount"] / summary["quantity"]
+    processes = {}
+    for (fuel, stage_code, ref_unit), data in summary.groupby(
+        ["FuelCategory", "stage_code", "Unit"]
+    ):
+        _, product, _ = UPSTREAM_STAGES[fuel]
+        exchanges = [
+            {
+                "internalId": "",
+                "@type": "Exchange",
+                "avoidedProduct": False,
+                "flow": {
+                    "flowType": "ELEMENTARY_FLOW",
+                    "flowProperties": "",
+                    "name": row["FlowName"],
+                    "id": row["FlowUUID"],
+                    "category": f"Elementary flows/emission/{row['Compartment']}",
+                },
+                "flowProperty": "",
+                "input": False,
+                "quantitativeReference": False,
+                "baseUncertainty": "",
+                "provider": "",
+                "amount": row["emission_factor"],
+                "amountFormula": "",
+                "unit": unit("kg"),
+                "pedigreeUncertainty": "",
+                "uncertainty": "",
+                "comment": "",
+            }
+            for row in data.to_dict("records")
+        ]
+        ref_flow = {
+            "flowType": "PRODUCT_FLOW",
+            "flowProperties": "",
+            "name": product,
+            "id": "",
+            "category": "21: Mining, Quarrying, and Oil and Gas Extraction",
+        }
+        exchanges.append(
+            {
+                "internalId": "",
+                "@type": "Exchange",
+                "avoidedProduct": False,
+                "flow": ref_flow,
+                "flowProperty": "",
+                "input": False,
+                "quantitativeReference": True,
+                "baseUncertainty": "",
+                "provider": "",
+                "amount": 1.0,
+                "amountFormula": "",
+                "unit": unit(ref_unit),
+            }
+        )
+        name = _upstream_name(fuel, stage_code)
+        processes[stage_code] = {
+            "@type": "Process",
+            "allocationFactors": "",
+            "defaultAllocationMethod": "",
+            "exchanges": exchanges,
+            "location": "",
+            "parameters": "",
+            "processType": "UNIT_PROCESS",
+            "name": name,
+            "category": UPSTREAM_CATEGORIES[fuel],
+            "description": "Fuel produced in stated region",
+            "uuid": str(uuid.uuid3(uuid.NAMESPACE_OID, name)),
+            "q_reference_name": product,
+            "q_reference_cat": ref_flow["category"],
+            "q_reference_unit": ref_unit,
+        }
+    return processes
+
+
+def generation_process_dicts(aggregated, upstream=None):
+    """
+    Generation process dictionaries in the layout produced by
+    alt_generation.olcaschema_genprocess, built directly from the
+    aggregated emissions: a process per balancing authority and fuel
+    category, with default providers for the fuel inputs.
+
+    Parameters
+    ----------
+    aggregated : dataframe
+        As generated by aggregated_emissions.
+    upstream : dict, optional
+        As generated by upstream_processes, used for the default providers.
+
+    Returns
+    -------
+    dict
+    """
+    from electricitylci.process_dictionary_writer import (
+        location,
+        process_doc_creation,
+        ref_exchange_creator,
+        unit,
+    )
+
+    upstream = upstream or {}
+    processes = {}
+    base_cols = ["Balancing Authority Name", "FuelCategory"]
+    for i, ((region, fuel), data) in enumerate(aggregated.groupby(base_cols)):
+        first = data.iloc[0]
+        dq_entry = "({})".format(
+            ";".join(
+                str(round(first[col], 1))
+                for col in [
+                    "ReliabilityScore",
+                    "TemporalCorrelation",
+                    "GeographicalCorrelation",
+                    "TechnologicalCorrelation",
+                    "DataCollection",
+                ]
+            )
+        )
+        comment = (
+            ",".join(data["source_string"].astype(str).unique())
+            + " - "
+            + ",".join(data["Year"].astype(str).unique())
+        )
+        exchanges = []
+        for row in data.to_dict("records"):
+            provider = upstream.get(row["stage_code"])
+            if provider is None:
+                flow_type = "ELEMENTARY_FLOW"
+                category = f"Elementary flows/{row['Compartment']}/{row['Compartment']}"
+                exchange_unit = unit("kg")
+                default_provider = ""
+            else:
+                flow_type = "PRODUCT_FLOW"
+                category = row["Compartment"]
+                exchange_unit = unit(provider["q_reference_unit"])
+                default_provider = {
+                    "name": provider["name"],
+                    "categoryPath": provider["category"],
+                    "processType": "UNIT_PROCESS",
+                    "@id": provider["uuid"],
+                }
+            uncertainty = {
+                "distributionType": "Logarithmic Normal Distribution",
+                "mean": "",
+                "meanFormula": "",
+                "geomMeanFormula": "",
+                "maximum": row["uncertaintyMax"],
+                "minimum": row["uncertaintyMin"],
+                "minimumFormula": "",
+                "sd": "",
+                "sdFormula": "",
+                "geomSdFormula": "",
+                "mode": "",
+                "modeFormula": "",
+                "maximumFormula": "",
+            }
+            if pd.notna(row["GeomMean"]):
+                uncertainty["geomMean"] = str(row["GeomMean"])
+            if pd.notna(row["GeomSD"]):
+                uncertainty["geomSd"] = str(row["GeomSD"])
+            exchanges.append(
+                {
+                    "internalId": "",
+                    "@type": "Exchange",
+                    "avoidedProduct": False,
+                    "flow": {
+                        "flowType": flow_type,
+                        "flowProperties": "",
+                        "name": row["FlowName"][0:255],
+                        "id": row["FlowUUID"],
+                        "category": category,
+                    },
+                    "flowProperty": "",
+                    "input": row["Compartment"] == "input",
+                    "quantitativeReference": False,
+                    "baseUncertainty": "",
+                    "provider": default_provider,
+                    "amount": row["Emission_factor"],
+                    "amountFormula": "",
+                    "unit": exchange_unit,
+                    "pedigreeUncertainty": "",
+                    "dqEntry": dq_entry,
+                    "uncertainty": uncertainty,
+                    "comment": comment,
+                }
+            )
+        exchanges.append(ref_exchange_creator())
+        processes[i] = {
+            "@type": "Process",
+            "allocationFactors": "",
+            "defaultAllocationMethod": "",
+            "exchanges": exchanges,
+            "location": location(region),
+            "parameters": "",
+            "processDocumentation": process_doc_creation(),
+            "processType": "UNIT_PROCESS",
+            "name": f"Electricity - {fuel} - {region}",
+            "category": (
+                "22: Utilities/2211: Electric Power Generation, "
+                f"Transmission and Distribution/{fuel}"
+            ),
+            "description": (
+                f"Electricity from {fuel} produced at generating facilities "
+                f"in the {region} region"
+            ),
+        }
+    return processes
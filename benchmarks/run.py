@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Time the slowest functions of a model build on synthetic data.
+
+Each benchmark generates its input with benchmarks.generators, then times
+the function on a fresh copy of the input (functions such as aggregate_data
+modify their input). Nothing is downloaded: the EIA-923/EIA-860 frames read
+by ba_io_trading_model are registered as shared sources (see
+electricitylci/source_data.py) and the EIA bulk file is written to a
+temporary folder.
+
+Benchmarks whose modules can't be imported in this environment (e.g. because
+olca or fedelemflowlist isn't installed) are reported as skipped.
+
+Usage:
+    python -m benchmarks.run --rows 100k --output results.json
+    python -m benchmarks.run --rows 100k --baseline results.json --tolerance 0.2
+
+With --baseline the exit status is 1 if a benchmark is slower than in the
+baseline by more than the tolerance.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import generators
+
+module_logger = logging.getLogger("run.py")
+
+YEAR = 2016
+
+# Slowdowns smaller than this are not reported as regressions
+MIN_DIFFERENCE_S = 0.01
+
+# name -> setup function. A setup function takes the number of rows, the seed
+# and a scratch folder and returns (function, make_args): make_args builds
+# the arguments for one timed call of function.
+BENCHMARKS = OrderedDict()
+
+# Functions called after each benchmark, to undo changes made by its setup
+_cleanup = []
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def _frame_copy(df):
+    return lambda: (df.copy(),)
+
+
+@benchmark("alt_generation.aggregate_data")
+def _aggregate_data(rows, seed, workdir):
+    from electricitylci.alt_generation import aggregate_data
+
+    df = generators.facility_emissions(rows, YEAR, seed)
+    return aggregate_data, _frame_copy(df)
+
+
+@benchmark("alt_generation.calculate_electricity_by_source")
+def _calculate_electricity_by_source(rows, seed, workdir):
+    from electricitylci.alt_generation import (
+        aggregate_facility_flows,
+        calculate_electricity_by_source,
+    )
+
+    # aggregate_data passes the output of aggregate_facility_flows
+    df = generators.facility_emissions(rows, YEAR, seed)
+    df["FlowUUID"] = df["FlowUUID"].fillna(value="dummy-uuid")
+    df = aggregate_facility_flows(df)
+    return calculate_electricity_by_source, _frame_copy(df)
+
+
+@benchmark("alt_generation.olcaschema_genprocess")
+def _olcaschema_genprocess(rows, seed, workdir):
+    from electricitylci.alt_generation import olcaschema_genprocess
+
+    df = generators.aggregated_emissions(rows, YEAR, seed)
+    upstream = generators.upstream_processes(
+        generators.upstream_inventory(rows, YEAR, seed)
+    )
+    return olcaschema_genprocess, lambda: (df.copy(), upstream)
+
+
+@benchmark("eia_io_trading.ba_io_trading_model")
+def _ba_io_trading_model(rows, seed, workdir):
+    import electricitylci.eia860_facilities as eia860
+    import electricitylci.eia923_generation as eia923
+    import electricitylci.eia_io_trading as eia_io_trading
+    from electricitylci.source_data import (
+        share_sources,
+        source_key,
+        write_shared_frame,
+    )
+
+    eba_path = generators.write_eba_zip(
+        os.path.join(workdir, "EBA.zip"), generators.eba_lines(rows, YEAR, seed)
+    )
+    eia923_df, eia860_df = generators.eia_generation(
+        max(1000, rows // 10), YEAR, seed
+    )
+    shared_files = {}
+    for loader, df in [
+        (eia923.eia923_download_extract, eia923_df),
+        (eia860.eia860_plant, eia860_df),
+    ]:
+        path = os.path.join(workdir, f"{loader.source_name}.arrow")
+        write_shared_frame(df, path)
+        shared_files[source_key(loader.source_name, (YEAR,))] = path
+    share_sources(shared_files)
+    # Keep the trade matrices it saves out of the output folder
+    output_dir = eia_io_trading.output_dir
+    eia_io_trading.output_dir = workdir
+    _cleanup.append(lambda: setattr(eia_io_trading, "output_dir", output_dir))
+    return eia_io_trading.ba_io_trading_model, lambda: (YEAR, "BA", eba_path)
+
+
+def _process_dicts(rows, seed):
+    upstream = generators.upstream_processes(
+        generators.upstream_inventory(rows, YEAR, seed)
+    )
+    processes = generators.generation_process_dicts(
+        generators.aggregated_emissions(rows, YEAR, seed), upstream
+    )
+    return processes, upstream
+
+
+@benchmark("olca_jsonld_writer.write")
+def _write(rows, seed, workdir):
+    from electricitylci.olca_jsonld_writer import write
+
+    processes, _ = _process_dicts(rows, seed)
+    path = os.path.join(workdir, "benchmark_jsonld.zip")
+
+    def make_args():
+        if os.path.exists(path):
+            os.remove(path)
+        return copy.deepcopy(processes), path
+
+    return write, make_args
+
+
+@benchmark("utils.fill_default_provider_uuids")
+def _fill_default_provider_uuids(rows, seed, workdir):
+    from electricitylci.utils import fill_default_provider_uuids
+
+    processes, upstream = _process_dicts(rows, seed)
+    # Look the providers up by name, as for processes built before the
+    # upstream processes were written
+    for process in processes.values():
+        for exchange in process["exchanges"]:
+            if isinstance(exchange["provider"], dict):
+                exchange["provider"]["@id"] = ""
+    return (
+        fill_default_provider_uuids,
+        lambda: (copy.deepcopy(processes), upstream),
+    )
+
+
+@benchmark("cems_data.read_cems_csv")
+def _read_cems_csv(rows, seed, workdir):
+    from electricitylci.cems_data import read_cems_csv
+
+    paths = generators.write_cems_files(workdir, rows, YEAR, seed=seed)
+
+    def read_all(paths):
+        return [read_cems_csv(p) for p in paths]
+
+    return read_all, lambda: (paths,)
+
+
+def _set_benchmark_config():
+    """Build models with the ELCI_1 parameters, aggregated to BAs."""
+    from electricitylci.model_config import (
+        ModelConfig,
+        load_model_specs,
+        set_model_config,
+    )
+
+    specs = load_model_specs("ELCI_1")
+    specs.update(
+        {
+            "regional_aggregation": "BA",
+            "eia_gen_year": YEAR,
+            "NETL_IO_trading_year": YEAR,
+            "use_stage_cache": False,
+            "record_stage_metrics": False,
+        }
+    )
+    set_model_config(ModelConfig("benchmark", specs))
+
+
+def run_benchmark(name, rows, seed=0, repeat=3):
+    """
+    Run one benchmark.
+
+    Parameters
+    ----------
+    name : str
+        A key of BENCHMARKS.
+    rows : int
+        Size of the synthetic input.
+    seed : int, optional
+    repeat : int, optional
+        Number of timed calls, by default 3.
+
+    Returns
+    -------
+    dict
+        status ("ok", "skipped" or "failed"), the best and all of the times
+        in seconds, and the setup time.
+    """
+    from electricitylci.source_data import clear_shared_sources
+
+    workdir = tempfile.mkdtemp(prefix="elci_benchmark_")
+    try:
+        setup_start = time.perf_counter()
+        try:
+            func, make_args = BENCHMARKS[name](rows, seed, workdir)
+        except ImportError as e:
+            module_logger.warning(f"Skipping {name}: {e}")
+            return {"status": "skipped", "reason": str(e)}
+        setup_s = time.perf_counter() - setup_start
+        times = []
+        for _ in range(repeat):
+            args = make_args()
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+            del args
+        return {
+            "status": "ok",
+            "seconds": min(times),
+            "times": times,
+            "setup_s": setup_s,
+        }
+    except Exception as e:
+        module_logger.exception(f"{name} failed")
+        return {"status": "failed", "reason": f"{type(e).__name__}: {e}"}
+    finally:
+        while _cleanup:
+            _cleanup.pop()()
+        clear_shared_sources()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(names=None, rows=10000, seed=0, repeat=3):
+    """
+    Run benchmarks and collect the results.
+
+    Parameters
+    ----------
+    names : list, optional
+        Benchmarks to run, by default all of them.
+    rows : int, optional
+    seed : int, optional
+    repeat : int, optional
+
+    Returns
+    -------
+    dict
+    """
+    _set_benchmark_config()
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(
+            f"Unknown benchmarks {unknown}, choose from {list(BENCHMARKS)}"
+        )
+    results = OrderedDict()
+    for name in names:
+        print(f"Running {name} with {rows} rows...")
+        results[name] = run_benchmark(name, rows, seed, repeat)
+    return {
+        "rows": rows,
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Compare benchmark times with a baseline report.
+
+    Parameters
+    ----------
+    report : dict
+        Returned by run.
+    baseline : dict
+        An earlier report, for the same number of rows.
+    tolerance : float, optional
+        Allowed slowdown as a fraction of the baseline time, by default 0.2.
+
+    Returns
+    -------
+    list
+        Names of the benchmarks that are slower than allowed. Differences of
+        less than MIN_DIFFERENCE_S seconds are timing noise and are ignored.
+    """
+    if baseline.get("rows") != report["rows"]:
+        module_logger.warning(
+            f"Baseline was run with {baseline.get('rows')} rows, "
+            f"not {report['rows']}"
+        )
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name, {})
+        if result["status"] != "ok" or base.get("status") != "ok":
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        result["baseline_seconds"] = base["seconds"]
+        result["ratio"] = ratio
+        if (
+            ratio > 1 + tolerance
+            and result["seconds"] - base["seconds"] > MIN_DIFFERENCE_S
+        ):
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{'benchmark':<50}{'seconds':>10}{'baseline':>10}{'ratio':>8}")
+    for name, result in report["results"].items():
+        if result["status"] != "ok":
+            print(f"{name:<50}{result['status']:>10}  {result['reason']}")
+            continue
+        line = f"{name:<50}{result['seconds']:>10.3f}"
+        if "ratio" in result:
+            line += f"{result['baseline_seconds']:>10.3f}{result['ratio']:>8.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the slowest functions of a model build on synthetic "
+        "data, offline."
+    )
+    parser.add_argument(
+        "--rows",
+        type=generators.parse_rows,
+        default=10000,
+        help='Size of the synthetic inputs, e.g. 1000, 100k or 10M (default 10000).',
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        default=None,
+        metavar="BENCHMARK",
+        help="Benchmarks to run (default all, see --list).",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the benchmarks and exit."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed calls per benchmark; the best is reported "
+        "(default 3).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--output", default=None, help="Save the results to this JSON file."
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="JSON results of an earlier run to compare with.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown relative to the baseline (default 0.2, i.e. 20%%).",
+    )
+    args = parser.parse_args()
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        sys.exit(0)
+    report = run(args.only, args.rows, args.seed, args.repeat)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print(f"\nSlower than the baseline: {', '.join(regressions)}")
+        sys.exit(1)
@@ -1,13 +1,46 @@
-from electricitylci.model_config import model_name, model_specs
+from electricitylci import model_config
 from electricitylci.globals import output_dir
+from electricitylci.stage_cache import (
+    ALL_DATA_FILES,
+    CEMS_DATA_FILES,
+    cached_stage,
+    reads_config,
+)
+from electricitylci.instrumentation import instrumented
 import datetime
 import pandas as pd
 import logging
 
-namestr = (
-    f"{output_dir}/{model_name}_jsonld_"
-    f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-)
+# JSON-LD output file for each model built in this process
+_namestrs = {}
+
+
+def _namestr():
+    """Return the JSON-LD output file for the active model."""
+    model_name = model_config.model_name
+    if model_name not in _namestrs:
+        _namestrs[model_name] = (
+            f"{output_dir}/{model_name}_jsonld_"
+            f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        )
+    return _namestrs[model_name]
+
+
+def set_namestr(path):
+    """
+    Set the JSON-LD output file for the active model, e.g. to add to the file
+    of an interrupted build when it is resumed.
+    """
+    _namestrs[model_config.model_name] = path
+
+
+def __getattr__(name):
+    # namestr used to be set when the package was imported, which required
+    # the model to be selected at import time.
+    if name == "namestr":
+        return _namestr()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 formatter = logging.Formatter(
     "%(levelname)s:%(filename)s:%(funcName)s:%(message)s"
@@ -18,7 +51,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger("electricitylci")
 
-
+# model_specs entries read by each stage, either directly or through the
+# modules it calls. These are part of the stage cache keys and of the stage
+# signatures of incremental builds, so changing one of them only rebuilds the
+# stages that depend on it.
+PLANT_FILTER_CONFIG_KEYS = [
+    "include_only_egrid_facilities_with_positive_generation",
+    "filter_on_efficiency",
+    "egrid_facility_efficiency_filters",
+    "filter_on_min_plant_percent_generation_from_primary_fuel",
+    "min_plant_percent_generation_from_primary_fuel_category",
+    "keep_mixed_plant_category",
+    "filter_non_egrid_emission_on_NAICS",
+]
+GENERATION_CONFIG_KEYS = PLANT_FILTER_CONFIG_KEYS + [
+    "eia_gen_year",
+    "egrid_year",
+    "replace_egrid",
+    "inventories_of_interest",
+    "use_primaryfuel_for_coal",
+    "fuel_name_file",
+    "fedelemflowlist_version",
+    "electricity_lci_target_year",
+    "regional_aggregation",
+]
+
+
+@instrumented
+@reads_config(
+    GENERATION_CONFIG_KEYS + ["use_alt_gen_process", "include_upstream_processes"],
+    data_files=ALL_DATA_FILES + CEMS_DATA_FILES,
+)
 def get_generation_process_df(use_alt_gen_process=None, regions=None, **kwargs):
     """
     Create a dataframe of emissions from power generation by fuel type in each
@@ -49,9 +112,9 @@ def get_generation_process_df(use_alt_gen_process=None, regions=None, **kwargs):
        'GeomMean', 'GeomSD', 'Maximum', 'Minimum'
     """
     if use_alt_gen_process is None:
-        use_alt_gen_process = model_specs['use_alt_gen_process']
+        use_alt_gen_process = model_config.model_specs['use_alt_gen_process']
     if regions is None:
-        regions = model_specs['regional_aggregation']
+        regions = model_config.model_specs['regional_aggregation']
 
     if use_alt_gen_process is True:
         try:
@@ -62,7 +125,7 @@ def get_generation_process_df(use_alt_gen_process=None, regions=None, **kwargs):
                 "is True"
             )
         # upstream_df = get_upstream_process_df()
-        if model_specs['include_upstream_processes'] is True:
+        if model_config.model_specs['include_upstream_processes'] is True:
             upstream_dict = write_upstream_process_database_to_dict(
                 upstream_df
             )
@@ -114,7 +177,7 @@ def get_generation_process_df(use_alt_gen_process=None, regions=None, **kwargs):
             )
 
         else:
-            electricity_for_selected_egrid_facilities["Year"] = model_specs["egrid_year"]
+            electricity_for_selected_egrid_facilities["Year"] = model_config.model_specs["egrid_year"]
             generation_process_df = create_generation_process_df(
                 electricity_for_selected_egrid_facilities,
                 emissions_and_waste_for_selected_egrid_facilities,
@@ -123,6 +186,10 @@ def get_generation_process_df(use_alt_gen_process=None, regions=None, **kwargs):
         return generation_process_df
 
 
+@instrumented
+@cached_stage(
+    config_keys=GENERATION_CONFIG_KEYS + ["gen_mix_from_model_generation_data"]
+)
 def get_generation_mix_process_df(regions=None):
     """
     Create a dataframe of generation mixes by fuel type in each subregion.
@@ -164,7 +231,7 @@ def get_generation_mix_process_df(regions=None):
     from electricitylci.model_config import eia_gen_year
 
     if regions is None:
-        regions = model_specs['regional_aggregation']
+        regions = model_config.model_specs['regional_aggregation']
 
     if replace_egrid:
         # assert regions == 'BA' or regions == 'NERC', 'Regions must be BA or NERC'
@@ -186,6 +253,8 @@ def get_generation_mix_process_df(regions=None):
             )
     return generation_mix_process_df
 
+@instrumented
+@cached_stage(config_keys=["regional_aggregation", "egrid_year", "fuel_name_file"])
 def write_generation_process_database_to_dict(gen_database, regions=None):
     """
     Create olca formatted dictionaries of individual processes
@@ -207,19 +276,28 @@ def write_generation_process_database_to_dict(gen_database, regions=None):
     from electricitylci.generation import olcaschema_genprocess
 
     if regions is None:
-        regions = model_specs['regional_aggregation']
+        regions = model_config.model_specs['regional_aggregation']
 
     gen_dict = olcaschema_genprocess(gen_database, subregion=regions)
 
     return gen_dict
 
 
+@instrumented
+@cached_stage(
+    config_keys=[
+        "regional_aggregation",
+        "egrid_year",
+        "eia_gen_year",
+        "replace_egrid",
+    ]
+)
 def write_generation_mix_database_to_dict(
     genmix_database, gen_dict, regions=None
 ):
     from electricitylci.generation_mix import olcaschema_genmix
     if regions is None:
-        regions = model_specs['regional_aggregation']
+        regions = model_config.model_specs['regional_aggregation']
     if regions=="FERC":
         genmix_dict = olcaschema_genmix(
                 genmix_database, gen_dict, subregion="BA"
@@ -231,6 +309,8 @@ def write_generation_mix_database_to_dict(
     return genmix_dict
 
 
+@instrumented
+@reads_config(["egrid_year", "replace_egrid", "net_trading"])
 def write_surplus_pool_and_consumption_mix_dict():
     """
     [summary]
@@ -247,12 +327,16 @@ def write_surplus_pool_and_consumption_mix_dict():
     return surplus_pool_and_con_mix
 
 
+@instrumented
+@reads_config(["egrid_year", "efficiency_of_distribution_grid"])
 def write_distribution_dict():
     from electricitylci.distribution import distribution_mix_dictionary
 
     return distribution_mix_dictionary()
 
 
+@instrumented
+@reads_config([])
 def write_process_dicts_to_jsonld(*process_dicts):
     """
     Send one or more process dictionaries to be written to json-ld
@@ -264,10 +348,12 @@ def write_process_dicts_to_jsonld(*process_dicts):
     for d in process_dicts:
         all_process_dicts = {**all_process_dicts, **d}
 
-    olca_dicts = write(all_process_dicts, namestr)
+    olca_dicts = write(all_process_dicts, _namestr())
     return olca_dicts
 
 
+@instrumented
+@cached_stage(config_keys=["eia_gen_year"])
 def get_upstream_process_df():
     """
     Automatically load all of the upstream emissions data from the various
@@ -294,6 +380,8 @@ def get_upstream_process_df():
     return upstream_df
 
 
+@instrumented
+@cached_stage()
 def write_upstream_process_database_to_dict(upstream_df):
     """
     Conver the upstream dataframe generated by get_upstream_process_df to
@@ -315,6 +403,8 @@ def write_upstream_process_database_to_dict(upstream_df):
     return upstream_dicts
 
 
+@instrumented
+@reads_config([])
 def write_upstream_dicts_to_jsonld(upstream_dicts):
     """
     Write the upstream dictionary to jsonld.
@@ -329,6 +419,14 @@ def write_upstream_dicts_to_jsonld(upstream_dicts):
     return upstream_dicts
 
 
+@instrumented
+@cached_stage(
+    config_keys=[
+        "eia_gen_year",
+        "keep_mixed_plant_category",
+        "min_plant_percent_generation_from_primary_fuel_category",
+    ]
+)
 def combine_upstream_and_gen_df(gen_df, upstream_df):
     """
     Combine the generation and upstream dataframes into a single dataframe.
@@ -348,14 +446,22 @@ def combine_upstream_and_gen_df(gen_df, upstream_df):
 
     import electricitylci.combinator as combine
     import electricitylci.import_impacts as import_impacts
+    from electricitylci.schema import concat_categorical
 
     print("Combining upstream and generation inventories")
     combined_df = combine.concat_clean_upstream_and_plant(gen_df, upstream_df)
     canadian_gen = import_impacts.generate_canadian_mixes(combined_df)
-    combined_df = pd.concat([combined_df, canadian_gen], ignore_index=True)
+    combined_df = concat_categorical(
+        [combined_df, canadian_gen], ignore_index=True
+    )
     return combined_df, canadian_gen
 
 
+@instrumented
+@cached_stage(
+    config_keys=GENERATION_CONFIG_KEYS,
+    data_files=ALL_DATA_FILES + CEMS_DATA_FILES,
+)
 def get_alternate_gen_plus_netl():
     """
     This will combine the netl life cycle data for solar, geothermal, and wind,
@@ -376,6 +482,7 @@ def get_alternate_gen_plus_netl():
         concat_map_upstream_databases,
         concat_clean_upstream_and_plant,
     )
+    from electricitylci.schema import concat_categorical
     import electricitylci.geothermal as geo
     import electricitylci.solar_upstream as solar
     import electricitylci.wind_upstream as wind
@@ -401,11 +508,13 @@ def get_alternate_gen_plus_netl():
     print("Getting reported emissions for generators...")
     gen_df = alt_gen.create_generation_process_df()
     water_df = water.generate_plant_water_use(eia_gen_year)
-    gen_df = pd.concat([gen_df, water_df, hydro_df], ignore_index=True)
+    gen_df = concat_categorical([gen_df, water_df, hydro_df], ignore_index=True)
     combined_gen = concat_clean_upstream_and_plant(gen_df, netl_gen)
     return combined_gen
 
 
+@instrumented
+@cached_stage()
 def aggregate_gen(gen_df, subregion="BA"):
     """
     Runs the alternate aggregation routine to place all emissions and fuel
@@ -434,10 +543,47 @@ def aggregate_gen(gen_df, subregion="BA"):
         #Or it could be possible but would requir running through aggregate twice.
         subregion="BA"
     print(f"Aggregating to subregion - {subregion}")
-    aggregate_df = alt_gen.aggregate_data(gen_df, subregion=subregion)
+    # The number of processes doesn't change the result, so it isn't one of
+    # the config parameters of the cached stage.
+    aggregate_df = alt_gen.aggregate_data(
+        gen_df,
+        subregion=subregion,
+        jobs=model_config.model_specs.get("aggregation_jobs", 1),
+    )
     return aggregate_df
 
 
+@instrumented
+@cached_stage()
+def aggregate_gen_levels(
+    gen_df, subregions=("BA", "FERC", "EIA", "NERC", "US")
+):
+    """
+    Aggregates the generation dataframe to several subregions at once, with
+    the same results as calling aggregate_gen for each of them but at
+    roughly the cost of one call (see alt_generation.aggregate_data_levels).
+
+    Parameters
+    ----------
+    gen_df : dataframe
+        The generation dataframe as generated by get_alternate_gen_plus_netl
+        or get_generation_process_df.
+    subregions : iterable, optional
+        The subregions to aggregate to, by default BA, FERC, EIA, NERC and
+        US.
+
+    Returns
+    -------
+    dict
+        The aggregated dataframe for each subregion.
+    """
+    import electricitylci.alt_generation as alt_gen
+
+    return alt_gen.aggregate_data_levels(gen_df, subregions=subregions)
+
+
+@instrumented
+@cached_stage(config_keys=["eia_gen_year", "electricity_lci_target_year"])
 def add_fuels_to_gen(gen_df, fuel_df, canadian_gen, upstream_dict):
     """
     Add the upstream fuels to the generation dataframe as fuel inputs.
@@ -456,13 +602,18 @@ def add_fuels_to_gen(gen_df, fuel_df, canadian_gen, upstream_dict):
         "unit processes" are only generated when written to json-ld.
     """
     from electricitylci.combinator import add_fuel_inputs
+    from electricitylci.schema import concat_categorical
 
     print("Adding fuel inputs to generator emissions...")
     gen_plus_fuel = add_fuel_inputs(gen_df, fuel_df, upstream_dict)
-    gen_plus_fuel = pd.concat([gen_plus_fuel, canadian_gen], ignore_index=True)
+    gen_plus_fuel = concat_categorical(
+        [gen_plus_fuel, canadian_gen], ignore_index=True
+    )
     return gen_plus_fuel
 
 
+@instrumented
+@cached_stage(config_keys=["egrid_year"])
 def write_gen_fuel_database_to_dict(
     gen_plus_fuel_df, upstream_dict, subregion=None
 ):
@@ -501,11 +652,16 @@ def write_gen_fuel_database_to_dict(
     return gen_plus_fuel_dict
 
 
+@instrumented
+@cached_stage(
+    config_keys=PLANT_FILTER_CONFIG_KEYS
+    + ["eia_gen_year", "egrid_year", "regional_aggregation"]
+)
 def get_distribution_mix_df(combined_df, subregion=None):
     import electricitylci.eia_trans_dist_grid_loss as tnd
     from electricitylci.model_config import eia_gen_year
     if subregion is None:
-        subregion = model_specs['regional_aggregation']
+        subregion = model_config.model_specs['regional_aggregation']
 
     td_loss_df = tnd.generate_regional_grid_loss(
         combined_df, eia_gen_year, subregion=subregion
@@ -513,10 +669,12 @@ def get_distribution_mix_df(combined_df, subregion=None):
     return td_loss_df
 
 
+@instrumented
+@cached_stage(config_keys=["regional_aggregation", "egrid_year"])
 def write_distribution_mix_to_dict(dist_mix_df, gen_mix_dict, subregion=None):
     import electricitylci.eia_trans_dist_grid_loss as tnd
     if subregion is None:
-        subregion = model_specs['regional_aggregation']
+        subregion = model_config.model_specs['regional_aggregation']
 
     dist_mix_dict = tnd.olca_schema_distribution_mix(
         dist_mix_df, gen_mix_dict, subregion=subregion
@@ -524,11 +682,13 @@ def write_distribution_mix_to_dict(dist_mix_df, gen_mix_dict, subregion=None):
     return dist_mix_dict
 
 
+@instrumented
+@cached_stage(config_keys=GENERATION_CONFIG_KEYS + ["NETL_IO_trading_year"])
 def get_consumption_mix_df(subregion=None):
     import electricitylci.eia_io_trading as trade
     from electricitylci.model_config import eia_gen_year
     if subregion is None:
-        subregion = model_specs['regional_aggregation']
+        subregion = model_config.model_specs['regional_aggregation']
 
     io_trade_df = trade.ba_io_trading_model(
         year=eia_gen_year, subregion=subregion
@@ -536,10 +696,12 @@ def get_consumption_mix_df(subregion=None):
     return io_trade_df
 
 
+@instrumented
+@cached_stage(config_keys=["regional_aggregation", "egrid_year", "eia_gen_year"])
 def write_consumption_mix_to_dict(cons_mix_df, dist_mix_dict, subregion=None):
     import electricitylci.eia_io_trading as trade
     if subregion is None:
-        subregion = model_specs['regional_aggregation']
+        subregion = model_config.model_specs['regional_aggregation']
 
     cons_mix_dict = trade.olca_schema_consumption_mix(
         cons_mix_df, dist_mix_dict, subregion=subregion
@@ -5,15 +5,20 @@ Created on Tue Jun  4 12:07:46 2019
 
 @author: jamiesom
 """
-from electricitylci.model_config import replace_egrid, use_primaryfuel_for_coal
+from electricitylci import model_config
 from electricitylci.elementaryflows import map_emissions_to_fedelemflows
 import pandas as pd
 import numpy as np
 from electricitylci.globals import output_dir
 from datetime import datetime
-from electricitylci.dqi import lookup_score_with_bound_key
+from electricitylci.dqi import score_array
+from electricitylci.instrumentation import instrumented
+from electricitylci.schema import (
+    add_categories,
+    concat_categorical,
+    to_categorical,
+)
 from scipy.stats import t, norm
-import ast
 import logging
 
 module_logger = logging.getLogger("alt_generation.py")
@@ -56,88 +61,41 @@ def aggregate_facility_flows(df):
         "Compartment_path",
         "stage_code"
     ]
-    emissions = df["Compartment"].isin(emission_compartments)
-    df_emissions = df[emissions]
-    df_nonemissions = df[~emissions]
-    df_dupes = df_emissions.duplicated(subset=groupby_cols, keep=False)
-    df_red = df_emissions.drop(df_emissions[df_dupes].index)
-    group_db = (
-        df_emissions.loc[df_dupes, :]
-        .groupby(groupby_cols, as_index=False)["FlowAmount"]
-        .sum()
-    )
-    #    group_db=df.loc[emissions,:].groupby(groupby_cols,as_index=False)['FlowAmount'].sum()
-    group_db_merge = group_db.merge(
-        right=df_emissions.drop_duplicates(subset=groupby_cols),
-        on=groupby_cols,
-        how="left",
-        suffixes=("", "_right"),
+    emissions = df["Compartment"].isin(emission_compartments).to_numpy()
+    emission_rows = np.flatnonzero(emissions)
+    # Number the flows of each facility and source, in the order of the
+    # keys. Missing keys are a value of their own.
+    codes = pd.DataFrame(
+        {
+            c: pd.factorize(df[c].iloc[emission_rows], sort=True)[0]
+            for c in groupby_cols
+        }
     )
-    try:
-        delete_cols = ["FlowAmount_right"]
-        group_db_merge.drop(columns=delete_cols, inplace=True)
-    except KeyError:
-        pass
-    df = pd.concat(
-        [df_nonemissions, df_red, group_db_merge], ignore_index=True
+    codes["FlowAmount"] = df["FlowAmount"].to_numpy()[emission_rows]
+    grouped = codes.groupby(groupby_cols, sort=True)
+    group = grouped.ngroup().to_numpy()
+    size = grouped.size().to_numpy()
+    amounts = grouped["FlowAmount"].sum().to_numpy()
+    del codes, grouped
+    # The other columns are taken from the first row of each group. Unique
+    # flows keep their place after the non-emissions, summed ones follow in
+    # the order of the keys.
+    first = ~pd.Series(group).duplicated().to_numpy()
+    single = size[group] == 1
+    summed = first & ~single
+    summed_groups = np.sort(group[summed])
+    summed_rows = emission_rows[summed][np.argsort(group[summed])]
+    rows = np.concatenate(
+        [np.flatnonzero(~emissions), emission_rows[single], summed_rows]
     )
+    df = df.take(rows)
+    df.reset_index(drop=True, inplace=True)
+    flow_amount = df["FlowAmount"].to_numpy(dtype=float, copy=True)
+    flow_amount[len(rows) - len(summed_rows):] = amounts[summed_groups]
+    df["FlowAmount"] = flow_amount
     return df
 
 
-def _combine_sources(p_series, df, cols, source_limit=None):
-    """
-    Take the list of sources from a groupby.apply and return a dataframe
-    that contains one column containing a list of the sources and another
-    that concatenates them into a string. This is all in an effort to find
-    another approach for summing electricity for all plants in an aggregation
-    that match the same data sources.
-
-    Parameters
-    ----------
-    df: dataframe
-        Dataframe containing merged generation and emissions data - includes
-        a column for data source (i.e., eGRID, NEI, RCRAInfo...)
-
-    Returns
-    ----------
-    dataframe
-    """
-    module_logger.debug(
-        f"Combining sources for {str(df.loc[p_series.index[0],cols].values)}"
-    )
-    source_list = list(np.unique(p_series))
-    if source_limit:
-        if len(source_list) > source_limit:
-            # result = pd.DataFrame()
-            #            result=dict({"source_list":float("nan"),"source_string":float("nan")})
-            #            result["source_list"]=float("nan")
-            #            result["source_string"]=float("nan")
-            result = [float("nan"), float("nan")]
-            return result
-        else:
-            #            result = pd.DataFrame()
-            source_list.sort()
-            source_list_string = "_".join(source_list)
-            #            result=dict({"source_list":source_list,"source_string":source_list_string})
-            result = [source_list, source_list_string]
-            #            result["source_list"] = pd.DataFrame(data=[source_list]).values.tolist()
-            #            result["source_string"] = source_list_string
-
-            return result
-    else:
-        #        result = pd.DataFrame()
-        source_list.sort()
-        source_list_string = "_".join(source_list)
-        #        result = pd.DataFrame()
-        #        result["source_list"] = pd.DataFrame(data=[source_list]).values.tolist()
-        #        result["source_string"] = source_list_string
-        source_list.sort()
-        source_list_string = "_".join(source_list)
-        #        result=dict({"source_list":source_list,"source_string":source_list_string})
-        result = [source_list, source_list_string]
-        return result
-
-
 def add_data_collection_score(db, elec_df, subregion="BA"):
     """
     Adds the data collection score which is a function of how much of the
@@ -157,7 +115,6 @@ def add_data_collection_score(db, elec_df, subregion="BA"):
         The level of subregion that the data will be aggregated to. Choices
         are 'all', 'NERC', 'BA', 'US', by default 'BA'
     """
-    from electricitylci.dqi import data_collection_lower_bound_to_dqi
     from electricitylci.aggregation_selector import subregion_col
 
     region_agg = subregion_col(subregion)
@@ -173,7 +130,9 @@ def add_data_collection_score(db, elec_df, subregion="BA"):
         how="left",
     )
     reduced_db = db.drop_duplicates(subset=groupby_cols + ["eGRID_ID"])
-    region_elec = reduced_db.groupby(groupby_cols, as_index=False)[
+    region_elec = reduced_db.groupby(
+        groupby_cols, as_index=False, observed=True
+    )[
         "Electricity"
     ].sum()
     region_elec.rename(
@@ -185,19 +144,191 @@ def add_data_collection_score(db, elec_df, subregion="BA"):
         right_on=groupby_cols,
         how="left",
     )
-    db["Percent_of_Gen_in_EF_Denominator"] = (
-        temp_df["electricity_sum"] / temp_df["region_fuel_electricity"]
+    # temp_df has a new index, in the order of the rows of db
+    db["DataCollection"] = _data_collection_score(
+        temp_df["electricity_sum"].values,
+        temp_df["region_fuel_electricity"].values,
     )
-    db["DataCollection"] = db["Percent_of_Gen_in_EF_Denominator"].apply(
-        lambda x: lookup_score_with_bound_key(
-            x, data_collection_lower_bound_to_dqi
+    return db
+
+
+def _data_collection_score(electricity_sum, region_fuel_electricity):
+    """
+    Score the share of the generation of a region and fuel category that is
+    in the denominator of an emission factor, see add_data_collection_score.
+
+    Parameters
+    ----------
+    electricity_sum : array
+        Generation of the facilities in the denominator.
+    region_fuel_electricity : array
+        Generation of all the facilities of the region and fuel category.
+
+    Returns
+    -------
+    numpy.ndarray
+        DataCollection scores.
+    """
+    from electricitylci.dqi import data_collection_lower_bound_to_dqi
+
+    ratio = np.asarray(electricity_sum, dtype=float) / np.asarray(
+        region_fuel_electricity, dtype=float
+    )
+    # Both totals add up the same facilities when a source string covers
+    # the whole region, but not in the same order, so the ratio can come
+    # out a rounding error above 1 (which would score 5).
+    ratio[np.isclose(ratio, 1, rtol=0, atol=1e-9)] = 1
+    return score_array(ratio, data_collection_lower_bound_to_dqi)
+
+
+def _source_flags(sources):
+    """
+    Encode data sources (eGRID, NEI, TRI, RCRAInfo, netl...) as bit flags, so
+    that a set of sources is a bitmask and testing whether a source is in a
+    set is a bitwise AND.
+
+    Parameters
+    ----------
+    sources : array-like
+        Source of each row.
+
+    Returns
+    -------
+    tuple
+        (array of the flag of each row, array of the unique sources, array of
+        the flag of each unique source)
+    """
+    codes, unique_sources = pd.factorize(np.asarray(sources))
+    # Python integers if there are too many sources for 64 bits
+    dtype = np.int64 if len(unique_sources) < 63 else object
+    flags = np.array([1 << i for i in range(len(unique_sources))], dtype=dtype)
+    return flags[codes], unique_sources, flags
+
+
+def _source_string_masks(unique_sources, flags, source_strings):
+    """
+    Return the bitmask of each source string (e.g. "NEI_TRI"), made of the
+    flags of the sources it contains.
+    """
+    # A source is in a source string if it's a substring of it, as in the
+    # original per-source-string filter.
+    return np.array(
+        [
+            sum(int(f) for a, f in zip(unique_sources, flags) if a in b)
+            for b in source_strings
+        ],
+        dtype=flags.dtype,
+    )
+
+
+def _combine_sources_by_group(df, cols, source_limit=None):
+    """
+    List the sources reporting in each group of df. This is used to find the
+    plants in an aggregation that match the same data sources. All groups are
+    done at once by OR-ing the source flags of each group.
+
+    Parameters
+    ----------
+    df : dataframe
+        Dataframe containing merged generation and emissions data - includes
+        a column for data source (i.e., eGRID, NEI, RCRAInfo...)
+    cols : list
+        Columns to group by.
+    source_limit : int, optional
+        Groups with more sources than this get NaN for both the list and the
+        string, by default None (no limit).
+
+    Returns
+    -------
+    dataframe
+        cols, then source_list (the sorted sources) and source_string (the
+        sources joined with "_") for each group.
+    """
+    row_flags, unique_sources, flags = _source_flags(df["Source"])
+    keys = df[cols].copy()
+    keys["source_flag"] = row_flags
+    # Each source once per group, so that the sum of the flags is their OR
+    keys.drop_duplicates(inplace=True)
+    groups = keys.groupby(cols, observed=True)["source_flag"].agg(
+        ["sum", "count"]
+    )
+    combined = {}
+    for mask in pd.unique(groups["sum"]):
+        source_list = sorted(
+            a for a, f in zip(unique_sources, flags) if int(mask) & int(f)
         )
+        combined[mask] = [source_list, "_".join(source_list)]
+    over_limit = [float("nan"), float("nan")]
+    source_df = pd.DataFrame(
+        [
+            over_limit if source_limit and n > source_limit else combined[mask]
+            for mask, n in zip(groups["sum"], groups["count"])
+        ],
+        index=groups.index,
+        columns=["source_list", "source_string"],
     )
-    db = db.drop(columns="Percent_of_Gen_in_EF_Denominator")
-    return db
+    return source_df.reset_index()
+
+
+def _electricity_by_source_set(db, source_strings, facility_cols, groupby_cols):
+    """
+    Sum the electricity of the facilities that report to any of the sources
+    in each source string, for all source strings in one grouped pass.
+
+    Each facility (identified by facility_cols) is counted once per source
+    string, using the first of its rows, in the order of db, whose source is
+    in the string.
+
+    Parameters
+    ----------
+    db : dataframe
+        Facility-level emissions with "Source" and "Electricity" columns.
+    source_strings : list
+        Source strings, as made by _combine_sources_by_group.
+    facility_cols : list
+        Columns that identify a facility.
+    groupby_cols : list
+        Columns to group the electricity totals by.
+
+    Returns
+    -------
+    dataframe
+        electricity_sum, electricity_mean and facility_count for each group
+        and source string, ordered by the position of the source string in
+        source_strings and then by group.
+    """
+    # Only the first row of each facility and source can be the first of its
+    # facility for any source string.
+    firsts = db.drop_duplicates(subset=facility_cols + ["Source"])
+    columns = groupby_cols + facility_cols + ["Source", "Electricity"]
+    firsts = firsts[list(dict.fromkeys(columns))]
+    flags, unique_sources, source_flags = _source_flags(firsts["Source"])
+    masks = _source_string_masks(unique_sources, source_flags, source_strings)
+    row_idx, set_idx = np.nonzero((flags[:, None] & masks[None, :]) != 0)
+    # Order by source string, then by position in db
+    order = np.lexsort((row_idx, set_idx))
+    row_idx = row_idx[order]
+    set_idx = set_idx[order]
+    expanded = firsts.iloc[row_idx].reset_index(drop=True)
+    expanded["source_set"] = set_idx
+    expanded.drop_duplicates(
+        subset=["source_set"] + facility_cols, inplace=True
+    )
+    elec_sums = expanded.groupby(
+        ["source_set"] + groupby_cols, as_index=False, observed=True
+    ).agg({"Electricity": [np.sum, np.mean], "eGRID_ID": "count"})
+    elec_sums.columns = ["source_set"] + groupby_cols + [
+        "electricity_sum",
+        "electricity_mean",
+        "facility_count",
+    ]
+    elec_sums["source_string"] = np.array(source_strings, dtype=object)[
+        elec_sums["source_set"].values
+    ]
+    return elec_sums.drop(columns="source_set")
 
 
-def calculate_electricity_by_source(db, subregion="BA"):
+def calculate_electricity_by_source(db, subregion="BA", all_sources=None):
     """
     This function calculates the electricity totals by region and source
     using the same approach as the original generation.py with attempts made to
@@ -217,10 +348,15 @@ def calculate_electricity_by_source(db, subregion="BA"):
     subregion : str, optional
         The level of subregion that the data will be aggregated to. Choices
         are 'all', 'NERC', 'BA', 'US', by default 'BA'
+    all_sources : str, optional
+        All of the sources joined with "_", the source string of the
+        non-power plant rows. By default the sources in db; give those of the
+        whole inventory when db is one region of it.
     """
 
     from electricitylci.aggregation_selector import subregion_col
-    all_sources='_'.join(sorted(list(db["Source"].unique())))
+    if all_sources is None:
+        all_sources='_'.join(sorted(list(db["Source"].unique())))
     power_plant_criteria=db["stage_code"]=="Power plant"
     db_powerplant=db.loc[power_plant_criteria,:]
     db_nonpower=db.loc[~power_plant_criteria,:]
@@ -243,29 +379,14 @@ def calculate_electricity_by_source(db, subregion="BA"):
         ]
         elec_groupby_cols = fuel_agg + ["Year"]
 
-    combine_source_by_flow = lambda x: _combine_sources(
-        x, db, ["FlowName", "Compartment"], 1
-    )
-    combine_source_lambda = lambda x: _combine_sources(
-        x, db_multiple_sources, groupby_cols
-    )
     # power_db = db.loc[db["stage_code"]=='Power plant',:]
 
-    # This is a pretty expensive process when we have to start looking at each
-    # flow generated in each compartment for each balancing authority area.
-    # To hopefully speed this up, we'll group by FlowName and Comparment and look
-    # and try to eliminate flows where all sources are single entities.
-    source_df = pd.DataFrame()
-    source_df = pd.DataFrame(
-        db_powerplant.groupby(["FlowName", "Compartment"])[["Source"]].apply(
-            combine_source_by_flow
-        ),
-        columns=["source_list"],
-    )
-    source_df[["source_list", "source_string"]] = pd.DataFrame(
-        source_df["source_list"].values.tolist(), index=source_df.index
+    # Looking at each flow generated in each compartment for each balancing
+    # authority area is expensive, so first group by FlowName and Compartment
+    # and eliminate flows where all sources are single entities.
+    source_df = _combine_sources_by_group(
+        db_powerplant, ["FlowName", "Compartment"], source_limit=1
     )
-    source_df.reset_index(inplace=True)
     old_index = db_powerplant.index
     db_powerplant = db_powerplant.merge(
         right=source_df,
@@ -276,16 +397,7 @@ def calculate_electricity_by_source(db, subregion="BA"):
     db_powerplant.index=old_index
     db_multiple_sources = db_powerplant.loc[db_powerplant["source_string"].isna(), :]
     if len(db_multiple_sources) > 0:
-        source_df = pd.DataFrame(
-            db_multiple_sources.groupby(groupby_cols)[["Source"]].apply(
-                combine_source_lambda
-            ),
-            columns=["source_list"],
-        )
-        source_df[["source_list", "source_string"]] = pd.DataFrame(
-            source_df["source_list"].values.tolist(), index=source_df.index
-        )
-        source_df.reset_index(inplace=True)
+        source_df = _combine_sources_by_group(db_multiple_sources, groupby_cols)
         db_multiple_sources.drop(
             columns=["source_list", "source_string"], inplace=True
         )
@@ -310,41 +422,97 @@ def calculate_electricity_by_source(db, subregion="BA"):
     # used as proxies for Canadian generation. In those cases the electricity
     # generation will be equal to the Electricity already in the dataframe.
 
-    elec_sum_lists = list()
-
-    unique_source_lists  = unique_source_lists+[all_sources]
-    for src in unique_source_lists:
-        module_logger.info(f"Calculating electricity for {src}")
-        # src_filter = db.apply(lambda x: x["Source"] in src, axis=1)
-        db["temp_src"] = src
-        src_filter = [
-            a in b
-            for a, b in zip(
-                db["Source"].values.tolist(), db["temp_src"].values.tolist()
-            )
-        ]
-        #        total_filter = ~fuelcat_all & src_filter
-        sub_db = db.loc[src_filter, :]
-        sub_db.drop_duplicates(subset=fuel_agg + ["eGRID_ID"], inplace=True)
-        sub_db_group = sub_db.groupby(elec_groupby_cols, as_index=False).agg(
-            {"Electricity": [np.sum, np.mean], "eGRID_ID": "count"}
-        )
-        sub_db_group.columns = elec_groupby_cols + [
-            "electricity_sum",
-            "electricity_mean",
-            "facility_count",
-        ]
-        #        zero_elec_filter = sub_db_group["electricity_sum"]==0
-        sub_db_group["source_string"] = src
-        elec_sum_lists.append(sub_db_group)
+    # Each source string once, so that the totals have one row per group
+    if all_sources not in unique_source_lists:
+        unique_source_lists  = unique_source_lists+[all_sources]
+    module_logger.info(
+        f"Calculating electricity for {len(unique_source_lists)} source sets"
+    )
+    elec_sums = _electricity_by_source_set(
+        db, unique_source_lists, fuel_agg + ["eGRID_ID"], elec_groupby_cols
+    )
     db_nonpower["source_string"]=all_sources
     db_nonpower["source_list"]=[all_sources]*len(db_nonpower)
-    elec_sums = pd.concat(elec_sum_lists, ignore_index=True)
     elec_sums.sort_values(by=elec_groupby_cols, inplace=True)
     db=pd.concat([db_powerplant,db_nonpower])
     return db, elec_sums
 
 
+def plant_key(plant_ids):
+    """
+    Int32 key of plants, from eGRID or EIA plant IDs stored as int, float or
+    str. Plant-level tables are indexed by this key so that they can be
+    joined without converting IDs back and forth.
+
+    Parameters
+    ----------
+    plant_ids : array-like
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    return np.asarray(plant_ids).astype(np.int64).astype(np.int32)
+
+
+def plant_dimension(facilities):
+    """
+    Table of plant attributes with one row per plant, indexed by the plant
+    key and sorted by it.
+
+    Parameters
+    ----------
+    facilities : dataframe
+        Plant attributes with the plant ID in FacilityID, e.g.
+        generation.egrid_facilities_w_fuel_region. Only the first row of
+        each plant is kept.
+
+    Returns
+    -------
+    dataframe
+        The attributes, with FacilityID as int.
+    """
+    plants = facilities.drop_duplicates(subset="FacilityID").assign(
+        FacilityID=lambda df: df["FacilityID"].astype(int)
+    )
+    plants.index = pd.Index(plant_key(plants["FacilityID"]), name="plant_key")
+    return plants.sort_index()
+
+
+def plant_generation(generation, years=None):
+    """
+    Net generation of plants, indexed by the plant key and the year and
+    sorted.
+
+    Parameters
+    ----------
+    generation : dataframe
+        Generation data with FacilityID, Electricity and Year columns, as
+        returned by eia923_generation.build_generation_data. Only the first
+        row of each plant and year is kept.
+    years : list, optional
+        Years to keep, by default all.
+
+    Returns
+    -------
+    series
+        Electricity
+    """
+    if years is not None:
+        generation = generation.loc[generation["Year"].isin(years), :]
+    generation = generation.drop_duplicates(subset=["FacilityID", "Year"])
+    index = pd.MultiIndex.from_arrays(
+        [
+            plant_key(generation["FacilityID"]),
+            generation["Year"].to_numpy().astype(int),
+        ],
+        names=["plant_key", "Year"],
+    )
+    return pd.Series(
+        generation["Electricity"].to_numpy(), index=index, name="Electricity"
+    ).sort_index()
+
+
 def create_generation_process_df():
     """
     Reads emissions and generation data from different sources to provide
@@ -386,7 +554,7 @@ def create_generation_process_df():
         "water": "water",
         "ground": "ground",
     }
-    if replace_egrid:
+    if model_config.replace_egrid:
         generation_data = build_generation_data().drop_duplicates()
         cems_df = ampd.generate_plant_emissions(eia_gen_year)
         cems_df.drop(columns=["FlowUUID"], inplace=True)
@@ -397,64 +565,40 @@ def create_generation_process_df():
         generation_data = build_generation_data(
             egrid_facilities_to_include=egrid_facilities_to_include
         )
-    emissions_and_waste_for_selected_egrid_facilities.drop(
+    # The FacilityID of the emissions is the ID of the facility in its
+    # inventory. The plant attributes bring the eGRID/EIA plant ID instead.
+    emissions = emissions_and_waste_for_selected_egrid_facilities.drop(
         columns=["FacilityID"]
     )
-    emissions_and_waste_for_selected_egrid_facilities[
-        "eGRID_ID"
-    ] = emissions_and_waste_for_selected_egrid_facilities["eGRID_ID"].astype(
-        int
-    )
-    final_database = pd.merge(
-        left=emissions_and_waste_for_selected_egrid_facilities,
-        right=generation_data,
-        right_on=["FacilityID", "Year"],
-        left_on=["eGRID_ID", "Year"],
-        how="left",
+    emissions.reset_index(drop=True, inplace=True)
+    emissions["eGRID_ID"] = emissions["eGRID_ID"].astype(int)
+    key = plant_key(emissions["eGRID_ID"])
+    years = emissions["Year"].to_numpy().astype(int)
+    generation = plant_generation(generation_data, years=np.unique(years))
+    emissions["Electricity"] = generation.reindex(
+        pd.MultiIndex.from_arrays([key, years])
+    ).to_numpy()
+    plants = plant_dimension(egrid_facilities_w_fuel_region).reindex(key)
+    plants.index = emissions.index
+    final_database = emissions.join(plants, rsuffix="_right")
+    del emissions, plants
+    # Plants without a fuel category in the emissions get the first one of
+    # their other rows
+    final_database["FuelCategory"] = final_database["FuelCategory"].fillna(
+        final_database.groupby("eGRID_ID")["FuelCategory"].transform("first")
     )
-    egrid_facilities_w_fuel_region[
-        "FacilityID"
-    ] = egrid_facilities_w_fuel_region["FacilityID"].astype(int)
-    final_database = pd.merge(
-        left=final_database,
-        right=egrid_facilities_w_fuel_region,
-        left_on="eGRID_ID",
-        right_on="FacilityID",
-        how="left",
-        suffixes=["", "_right"],
-    )
-    key_df = (
-        final_database[["eGRID_ID", "FuelCategory"]]
-        .dropna()
-        .drop_duplicates(subset="eGRID_ID")
-        .set_index("eGRID_ID")
-    )
-    final_database.loc[
-        final_database["FuelCategory"].isnull(), "FuelCategory"
-    ] = final_database.loc[
-        final_database["FuelCategory"].isnull(), "eGRID_ID"
-    ].map(
-        key_df["FuelCategory"]
-    )
-    if replace_egrid:
+    if model_config.replace_egrid:
         final_database["FuelCategory"].fillna(
             final_database["FuelCategory_right"], inplace=True
         )
     final_database["Final_fuel_agg"] = final_database["FuelCategory"]
-    if use_primaryfuel_for_coal:
+    if model_config.use_primaryfuel_for_coal:
         final_database.loc[
             final_database["FuelCategory"] == "COAL", ["Final_fuel_agg"]
         ] = final_database.loc[
             final_database["FuelCategory"] == "COAL", "Primary_Fuel"
         ]
 
-    try:
-        year_filter = final_database["Year_x"] == final_database["Year_y"]
-        final_database = final_database.loc[year_filter, :]
-        final_database.drop(columns="Year_y", inplace=True)
-    except KeyError:
-        pass
-    final_database.rename(columns={"Year_x": "Year"}, inplace=True)
     final_database = map_emissions_to_fedelemflows(final_database)
     dup_cols_check = [
         "FacilityID",
@@ -467,9 +611,7 @@ def create_generation_process_df():
         :, ~final_database.columns.duplicated()
     ]
     final_database = final_database.drop_duplicates(subset=dup_cols_check)
-    final_database.drop(
-        columns=["FuelCategory", "FacilityID_x", "FacilityID_y"], inplace=True
-    )
+    final_database.drop(columns=["FuelCategory"], inplace=True)
     final_database.rename(
         columns={
             "Final_fuel_agg": "FuelCategory",
@@ -498,10 +640,164 @@ def create_generation_process_df():
     final_database["FERC_Region"] = final_database["Balancing Authority Code"].map(
         ba_codes["FERC_Region"]
     )
-    return final_database
+    return to_categorical(final_database)
+
+
+# Data quality indicators, averaged with the electricity as weights
+DQI_COLUMNS = [
+    "TemporalCorrelation",
+    "TechnologicalCorrelation",
+    "GeographicalCorrelation",
+    "DataCollection",
+    "ReliabilityScore",
+]
+
+
+def _grouped_weighted_sums(df, groupby_cols, value_cols, weight_col):
+    """
+    Sums from which _weighted_means computes the weighted means of several
+    columns for each group. The sums of groups can be added up to get those
+    of larger groups.
+
+    Parameters
+    ----------
+    df : dataframe
+    groupby_cols : list
+    value_cols : list
+        Columns to average.
+    weight_col : str
+        Column with the weights.
+
+    Returns
+    -------
+    dataframe
+        Indexed by group: the sum of the weights, the weighted sum of each of
+        value_cols, and the number of missing weights and weighted values.
+    """
+    weights = df[weight_col]
+    parts = {"weight": weights, "weight_missing": weights.isna()}
+    for col in value_cols:
+        weighted = df[col] * weights
+        parts[f"{col}_weighted"] = weighted
+        parts[f"{col}_missing"] = weighted.isna()
+    return pd.DataFrame(parts).groupby(
+        [df[c] for c in groupby_cols], observed=True
+    ).sum()
+
+
+def _weighted_means(sums, value_cols):
+    """
+    Weighted means from the sums made by _grouped_weighted_sums. A group's
+    mean is NaN if its weights sum to zero or if any of its values or
+    weights is NaN, as with np.average.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = pd.DataFrame(
+            {
+                col: sums[f"{col}_weighted"] / sums["weight"]
+                for col in value_cols
+            }
+        )
+    for col in value_cols:
+        missing = (
+            (sums[f"{col}_missing"] > 0)
+            | (sums["weight_missing"] > 0)
+            | (sums["weight"] == 0)
+        )
+        means.loc[missing, col] = float("nan")
+    return means
+
+
+def _grouped_weighted_means(df, groupby_cols, value_cols, weight_col):
+    """
+    Weighted means of several columns for each group, in one grouped pass.
+
+    A group's mean is NaN if its weights sum to zero or if any of its values
+    or weights is NaN, as with np.average.
+
+    Parameters
+    ----------
+    df : dataframe
+    groupby_cols : list
+    value_cols : list
+        Columns to average.
+    weight_col : str
+        Column with the weights.
+
+    Returns
+    -------
+    dataframe
+        The weighted mean of each of value_cols, indexed by group.
+    """
+    return _weighted_means(
+        _grouped_weighted_sums(df, groupby_cols, value_cols, weight_col),
+        value_cols,
+    )
 
 
-def aggregate_data(total_db, subregion="BA"):
+def _lognormal_log_upper_bound(df, groupby_cols, value_col):
+    """
+    Fit a lognormal distribution to the values of each group and return the
+    log of the upper end of the 90% confidence interval of its mean, for all
+    groups at once.
+
+    The interval (Cox's method) uses the mean and standard deviation of the
+    logs of the values and the 95th percentile of Student's t distribution.
+    Groups with 3 or fewer values, a median that isn't positive or values
+    that aren't positive and finite get NaN, as do groups whose values are
+    all equal.
+
+    Parameters
+    ----------
+    df : dataframe
+    groupby_cols : list
+    value_col : str
+
+    Returns
+    -------
+    series
+        Indexed by group.
+    """
+    values = df[value_col]
+    usable = (values > 0) & np.isfinite(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_values = np.log(values.where(usable))
+    keys = [df[c] for c in groupby_cols]
+    grouped = pd.DataFrame(
+        {"value": values, "log_value": log_values, "unusable": ~usable}
+    ).groupby(keys, observed=True)
+    stats = grouped.agg(
+        count=("value", "size"),
+        median=("value", "median"),
+        unusable=("unusable", "sum"),
+        mean=("log_value", "mean"),
+    )
+    deviation = log_values - grouped["log_value"].transform("mean")
+    sd = np.sqrt((deviation ** 2).groupby(keys, observed=True).mean())
+    fitted = (stats["count"] > 3) & (stats["median"] > 0) & (
+        stats["unusable"] == 0
+    ) & (sd > 0)
+    return _cox_log_upper_bound(stats["count"], stats["mean"], sd, fitted)
+
+
+def _cox_log_upper_bound(count, mean, sd, fitted):
+    """
+    Log of the upper end of the 90% confidence interval (Cox's method) of
+    the mean of lognormal distributions, given the number of values and the
+    mean and standard deviation of their logs. NaN where fitted is False.
+    """
+    n = count.where(fitted).astype(float)
+    sd2 = sd ** 2
+    with np.errstate(invalid="ignore"):
+        t_upper = mean + sd * t.ppf(0.95, n - 2)
+        log_upper = mean + sd2 / 2 + np.abs(t_upper) * np.sqrt(
+            sd2 / n + sd2 ** 2 / (2 * (n - 1))
+        )
+    return log_upper.where(fitted)
+
+
+@instrumented
+def aggregate_data(total_db, subregion="BA", jobs=1, all_sources=None):
     """
     Aggregates facility-level emissions to the specified subregion and
     calculates emission factors based on the total emission and total
@@ -515,124 +811,16 @@ def aggregate_data(total_db, subregion="BA"):
     subregion : str, optional
         The level of subregion that the data will be aggregated to. Choices
         are 'all', 'NERC', 'BA', 'US', by default 'BA'.
+    jobs : int, optional
+        Number of worker processes, by default 1. With more than one, each
+        region is aggregated separately in a process pool (see
+        _aggregate_by_region). Aggregation to the US is always done in this
+        process.
+    all_sources : str, optional
+        See calculate_electricity_by_source.
     """
     from electricitylci.aggregation_selector import subregion_col
 
-    def geometric_mean(p_series, df, cols):
-        # I think I actually need to replace this with the function contained in
-        # process_exchange_aggregator_uncertainty.py. The approach to add 1 will
-        # also lead to some large errors when dealing with small numbers.
-        # Alternatively we can use scipy.stats.lognorm to fit a distribution
-        # and provide the parameters
-        if (len(p_series) > 3) & (p_series.quantile(0.5) > 0):
-            # result = gmean(p_series.to_numpy()+1)-1
-            module_logger.debug(
-                f"Calculating confidence interval for"
-                f"{df.loc[p_series.index[0],groupby_cols].values}"
-            )
-            module_logger.debug(f"{p_series.values}")
-            with np.errstate(all='raise'):
-                try:
-                    data = p_series.to_numpy()
-                except ArithmeticError or ValueError or FloatingPointError:
-                    module_logger.debug("Problem with input data")
-                    return None
-                try:
-                    log_data = np.log(data)
-                except ArithmeticError or ValueError or FloatingPointError:
-                    module_logger.debug("Problem with log function")
-                    return None
-                try:
-                    mean = np.mean(log_data)
-                except ArithmeticError or ValueError or FloatingPointError:
-                    module_logger.debug("Problem with mean function")
-                    return None
-                l = len(data)
-                try:
-                    sd = np.std(log_data)
-                    sd2 = sd ** 2
-                except ArithmeticError or ValueError or FloatingPointError:
-                    module_logger.debug("Problem with std function")
-                    return None
-                try:
-                    pi1, pi2 = t.interval(alpha=0.90, df=l - 2, loc=mean, scale=sd)
-                except ArithmeticError or ValueError or FloatingPointError:
-                    module_logger.debug("Problem with t function")
-                    return None
-                try:
-                    upper_interval = np.max(
-                        [
-                            mean
-                            + sd2 / 2
-                            + pi2 * np.sqrt(sd2 / l + sd2 ** 2 / (2 * (l - 1))),
-                            mean
-                            + sd2 / 2
-                            - pi2 * np.sqrt(sd2 / l + sd2 ** 2 / (2 * (l - 1))),
-                        ]
-                    )
-                except:
-                    module_logger.debug("Problem with interval function")
-                    return None
-                try:
-                    result = (np.exp(mean), 0, np.exp(upper_interval))
-                except ArithmeticError or ValueError or FloatingPointError:
-                    print("Prolem with result")
-                    return None
-                if result is not None:
-                    return result
-                else:
-                    module_logger.debug(
-                        f"Problem generating uncertainty parameters \n"
-                        f"{df.loc[p_series.index[0],groupby_cols].values}\n"
-                        f"{p_series.values}"
-                        f"{p_series.values+1}"
-                    )
-                    return None
-        else:
-            return None
-
-    def calc_geom_std(df):
-
-        if df["uncertaintyLognormParams"] is None:
-            return None, None
-        if isinstance(df["uncertaintyLognormParams"], str):
-            params = ast.literal_eval(df["uncertaintyLognormParams"])
-        try:
-            length = len(df["uncertaintyLognormParams"])
-        except TypeError:
-            module_logger.info(
-                f"Error calculating length of uncertaintyLognormParams"
-                f"{df['uncertaintyLognormParams']}"
-            )
-            return None, None
-        if length != 3:
-            module_logger.info(
-                f"Error estimating standard deviation - length: {len(params)}"
-            )
-        try:
-            geomean = df["Emission_factor"]
-            geostd = np.exp(
-                (
-                    np.log(df["uncertaintyLognormParams"][2])
-                    - np.log(df["Emission_factor"])
-                )
-                / norm.ppf(0.95)
-            )
-        except ArithmeticError:
-            module_logger.info("Error estimating standard deviation")
-            return None, None
-        if (
-            (geostd is np.inf)
-            or (geostd is np.NINF)
-            or (geostd is np.nan)
-            or (geostd is float("nan"))
-            or str(geostd) == "nan"
-        ):
-            return None, None
-        if geostd * geomean > df["uncertaintyMax"]:
-            return None, None
-        return str(geomean), str(geostd)
-
     region_agg = subregion_col(subregion)
     fuel_agg = ["FuelCategory"]
     if region_agg:
@@ -652,10 +840,15 @@ def aggregate_data(total_db, subregion="BA"):
             "FlowUUID",
         ]
         elec_df_groupby_cols = fuel_agg + ["Year", "source_string"]
-    total_db["FlowUUID"] = total_db["FlowUUID"].fillna(value="dummy-uuid")
+    total_db = to_categorical(total_db)
+    if jobs > 1 and region_agg:
+        return _aggregate_by_region(total_db, subregion, jobs)
+    total_db["FlowUUID"] = add_categories(
+        total_db["FlowUUID"], ["dummy-uuid"]
+    ).fillna(value="dummy-uuid")
     total_db = aggregate_facility_flows(total_db)
     total_db, electricity_df = calculate_electricity_by_source(
-        total_db, subregion
+        total_db, subregion, all_sources
     )
     total_db = add_data_collection_score(total_db, electricity_df, subregion)
     total_db["facility_emission_factor"] = (
@@ -663,55 +856,72 @@ def aggregate_data(total_db, subregion="BA"):
     )
     total_db.dropna(subset=["facility_emission_factor"], inplace=True)
 
-    def wtd_mean(pdser, total_db, cols):
-        try:
-            wts = total_db.loc[pdser.index, "Electricity"]
-            result = np.average(pdser, weights=wts)
-        except:
-            module_logger.info(
-                f"Error calculating weighted mean for {pdser.name}-"
-                f"{total_db.loc[pdser.index[0],cols]}"
-            )
-            result = float("nan")
-        return result
-
-    wm = lambda x: wtd_mean(x, total_db, groupby_cols)
-    geo_mean = lambda x: geometric_mean(x, total_db, groupby_cols)
-    geo_mean.__name__ = "geo_mean"
     print(
         "Aggregating flow amounts, dqi information, and calculating uncertainty"
     )
-
-    database_f3 = total_db.groupby(
-        groupby_cols + ["Year", "source_string"], as_index=False
-    ).agg(
-        {
-            "FlowAmount": ["sum", "count"],
-            "TemporalCorrelation": wm,
-            "TechnologicalCorrelation": wm,
-            "GeographicalCorrelation": wm,
-            "DataCollection": wm,
-            "ReliabilityScore": wm,
-            "facility_emission_factor": ["min", "max", geo_mean],
-        }
+    dqi_cols = DQI_COLUMNS
+    flow_groupby_cols = groupby_cols + ["Year", "source_string"]
+    grouped = total_db.groupby(flow_groupby_cols, observed=True)
+    flow_amounts = grouped.agg(
+        FlowAmount=("FlowAmount", "sum"),
+        FlowAmountCount=("FlowAmount", "count"),
     )
-    database_f3.columns = groupby_cols + [
-        "Year",
-        "source_string",
-        "FlowAmount",
-        "FlowAmountCount",
-        "TemporalCorrelation",
-        "TechnologicalCorrelation",
-        "GeographicalCorrelation",
-        "DataCollection",
-        "ReliabilityScore",
-        "uncertaintyMin",
-        "uncertaintyMax",
-        "uncertaintyLognormParams",
-    ]
+    uncertainty_bounds = grouped.agg(
+        uncertaintyMin=("facility_emission_factor", "min"),
+        uncertaintyMax=("facility_emission_factor", "max"),
+    )
+    database_f3 = pd.concat(
+        [
+            flow_amounts,
+            _grouped_weighted_means(
+                total_db, flow_groupby_cols, dqi_cols, "Electricity"
+            ),
+            uncertainty_bounds,
+            _lognormal_log_upper_bound(
+                total_db, flow_groupby_cols, "facility_emission_factor"
+            ).rename("log_upper"),
+        ],
+        axis=1,
+    ).reset_index()
+    return _finish_aggregation(
+        database_f3,
+        electricity_df,
+        total_db,
+        groupby_cols,
+        elec_df_groupby_cols,
+        region_agg,
+    )
+
+
+def _finish_aggregation(
+    database_f3, electricity_df, total_db, groupby_cols, elec_df_groupby_cols,
+    region_agg
+):
+    """
+    Add the electricity totals to the aggregated flows and compute the
+    emission factors and their lognormal uncertainty.
+
+    Parameters
+    ----------
+    database_f3 : dataframe
+        Aggregated flows, with the log of the upper bound of the confidence
+        interval of each emission factor in a log_upper column.
+    electricity_df : dataframe
+        Electricity totals by region, fuel, year and source string.
+    total_db : dataframe
+        The facility-level emissions, in the order they were aggregated. Only
+        the Canadian rows (fuel category ALL) are used.
+    groupby_cols : list
+    elec_df_groupby_cols : list
+    region_agg : list or None
+        See aggregate_data.
 
+    Returns
+    -------
+    dataframe
+    """
     criteria = database_f3["Compartment"] == "input"
-    database_f3.loc[criteria, "uncertaintyLognormParams"] = None
+    database_f3.loc[criteria, "log_upper"] = float("nan")
     database_f3 = database_f3.merge(
         right=electricity_df,
         left_on=elec_df_groupby_cols,
@@ -729,9 +939,9 @@ def aggregate_data(total_db, subregion="BA"):
             how="left",
         ).drop_duplicates(subset=groupby_cols)
     else:
-        total_grouped = total_db.groupby(by=groupby_cols, as_index=False)[
-            "Electricity"
-        ].sum()
+        total_grouped = total_db.groupby(
+            by=groupby_cols, as_index=False, observed=True
+        )["Electricity"].sum()
         canada_db = pd.merge(
             left=database_f3.loc[canadian_criteria, :],
             right=total_grouped,
@@ -749,20 +959,880 @@ def aggregate_data(total_db, subregion="BA"):
     database_f3["Emission_factor"] = (
         database_f3["FlowAmount"] / database_f3["electricity_sum"]
     )
-    database_f3["GeomMean"], database_f3["GeomSD"] = zip(
-        *database_f3[
-            [
-                "Emission_factor",
-                "uncertaintyLognormParams",
-                "uncertaintyMin",
-                "uncertaintyMax",
-            ]
-        ].apply(calc_geom_std, axis=1)
+    # The geometric standard deviation of a lognormal distribution with the
+    # emission factor as its geometric mean and the upper bound of the
+    # interval as its 95th percentile.
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        geom_sd = np.exp(
+            (database_f3["log_upper"] - np.log(database_f3["Emission_factor"]))
+            / norm.ppf(0.95)
+        )
+    valid = np.isfinite(geom_sd) & ~(
+        geom_sd * database_f3["Emission_factor"] > database_f3["uncertaintyMax"]
     )
-    database_f3.sort_values(by=groupby_cols, inplace=True)
+    database_f3["GeomMean"] = database_f3["Emission_factor"].where(valid)
+    database_f3["GeomSD"] = geom_sd.where(valid)
+    database_f3.drop(columns="log_upper", inplace=True)
+    # A stable sort, so that the rows of a flow with several years or source
+    # strings keep the order of the groups and regions aggregated separately
+    # come out in the same order.
+    database_f3.sort_values(by=groupby_cols, inplace=True, kind="mergesort")
     return database_f3
 
 
+def _aggregate_partition(frame, start, stop, subregion, all_sources):
+    """
+    Aggregate rows start to stop of the facility-level emissions, in a
+    worker process of _aggregate_by_region. frame is the path of the Arrow
+    file holding all of the rows, or just these rows as a dataframe.
+    """
+    from electricitylci.source_data import read_shared_frame
+
+    if isinstance(frame, str):
+        frame = read_shared_frame(frame, start, stop)
+    return aggregate_data(frame, subregion, all_sources=all_sources)
+
+
+def _aggregate_by_region(total_db, subregion, jobs):
+    """
+    Aggregate the facility-level emissions in a process pool, split into
+    parts made of whole regions, and concatenate the results.
+
+    Every group of aggregate_data lies within one region, so the regions can
+    be aggregated independently; only the string of all sources, used for the
+    rows that aren't from power plants, is taken from the whole inventory.
+    The rows are sorted by region and written once to an uncompressed Arrow
+    file (see source_data.write_shared_frame). Each worker memory-maps the
+    file and converts only the rows of its part, so the frame isn't copied
+    through the pool. If the frame can't be written to Arrow the rows of each
+    part are sent to the workers instead.
+
+    Rows without a region aren't in any group and are left out. The result
+    is the same as aggregating in one process, apart from the index.
+
+    Parameters
+    ----------
+    total_db : dataframe
+        Facility-level emissions, see aggregate_data.
+    subregion : str
+        See aggregate_data; not "US".
+    jobs : int
+        Number of worker processes.
+
+    Returns
+    -------
+    dataframe
+    """
+    import os
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from electricitylci.aggregation_selector import subregion_col
+    from electricitylci.model_config import get_model_config, set_model_config
+    from electricitylci.source_data import write_shared_frame
+
+    region = subregion_col(subregion)[0]
+    all_sources = "_".join(sorted(list(total_db["Source"].unique())))
+    total_db = total_db.loc[total_db[region].notna(), :]
+    # A stable sort keeps the order of the rows within each region
+    total_db = total_db.sort_values(by=region, kind="mergesort")
+    total_db.reset_index(drop=True, inplace=True)
+    regions = total_db[region].to_numpy()
+    if len(regions) == 0 or (regions == regions[0]).all():
+        return aggregate_data(total_db, subregion, all_sources=all_sources)
+    region_starts = np.flatnonzero(
+        np.append(True, regions[1:] != regions[:-1])
+    )
+    # Runs of whole regions with about the same number of rows, a couple per
+    # process, so that the fixed cost of each aggregation is paid a few
+    # times rather than once per region.
+    n_parts = min(len(region_starts), 2 * jobs)
+    cuts = np.searchsorted(
+        region_starts, np.arange(n_parts) * len(regions) / n_parts
+    )
+    starts = region_starts[np.unique(cuts[cuts < len(region_starts)])]
+    stops = np.append(starts[1:], len(regions))
+    print(
+        f"Aggregating {len(region_starts)} regions in {len(starts)} parts "
+        f"with {jobs} processes"
+    )
+    folder = tempfile.mkdtemp(prefix="elci_aggregate_")
+    try:
+        path = os.path.join(folder, "facility_emissions.arrow")
+        shared = write_shared_frame(total_db, path)
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=set_model_config,
+            initargs=(get_model_config(),),
+        ) as executor:
+            # Largest parts first, so that they don't finish last
+            futures = {}
+            for i in np.argsort(starts - stops, kind="stable"):
+                start, stop = int(starts[i]), int(stops[i])
+                futures[i] = executor.submit(
+                    _aggregate_partition,
+                    path if shared else total_db.iloc[start:stop],
+                    start,
+                    stop,
+                    subregion,
+                    all_sources,
+                )
+            results = [futures[i].result() for i in range(len(starts))]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    # Each result is sorted and the parts come in order of region, so the
+    # concatenation is sorted too.
+    return concat_categorical(results, ignore_index=True)
+
+
+def _log_moments(df, groupby_cols, value_col):
+    """
+    Statistics of the logs of the values of each group from which
+    _combined_log_upper_bound fits lognormal distributions to larger groups
+    made of several of these groups.
+
+    Returns
+    -------
+    dataframe
+        Indexed by group: the number of values, the number that aren't
+        positive and finite, and the count, mean and sum of squared
+        deviations from the mean of the logs of the other values.
+    """
+    values = df[value_col]
+    usable = (values > 0) & np.isfinite(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_values = np.log(values.where(usable))
+    keys = [df[c] for c in groupby_cols]
+    grouped = pd.DataFrame(
+        {"log_value": log_values, "unusable": ~usable}
+    ).groupby(keys, observed=True)
+    moments = grouped.agg(
+        count=("unusable", "size"),
+        unusable=("unusable", "sum"),
+        log_count=("log_value", "count"),
+        log_mean=("log_value", "mean"),
+    )
+    deviation = log_values - grouped["log_value"].transform("mean")
+    moments["log_m2"] = (deviation ** 2).groupby(keys, observed=True).sum()
+    return moments
+
+
+def _combine_log_moments(moments, groupby_cols):
+    """
+    Combine the log moments made by _log_moments of the groups in moments
+    into those of larger groups. The sums of squared deviations are combined
+    with the parallel algorithm of Chan et al., which adds the spread of the
+    means of the parts.
+
+    Returns
+    -------
+    dataframe
+        The same statistics as _log_moments, indexed by group.
+    """
+    keys = [moments[c] for c in groupby_cols]
+    parts = pd.DataFrame(
+        {
+            "count": moments["count"],
+            "unusable": moments["unusable"],
+            "log_count": moments["log_count"],
+            "log_sum": (moments["log_mean"] * moments["log_count"]).fillna(0),
+        }
+    )
+    grouped = parts.groupby(keys, observed=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        group_mean = grouped["log_sum"].transform("sum") / grouped[
+            "log_count"
+        ].transform("sum")
+    parts["log_m2"] = moments["log_m2"].fillna(0) + (
+        moments["log_count"] * (moments["log_mean"] - group_mean) ** 2
+    ).fillna(0)
+    combined = parts.groupby(keys, observed=True).sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        combined["log_mean"] = combined["log_sum"] / combined["log_count"]
+    return combined[["count", "unusable", "log_count", "log_mean", "log_m2"]]
+
+
+def _combined_log_upper_bound(moments, groupby_cols):
+    """
+    Fit lognormal distributions to groups of the groups in moments, made by
+    _log_moments, as _lognormal_log_upper_bound does from the values.
+
+    Returns
+    -------
+    series
+        Log of the upper bound of the confidence interval, indexed by group.
+    """
+    stats = _combine_log_moments(moments, groupby_cols)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sd = np.sqrt(stats["log_m2"] / stats["log_count"])
+    # With no unusable values the median is positive
+    fitted = (stats["count"] > 3) & (stats["unusable"] == 0) & (sd > 0)
+    return _cox_log_upper_bound(stats["count"], stats["log_mean"], sd, fitted)
+
+
+def _region_columns(subregions):
+    """The region columns of all of the subregions, each once."""
+    from electricitylci.aggregation_selector import subregion_col
+
+    return list(
+        dict.fromkeys(
+            col for sub in subregions for col in (subregion_col(sub) or [])
+        )
+    )
+
+
+def _cell_ids(df, region_cols):
+    """
+    Number the combinations of region_cols in df. Missing regions are a
+    value of their own, so that a row without e.g. a NERC region is still in
+    its BA.
+    """
+    if not region_cols:
+        return pd.Series(0, index=df.index)
+    codes = pd.DataFrame(
+        {c: pd.factorize(df[c])[0] for c in region_cols}, index=df.index
+    )
+    return codes.groupby(region_cols).ngroup()
+
+
+# Keys of the groups of the partial aggregates, besides the region columns
+_CELL_KEYS = [
+    "FuelCategory",
+    "stage_code",
+    "FlowName",
+    "Compartment",
+    "FlowUUID",
+    "Year",
+]
+# The data collection score depends on the subregion, see _finish_levels
+_CELL_DQI_COLUMNS = [c for c in DQI_COLUMNS if c != "DataCollection"]
+_CELL_SUM_COLUMNS = [
+    "FlowAmount",
+    "FlowAmountCount",
+    "weight",
+    "weight_missing",
+] + [f"{c}_{s}" for c in _CELL_DQI_COLUMNS for s in ("weighted", "missing")]
+_FLOW_COLUMNS = ["FuelCategory", "Year", "stage_code", "FlowName", "Compartment"]
+_SOURCE_FACILITY_COLUMNS = ["FuelCategory", "eGRID_ID", "Source", "Year"]
+_REGION_FACILITY_COLUMNS = ["FuelCategory", "Year", "eGRID_ID"]
+
+
+def _facility_partials(total_db, region_cols):
+    """
+    Aggregate facility-level emissions to cells, the combinations of the
+    region columns, keeping what _finish_levels needs to build the
+    aggregates of any subregion made of these columns. Partial aggregates
+    of different facilities can be merged with _merge_partials.
+
+    Parameters
+    ----------
+    total_db : dataframe
+        Facility-level emissions, see aggregate_data_levels. Modified.
+    region_cols : list
+
+    Returns
+    -------
+    dict
+        sources: the sources in total_db.
+        stats: for each group of a cell, the flow sums and counts, the
+        electricity-weighted sums of the data quality scores but the data
+        collection score, the smallest and largest emission factor, and the
+        log moments of the emission factors (see _log_moments).
+        power_sources: the sources of the power plant flows of each cell.
+        source_facilities: the first row of each facility and source, for
+        the electricity totals of each source string (see
+        _electricity_by_source_set).
+        region_facilities: the first row of each facility, with the power
+        plant rows first as in calculate_electricity_by_source, for the
+        electricity totals of each region and fuel category.
+        canada: the Canadian rows (fuel category ALL).
+    """
+    missing = [c for c in region_cols if c not in total_db.columns]
+    if missing:
+        from electricitylci.combinator import ba_codes
+
+        for col in missing:
+            total_db[col] = total_db["Balancing Authority Code"].map(
+                ba_codes[col]
+            )
+    total_db = to_categorical(total_db)
+    total_db["FlowUUID"] = add_categories(
+        total_db["FlowUUID"], ["dummy-uuid"]
+    ).fillna(value="dummy-uuid")
+    sources = sorted(list(total_db["Source"].unique()))
+    total_db = aggregate_facility_flows(total_db)
+    total_db["cell"] = _cell_ids(total_db, region_cols)
+
+    is_power = total_db["stage_code"] == "Power plant"
+    power_sources = total_db.loc[
+        is_power, ["cell"] + region_cols + _FLOW_COLUMNS + ["Source"]
+    ].drop_duplicates()
+    source_facility_cols = ["cell"] + _SOURCE_FACILITY_COLUMNS
+    source_facilities = total_db.drop_duplicates(
+        subset=source_facility_cols
+    )[source_facility_cols + region_cols + ["Electricity"]]
+    total_db = pd.concat([total_db[is_power], total_db[~is_power]])
+    region_facility_cols = ["cell"] + _REGION_FACILITY_COLUMNS
+    region_facilities = total_db.drop_duplicates(
+        subset=region_facility_cols
+    )[region_facility_cols + region_cols + ["Electricity"]]
+
+    total_db["facility_emission_factor"] = (
+        total_db["FlowAmount"] / total_db["Electricity"]
+    )
+    total_db.dropna(subset=["facility_emission_factor"], inplace=True)
+    cell_keys = ["cell"] + _CELL_KEYS
+    grouped = total_db.groupby(cell_keys, observed=True)
+    stats = pd.concat(
+        [
+            grouped.agg(
+                FlowAmount=("FlowAmount", "sum"),
+                FlowAmountCount=("FlowAmount", "count"),
+                uncertaintyMin=("facility_emission_factor", "min"),
+                uncertaintyMax=("facility_emission_factor", "max"),
+            ),
+            _grouped_weighted_sums(
+                total_db, cell_keys, _CELL_DQI_COLUMNS, "Electricity"
+            ),
+            _log_moments(total_db, cell_keys, "facility_emission_factor"),
+        ],
+        axis=1,
+    ).reset_index()
+    cells = total_db.drop_duplicates(subset="cell").set_index("cell")[
+        region_cols
+    ]
+    for col in region_cols:
+        stats[col] = cells[col].reindex(stats["cell"]).values
+    canada = total_db.loc[
+        total_db["FuelCategory"] == "ALL",
+        region_cols + _CELL_KEYS + ["Electricity"],
+    ]
+    return {
+        "sources": sources,
+        "stats": to_categorical(stats.drop(columns="cell")),
+        "power_sources": power_sources.drop(columns="cell"),
+        "source_facilities": source_facilities.drop(columns="cell"),
+        "region_facilities": region_facilities.drop(columns="cell"),
+        "canada": canada,
+    }
+
+
+def _merge_partials(partials, region_cols):
+    """
+    Merge partial aggregates made by _facility_partials, of different sets
+    of facilities, into those of all of them.
+    """
+    if len(partials) == 1:
+        return partials[0]
+
+    def concat(name):
+        return concat_categorical(
+            [p[name] for p in partials], ignore_index=True
+        )
+
+    def first_rows(name, cols):
+        df = concat(name)
+        cell = _cell_ids(df, region_cols).rename("cell")
+        return df[~pd.concat([cell, df[cols]], axis=1).duplicated()]
+
+    stats = concat("stats")
+    cell_keys = ["cell"] + _CELL_KEYS
+    stats["cell"] = _cell_ids(stats, region_cols)
+    grouped = stats.groupby(cell_keys, observed=True)
+    merged = pd.concat(
+        [
+            grouped[_CELL_SUM_COLUMNS].sum(),
+            grouped.agg(
+                uncertaintyMin=("uncertaintyMin", "min"),
+                uncertaintyMax=("uncertaintyMax", "max"),
+            ),
+            _combine_log_moments(stats, cell_keys),
+        ],
+        axis=1,
+    ).reset_index()
+    cells = stats.drop_duplicates(subset="cell").set_index("cell")
+    for col in region_cols:
+        merged[col] = cells[col].reindex(merged["cell"]).values
+    merged.drop(columns="cell", inplace=True)
+    power_sources = concat("power_sources")
+    return {
+        "sources": sorted(set().union(*(p["sources"] for p in partials))),
+        "stats": to_categorical(merged),
+        "power_sources": power_sources[
+            ~pd.concat(
+                [_cell_ids(power_sources, region_cols), power_sources], axis=1
+            ).duplicated()
+        ],
+        "source_facilities": first_rows(
+            "source_facilities", _SOURCE_FACILITY_COLUMNS
+        ),
+        "region_facilities": first_rows(
+            "region_facilities", _REGION_FACILITY_COLUMNS
+        ),
+        "canada": concat("canada"),
+    }
+
+
+def _finish_levels(partials, subregions):
+    """
+    Build the aggregates of each subregion from the partial aggregates of
+    the cells, see aggregate_data_levels.
+
+    Returns
+    -------
+    dict
+        The aggregated emissions for each subregion.
+    """
+    from electricitylci.aggregation_selector import subregion_col
+
+    all_sources = "_".join(partials["sources"])
+    stats = partials["stats"]
+    power_sources = partials["power_sources"]
+    # Source strings of the power plant flows with one source everywhere, as
+    # in calculate_electricity_by_source. The sources of the other flows are
+    # combined for each subregion.
+    flow_sources = _combine_sources_by_group(
+        power_sources, ["FlowName", "Compartment"], source_limit=1
+    ).drop(columns="source_list")
+    power_sources = power_sources[
+        power_sources.merge(
+            flow_sources, on=["FlowName", "Compartment"], how="left"
+        )["source_string"]
+        .isna()
+        .values
+    ]
+    fuel_agg = ["FuelCategory"]
+
+    results = {}
+    for subregion in subregions:
+        print(f"Aggregating to subregion - {subregion}")
+        region_agg = subregion_col(subregion)
+        region_list = region_agg or []
+        groupby_cols = region_list + fuel_agg + [
+            "stage_code",
+            "FlowName",
+            "Compartment",
+            "FlowUUID",
+        ]
+        elec_df_groupby_cols = region_list + fuel_agg + ["Year"]
+        flow_groupby_cols = groupby_cols + ["Year", "source_string"]
+
+        source_df = _combine_sources_by_group(
+            power_sources, region_list + _FLOW_COLUMNS
+        )
+        level = stats.copy()
+        power = (level["stage_code"] == "Power plant").values
+        level["source_string"] = all_sources
+        power_keys = level.loc[power, region_list + _FLOW_COLUMNS]
+        level.loc[power, "source_string"] = (
+            power_keys.merge(
+                flow_sources, on=["FlowName", "Compartment"], how="left"
+            )["source_string"]
+            .fillna(
+                power_keys.merge(
+                    source_df, on=region_list + _FLOW_COLUMNS, how="left"
+                )["source_string"]
+            )
+            .values
+        )
+        source_strings = [
+            x
+            for x in pd.unique(level.loc[power, "source_string"])
+            if str(x) != "nan"
+        ]
+        if all_sources not in source_strings:
+            source_strings.append(all_sources)
+        electricity_df = _electricity_by_source_set(
+            partials["source_facilities"],
+            source_strings,
+            fuel_agg + ["eGRID_ID"],
+            elec_df_groupby_cols,
+        )
+        electricity_df.sort_values(by=elec_df_groupby_cols, inplace=True)
+        region_elec = (
+            partials["region_facilities"]
+            .drop_duplicates(subset=elec_df_groupby_cols + ["eGRID_ID"])
+            .groupby(elec_df_groupby_cols, as_index=False, observed=True)[
+                "Electricity"
+            ]
+            .sum()
+            .rename(columns={"Electricity": "region_fuel_electricity"})
+        )
+
+        grouped = level.groupby(flow_groupby_cols, observed=True)
+        sums = grouped[_CELL_SUM_COLUMNS].sum()
+        # Every facility row of a group has the same data collection score,
+        # that of its region, fuel category, year and source string (see
+        # add_data_collection_score).
+        denominators = (
+            sums.index.to_frame(index=False)
+            .merge(
+                electricity_df,
+                on=elec_df_groupby_cols + ["source_string"],
+                how="left",
+            )
+            .merge(region_elec, on=elec_df_groupby_cols, how="left")
+        )
+        data_collection = _data_collection_score(
+            denominators["electricity_sum"].values,
+            denominators["region_fuel_electricity"].values,
+        )
+        sums["DataCollection_weighted"] = (
+            data_collection * sums["weight"].values
+        )
+        sums["DataCollection_missing"] = sums["weight_missing"]
+        database_f3 = pd.concat(
+            [
+                sums[["FlowAmount", "FlowAmountCount"]],
+                _weighted_means(sums, DQI_COLUMNS),
+                grouped.agg(
+                    uncertaintyMin=("uncertaintyMin", "min"),
+                    uncertaintyMax=("uncertaintyMax", "max"),
+                ),
+                _combined_log_upper_bound(level, flow_groupby_cols).rename(
+                    "log_upper"
+                ),
+            ],
+            axis=1,
+        ).reset_index()
+        results[subregion] = _finish_aggregation(
+            database_f3,
+            electricity_df,
+            partials["canada"],
+            groupby_cols,
+            elec_df_groupby_cols + ["source_string"],
+            region_agg,
+        )
+    return results
+
+
+@instrumented
+def aggregate_data_levels(
+    total_db, subregions=("BA", "FERC", "EIA", "NERC", "US")
+):
+    """
+    Aggregates facility-level emissions to several subregions at once, with
+    the same result as calling aggregate_data for each of them.
+
+    The facility flows are aggregated once, to cells: the combinations of
+    the region columns of all of the subregions. The FERC and EIA region of
+    a BA come from combinator.ba_codes, so with BAs these add no cells, but a
+    BA can span NERC regions. For each group of a cell only sufficient
+    statistics are kept: the flow sums and counts, the electricity-weighted
+    sums of the data quality scores, the smallest and largest emission
+    factor, and the count, mean and sum of squared deviations of the logs of
+    the emission factors. The groups of each subregion are built by adding
+    up the statistics of their cells, and the lognormal distributions are
+    fitted to those.
+
+    The source strings, the electricity totals behind the emission factors
+    and the data collection scores depend on which facilities are in a
+    region, so they are computed for each subregion, from tables with one
+    row for each facility, source and year.
+
+    Parameters
+    ----------
+    total_db : dataframe
+        Facility-level emissions as created by create_generation_process_df.
+        FERC_Region and EIA_Region are added from the Balancing Authority
+        Code if needed.
+    subregions : iterable, optional
+        The subregions to aggregate to, by default BA, FERC, EIA, NERC and
+        US. See aggregate_data.
+
+    Returns
+    -------
+    dict
+        The aggregated emissions for each subregion, as returned by
+        aggregate_data apart from rounding.
+    """
+    partials = _facility_partials(total_db, _region_columns(subregions))
+    return _finish_levels(partials, subregions)
+
+
+def write_facility_dataset(total_db, path, row_group_size=100000):
+    """
+    Write facility-level emissions to a Parquet file for aggregate_dataset.
+
+    The rows are sorted by plant, keeping the order of the rows of each
+    plant, so that each chunk of plants read by aggregate_dataset is a range
+    of row groups.
+
+    Parameters
+    ----------
+    total_db : dataframe
+        Facility-level emissions as created by create_generation_process_df.
+    path : str
+    row_group_size : int, optional
+        Rows per row group, by default 100000.
+    """
+    total_db.sort_values(by="eGRID_ID", kind="mergesort").to_parquet(
+        path, index=False, row_group_size=row_group_size
+    )
+
+
+@instrumented
+def aggregate_dataset(path, subregions=("BA",), plants_per_chunk=1000):
+    """
+    Aggregates facility-level emissions stored in a Parquet dataset to one or
+    more subregions, reading them in chunks of plants so that only one chunk
+    is in memory at a time.
+
+    Each chunk is reduced to partial aggregates (see aggregate_data_levels):
+    flow sums and counts, electricity-weighted data quality sums, emission
+    factor bounds and log moments for each group, plus small tables of the
+    sources and electricity of each facility. These are merged into those of
+    the chunks before, and the emission factors and their uncertainty are
+    computed once all chunks are read. All rows of a plant are in the same
+    chunk, so the facility flows are aggregated as for the whole frame.
+
+    Parameters
+    ----------
+    path : str
+        Parquet file or folder of Parquet files with the columns of the
+        frame returned by create_generation_process_df, best written with
+        write_facility_dataset.
+    subregions : iterable, optional
+        The subregions to aggregate to, by default BA. See aggregate_data.
+    plants_per_chunk : int, optional
+        Number of plants read at a time, by default 1000.
+
+    Returns
+    -------
+    dict
+        The aggregated emissions for each subregion, as returned by
+        aggregate_data apart from rounding.
+    """
+    import pyarrow.dataset as ds
+
+    region_cols = _region_columns(subregions)
+    dataset = ds.dataset(path, format="parquet")
+    plants = np.sort(
+        pd.unique(
+            dataset.to_table(columns=["eGRID_ID"])
+            .column("eGRID_ID")
+            .to_pandas()
+            .dropna()
+        )
+    )
+    n_chunks = max(1, -(-len(plants) // plants_per_chunk))
+    module_logger.info(
+        f"Aggregating {len(plants)} plants in {n_chunks} chunks"
+    )
+    partials = None
+    for i in range(0, len(plants), plants_per_chunk):
+        chunk_plants = plants[i:i + plants_per_chunk]
+        # The plants of a chunk are a range of the sorted plant ids
+        plant_id = ds.field("eGRID_ID")
+        chunk = dataset.to_table(
+            filter=(plant_id >= chunk_plants[0])
+            & (plant_id <= chunk_plants[-1])
+        ).to_pandas()
+        print(f"Aggregating plants {i + 1}-{i + len(chunk_plants)}")
+        chunk_partials = _facility_partials(chunk, region_cols)
+        del chunk
+        if partials is None:
+            partials = chunk_partials
+        else:
+            partials = _merge_partials([partials, chunk_partials], region_cols)
+    if partials is None:
+        raise ValueError(f"No plants in {path}")
+    return _finish_levels(partials, subregions)
+
+
+# Keys of the exchange dictionaries made by olcaschema_genprocess. The
+# reference exchange from ref_exchange_creator adds "location".
+EXCHANGE_KEYS = [
+    "internalId",
+    "@type",
+    "avoidedProduct",
+    "flow",
+    "flowProperty",
+    "input",
+    "quantitativeReference",
+    "baseUncertainty",
+    "provider",
+    "amount",
+    "amountFormula",
+    "unit",
+    "pedigreeUncertainty",
+    "dqEntry",
+    "uncertainty",
+    "comment",
+    "location",
+]
+
+
+def _exchange_lists(database, base_cols, upstream_dict):
+    """
+    Build the exchange dictionaries of the generation processes for all rows
+    of database in one pass over its columns, then split them into one list
+    per process.
+
+    Each list holds an exchange for each row of the group, in the order of
+    database, followed by the reference exchange from ref_exchange_creator.
+    Keys missing from an exchange get NaN, as when the exchanges were
+    collected in a dataframe.
+
+    Parameters
+    ----------
+    database : dataframe
+        Aggregated emissions, as made by aggregate_data.
+    base_cols : list
+        Columns identifying a process (region and fuel category).
+    upstream_dict : dictionary
+        openLCA-formatted upstream processes by stage_code, used as the
+        default providers of fuel inputs.
+
+    Returns
+    -------
+    series
+        List of exchanges for each process, indexed by base_cols.
+    """
+    from electricitylci.process_dictionary_writer import (
+        unit,
+        ref_exchange_creator,
+    )
+
+    grouped = database.groupby(by=base_cols, observed=True)
+    group_ids = grouped.ngroup().values
+    group_index = grouped.size().index
+    # Rows with a missing key aren't in any group
+    rows = np.flatnonzero(group_ids >= 0)
+    rows = rows[np.argsort(group_ids[rows], kind="stable")]
+    group_ids = group_ids[rows]
+    data = database.iloc[rows]
+
+    compartment = data["Compartment"]
+    is_input = (
+        (compartment == "input") | (compartment.str.find("resource") != -1)
+    ).tolist()
+    stage_codes = data["stage_code"].tolist()
+    flow_names = data["FlowName"].tolist()
+    flow_uuids = data["FlowUUID"].tolist()
+    compartments = compartment.tolist()
+    amounts = data["Emission_factor"].tolist()
+    # numpy scalars, as used in the uncertainty dictionaries
+    geom_means = data["GeomMean"].values
+    geom_sds = data["GeomSD"].values
+    maxima = data["uncertaintyMax"].values
+    minima = data["uncertaintyMin"].values
+    years = data["Year"].astype(str).values
+    sources = data["source_string"].astype(str).values
+    dqi_values = {
+        col: data[col].values
+        for col in [
+            "ReliabilityScore",
+            "TemporalCorrelation",
+            "GeographicalCorrelation",
+            "TechnologicalCorrelation",
+            "DataCollection",
+        ]
+    }
+
+    def dq_entry(i):
+        return (
+            "("
+            + ";".join(
+                str(round(values[i], 1)) for values in dqi_values.values()
+            )
+            + ")"
+        )
+
+    def uncertainty(i):
+        ar = dict()
+        if pd.notna(geom_means[i]):
+            ar["geomMean"] = str(float(geom_means[i]))
+        if pd.notna(geom_sds[i]):
+            ar["geomSd"] = str(float(geom_sds[i]))
+        ar["distributionType"] = "Logarithmic Normal Distribution"
+        ar["mean"] = ""
+        ar["meanFormula"] = ""
+        ar["geomMeanFormula"] = ""
+        ar["maximum"] = maxima[i]
+        ar["minimum"] = minima[i]
+        ar["minimumFormula"] = ""
+        ar["sd"] = ""
+        ar["sdFormula"] = ""
+        ar["geomSdFormula"] = ""
+        ar["mode"] = ""
+        ar["modeFormula"] = ""
+        ar["maximumFormula"] = ""
+        return ar
+
+    def flow(i, flowtype):
+        ar = dict()
+        ar["flowType"] = flowtype
+        ar["flowProperties"] = ""
+        # cutoff name at length 255 if greater than that
+        ar["name"] = flow_names[i][0:255]
+        ar["id"] = flow_uuids[i]
+        comp = str(compartments[i])
+        if (flowtype == "ELEMENTARY_FLOW") & (comp != ""):
+            ar["category"] = "Elementary flows/" + comp + "/" + comp
+        elif (flowtype == "PRODUCT_FLOW") & (comp != ""):
+            ar["category"] = comp
+        else:
+            # Assume this is electricity or a byproduct
+            ar[
+                "category"
+            ] = "22: Utilities/2211: Electric Power Generation, Transmission and Distribution"
+        return ar
+
+    exchange_lists = []
+    starts = np.flatnonzero(np.diff(group_ids, prepend=-1))
+    ends = np.append(starts[1:], len(group_ids))
+    for start, end in zip(starts, ends):
+        default_unit = unit("kg")
+        dq = dq_entry(start)
+        year = ",".join(pd.unique(years[start:end]))
+        datasources = ",".join(pd.unique(sources[start:end]))
+        comment = f"{datasources} - {year}"
+        exchanges = []
+        for i in range(start, end):
+            upstream = upstream_dict.get(stage_codes[i])
+            if upstream is not None:
+                provider = {
+                    "name": upstream["name"],
+                    "categoryPath": upstream["category"],
+                    "processType": "UNIT_PROCESS",
+                    "@id": upstream["uuid"],
+                }
+                exchange_unit = unit(upstream["q_reference_unit"])
+                flowtype = "PRODUCT_FLOW"
+            else:
+                provider = ""
+                exchange_unit = default_unit
+                flowtype = "ELEMENTARY_FLOW"
+            exchanges.append(
+                {
+                    "internalId": "",
+                    "@type": "Exchange",
+                    "avoidedProduct": False,
+                    "flow": flow(i, flowtype),
+                    "flowProperty": "",
+                    "input": is_input[i],
+                    "quantitativeReference": False,
+                    "baseUncertainty": "",
+                    "provider": provider,
+                    "amount": amounts[i],
+                    "amountFormula": "",
+                    "unit": exchange_unit,
+                    "pedigreeUncertainty": "",
+                    "dqEntry": dq,
+                    "uncertainty": uncertainty(i),
+                    "comment": comment,
+                    "location": float("nan"),
+                }
+            )
+        ref_exchange = ref_exchange_creator()
+        exchanges.append(
+            {key: ref_exchange.get(key, float("nan")) for key in EXCHANGE_KEYS}
+        )
+        exchange_lists.append(exchanges)
+    return pd.Series(exchange_lists, index=group_index)
+
+
 def olcaschema_genprocess(database, upstream_dict={}, subregion="BA"):
     """Turns the give database containing generator facility emissions
     into dictionaries that contain the required data for insertion into
@@ -787,13 +1857,6 @@ def olcaschema_genprocess(database, upstream_dict={}, subregion="BA"):
     -------
     dictionary: dictionary contaning openLCA-formatted data
     """
-    from electricitylci.process_dictionary_writer import (
-        unit,
-        flow_table_creation,
-        ref_exchange_creator,
-        uncertainty_table_creation,
-    )
-
     from electricitylci.aggregation_selector import subregion_col
 
     region_agg = subregion_col(subregion)
@@ -802,123 +1865,9 @@ def olcaschema_genprocess(database, upstream_dict={}, subregion="BA"):
         base_cols = region_agg + fuel_agg
     else:
         base_cols = fuel_agg
-    non_agg_cols = [
-        "stage_code",
-        "FlowName",
-        "FlowUUID",
-        "Compartment",
-        "Year",
-        "source_string",
-        "TemporalCorrelation",
-        "TechnologicalCorrelation",
-        "GeographicalCorrelation",
-        "DataCollection",
-        "ReliabilityScore",
-        "uncertaintyMin",
-        "uncertaintyMax",
-        "uncertaintyLognormParams",
-        "Emission_factor",
-        "GeomMean",
-        "GeomSD",
-    ]
-
-    def turn_data_to_dict(data, upstream_dict):
 
-        module_logger.debug(
-            f"Turning flows from {data.name} into dictionaries"
-        )
-        cols_for_exchange_dict = [
-            "internalId",
-            "@type",
-            "avoidedProduct",
-            "flow",
-            "flowProperty",
-            "input",
-            "quantitativeReference",
-            "baseUncertainty",
-            "provider",
-            "amount",
-            "amountFormula",
-            "unit",
-            "pedigreeUncertainty",
-            "dqEntry",
-            "uncertainty",
-            "comment",
-        ]
-        year = ",".join(data["Year"].astype(str).unique())
-        datasources = ",".join(data["source_string"].astype(str).unique())
-        data["Maximum"] = data["uncertaintyMax"]
-        data["Minimum"] = data["uncertaintyMin"]
-        data["uncertainty"] = ""
-        data["internalId"] = ""
-        data["@type"] = "Exchange"
-        data["avoidedProduct"] = False
-        data["flowProperty"] = ""
-        data["input"] = False
-        input_filter = (data["Compartment"] == "input") | (
-            data["Compartment"].str.find("resource") != -1
-        )
-        data.loc[input_filter, "input"] = True
-        data["baseUncertainty"] = ""
-        data["provider"] = ""
-        data["unit"] = ""
-        data["ElementaryFlowPrimeContext"] = data["Compartment"]
-        default_unit = unit("kg")
-        data["unit"] = [default_unit] * len(data)
-        data["FlowType"] = "ELEMENTARY_FLOW"
-        data["flow"] = ""
-        provider_filter = data["stage_code"].isin(upstream_dict.keys())
-        for index, row in data.loc[provider_filter, :].iterrows():
-            provider_dict = {
-                "name": upstream_dict[getattr(row, "stage_code")]["name"],
-                "categoryPath": upstream_dict[getattr(row, "stage_code")][
-                    "category"
-                ],
-                "processType": "UNIT_PROCESS",
-                "@id": upstream_dict[getattr(row, "stage_code")]["uuid"],
-            }
-            data.at[index, "provider"] = provider_dict
-            data.at[index, "unit"] = unit(
-                upstream_dict[getattr(row, "stage_code")]["q_reference_unit"]
-            )
-            data.at[index, "FlowType"] = "PRODUCT_FLOW"
-        for index, row in data.iterrows():
-            data.at[index, "uncertainty"] = uncertainty_table_creation(
-                data.loc[index:index, :]
-            )
-            data.at[index, "flow"] = flow_table_creation(
-                data.loc[index:index, :]
-            )
-        data["amount"] = data["Emission_factor"]
-        data["amountFormula"] = ""
-        data["quantitativeReference"] = False
-        data["dqEntry"] = (
-            "("
-            + str(round(data["ReliabilityScore"].iloc[0], 1))
-            + ";"
-            + str(round(data["TemporalCorrelation"].iloc[0], 1))
-            + ";"
-            + str(round(data["GeographicalCorrelation"].iloc[0], 1))
-            + ";"
-            + str(round(data["TechnologicalCorrelation"].iloc[0], 1))
-            + ";"
-            + str(round(data["DataCollection"].iloc[0], 1))
-            + ")"
-        )
-        data["pedigreeUncertainty"] = ""
-        data["comment"] = f"{datasources} - {year}"
-        data_for_dict = data[cols_for_exchange_dict]
-        data_for_dict = data_for_dict.append(
-            ref_exchange_creator(), ignore_index=True
-        )
-        data_dict = data_for_dict.to_dict("records")
-        return data_dict
-
-    database_groupby = database.groupby(by=base_cols)
     process_df = pd.DataFrame(
-        database_groupby[non_agg_cols].apply(
-            turn_data_to_dict, (upstream_dict)
-        )
+        _exchange_lists(database, base_cols, upstream_dict)
     )
     process_df.columns = ["exchanges"]
     process_df.reset_index(inplace=True)
@@ -6,13 +6,12 @@ import electricitylci.cems_data as cems
 import electricitylci.eia923_generation as eia923
 import electricitylci.eia860_facilities as eia860
 import fedelemflowlist
-from electricitylci.model_config import use_primaryfuel_for_coal
-from electricitylci.model_config import (min_plant_percent_generation_from_primary_fuel_category,
-                          filter_on_min_plant_percent_generation_from_primary_fuel,
-                          keep_mixed_plant_category)
+from electricitylci import model_config
+from electricitylci.instrumentation import instrumented
 import logging
 
 
+@instrumented
 def generate_plant_emissions(year):
     """
     Reads data from EPA air markets program data and fuel use from EIA 923 Page 1
@@ -627,11 +626,14 @@ def generate_plant_emissions(year):
 
         return emissions_agg
 
-    def eia_boiler_nox(row):
-        if row["nox_emission_rate_entire_year_lbs_mmbtu"] > 0:
-            return row["NOx Based on Annual Rate (lbs)"]
-        else:
-            return row["NOx (lbs)"]
+    def eia_boiler_nox(df):
+        # The annual NOx rate, where the boiler has one, rather than the
+        # emission factor
+        return np.where(
+            df["nox_emission_rate_entire_year_lbs_mmbtu"] > 0,
+            df["NOx Based on Annual Rate (lbs)"],
+            df["NOx (lbs)"],
+        )
 
     def eia_boiler_nox_emissions(eia923_boiler_firing_type):
         fuel_heat_quantity_monthly = [
@@ -679,7 +681,7 @@ def generate_plant_emissions(year):
             * emissions_boiler["nox_emission_rate_entire_year_lbs_mmbtu"]
         )
         emissions_boiler = emissions_boiler.assign(
-            NOx_lbs=emissions_boiler.apply(eia_boiler_nox, axis=1)
+            NOx_lbs=eia_boiler_nox(emissions_boiler)
         )
         emissions_agg = emissions_boiler.groupby(
             ["plant_id", "plant_name", "operator_name"], as_index=False
@@ -777,71 +779,30 @@ def generate_plant_emissions(year):
 
         return sulfur_content_agg
 
-    def eia_primary_fuel(row):
-        if row["Primary Fuel %"] < min_plant_percent_generation_from_primary_fuel_category/100:
-            return "Mixed Fuel Type"
-        else:
-            return row["Primary Fuel"]
-
-    def emissions_logic_CO2(row):
-        if (
-            (
-                row["ampd Heat Input (MMBtu)"]
-                < row["total_fuel_consumption_mmbtu"] * 1.2
-            )
-            | (
-                row["ampd Heat Input (MMBtu)"]
-                > row["total_fuel_consumption_mmbtu"] * 0.8
-            )
-        ) & (
-            (row["ampd CO2 (Tons)"] < row["CO2 (Tons)"] * 100)
-            | (row["ampd CO2 (Tons)"] > row["CO2 (Tons)"] * (1 / 100))
-        ):
-            row["Source"] = "ampd"
-            return row["ampd CO2 (Tons)"], row["Source"]
-        else:
-            row["Source"] = "ap42"
-            return row["CO2 (Tons)"], row["Source"]
-
-    def emissions_logic_SO2(row):
-        if (
-            (
-                row["ampd Heat Input (MMBtu)"]
-                < row["total_fuel_consumption_mmbtu"] * 1.2
-            )
-            | (
-                row["ampd Heat Input (MMBtu)"]
-                > row["total_fuel_consumption_mmbtu"] * 0.8
-            )
-        ) & (
-            (row["ampd SO2 (lbs)"] < row["SO2 (lbs)"] * 100)
-            | (row["ampd SO2 (lbs)"] > row["SO2 (lbs)"] * (1 / 100))
-        ):
-            row["Source"] = "ampd"
-            return row["ampd SO2 (lbs)"], row["Source"]
-        else:
-            row["Source"] = "ap42"
-            return row["SO2 (lbs)"], row["Source"]
-
-    def emissions_logic_NOx(row):
-        if (
-            (
-                row["ampd Heat Input (MMBtu)"]
-                < row["total_fuel_consumption_mmbtu"] * 1.2
-            )
-            | (
-                row["ampd Heat Input (MMBtu)"]
-                > row["total_fuel_consumption_mmbtu"] * 0.8
-            )
-        ) & (
-            (row["ampd NOX (lbs)"] < row["NOx (lbs)"] * 100)
-            | (row["ampd NOX (lbs)"] > row["NOx (lbs)"] * (1 / 100))
-        ):
-            row["Source"] = "ampd"
-            return row["ampd NOX (lbs)"], row["Source"]
-        else:
-            row["Source"] = "ap42"
-            return row["NOx (lbs)"], row["Source"]
+    def eia_primary_fuel(df):
+        return np.where(
+            df["Primary Fuel %"]
+            < model_config.min_plant_percent_generation_from_primary_fuel_category
+            / 100,
+            "Mixed Fuel Type",
+            df["Primary Fuel"],
+        )
+
+    def emissions_logic(df, ampd_col, eia_col):
+        """
+        Whether to use the CEMS (ampd) emissions of each plant rather than
+        the emission factor (ap42) estimate: where the plant's CEMS heat
+        input is within 20% of its EIA fuel consumption and the CEMS
+        emissions are within a factor of 100 of the estimate.
+        """
+        fuel_input_criteria = df["ampd Heat Input (MMBtu)"].between(
+            df["total_fuel_consumption_mmbtu"] * 0.8,
+            df["total_fuel_consumption_mmbtu"] * 1.2,
+        )
+        emission_criteria = df[ampd_col].between(
+            df[eia_col] * (1 / 100), df[eia_col] * 100,
+        )
+        return (fuel_input_criteria & emission_criteria).to_numpy()
 
     print(
         "Generating power plant emissions from CEMS data or emission factors..."
@@ -1201,11 +1162,9 @@ def generate_plant_emissions(year):
 
     
     eia_gen_fuel_net_gen_output = eia_gen_fuel_net_gen_output.assign(
-        Primary_Fuel=eia_gen_fuel_net_gen_output.apply(
-            eia_primary_fuel, axis=1
-        )
+        Primary_Fuel=eia_primary_fuel(eia_gen_fuel_net_gen_output)
     )
-    if not keep_mixed_plant_category:
+    if not model_config.keep_mixed_plant_category:
         eia_gen_fuel_net_gen_output = eia_gen_fuel_net_gen_output.loc[
                 eia_gen_fuel_net_gen_output["Primary_Fuel"]!="Mixed Fuel Type",:
                 ]
@@ -1296,44 +1255,23 @@ def generate_plant_emissions(year):
     result_agg["plant_id"] = result_agg["plant_id"].astype(int)
 
     result_agg_final = result_agg.copy()
-    result_agg_final["CO2_emissions_tons"] = result_agg_final["CO2 (Tons)"]
-    result_agg_final["CO2_Source"] = "ap42"
-    fuel_input_criteria = result_agg_final["ampd Heat Input (MMBtu)"].between(
-        result_agg_final["total_fuel_consumption_mmbtu"] * 0.8,
-        result_agg_final["total_fuel_consumption_mmbtu"] * 1.2,
+    use_ampd = emissions_logic(
+        result_agg_final, "ampd CO2 (Tons)", "CO2 (Tons)"
     )
-    emission_criteria = result_agg_final["ampd CO2 (Tons)"].between(
-        result_agg_final["CO2 (Tons)"] * (1 / 100),
-        result_agg_final["CO2 (Tons)"] * 100,
+    result_agg_final["CO2_emissions_tons"] = np.where(
+        use_ampd,
+        result_agg_final["ampd CO2 (Tons)"],
+        result_agg_final["CO2 (Tons)"],
     )
-    total_criteria = (fuel_input_criteria) & (emission_criteria)
-    result_agg_final.loc[
-        total_criteria, "CO2_emissions_tons"
-    ] = result_agg_final.loc[total_criteria, "ampd CO2 (Tons)"]
-    result_agg_final.loc[total_criteria, "CO2_Source"] = "ampd"
-
-    result_agg_final["SO2_emissions_lbs"] = result_agg_final["SO2 (lbs)"]
-    result_agg_final["SO2_Source"] = "ap42"
-    emission_criteria = result_agg_final["ampd SO2 (lbs)"].between(
-        result_agg_final["SO2 (lbs)"] * (1 / 100),
-        result_agg_final["SO2 (lbs)"] * 100,
+    result_agg_final["CO2_Source"] = np.where(use_ampd, "ampd", "ap42")
+    # SO2 and NOx keep the emission factor estimate even where the CEMS
+    # emissions pass the checks, and NOx is labelled ampd for every plant.
+    use_ampd = emissions_logic(
+        result_agg_final, "ampd SO2 (lbs)", "SO2 (lbs)"
     )
-    total_criteria = (fuel_input_criteria) & (emission_criteria)
-    result_agg_final.loc[
-        total_criteria, "SO2_emissions_lbs"
-    ] = result_agg_final.loc[total_criteria, "SO2 (lbs)"]
-    result_agg_final.loc[total_criteria, "SO2_Source"] = "ampd"
-
+    result_agg_final["SO2_emissions_lbs"] = result_agg_final["SO2 (lbs)"]
+    result_agg_final["SO2_Source"] = np.where(use_ampd, "ampd", "ap42")
     result_agg_final["NOx_emissions_lbs"] = result_agg_final["NOx (lbs)"]
-    result_agg_final["NOx_Source"] = "ap42"
-    emission_criteria = result_agg_final["ampd NOX (lbs)"].between(
-        result_agg_final["NOx (lbs)"] * (1 / 100),
-        result_agg_final["NOx (lbs)"] * 100,
-    )
-    total_criteria = (fuel_input_criteria) & (emission_criteria)
-    result_agg_final.loc[
-        total_criteria, "NOx_emissions_lbs"
-    ] = result_agg_final.loc[total_criteria, "NOx (lbs)"]
     result_agg_final["NOx_Source"] = "ampd"
 
     result_agg_final["Net Efficiency"] = (
@@ -1488,7 +1426,7 @@ def generate_plant_emissions(year):
     netl_harmonized_melt["FuelCategory"] = netl_harmonized_melt[
         "PrimaryFuel"
     ].map(FUELCAT_MAP)
-    if use_primaryfuel_for_coal:
+    if model_config.use_primaryfuel_for_coal:
         netl_harmonized_melt.loc[
             netl_harmonized_melt["FuelCategory"] == "COAL", "FuelCategory"
         ] = netl_harmonized_melt.loc[
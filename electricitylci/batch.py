@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Build several models in one run.
+
+Each release builds a handful of models (ELCI_1, ELCI_2, ELCI_3, custom
+configs) that mostly read the same source data. build_models first loads each
+distinct source dataset - e.g. EIA-923 boiler fuel data for 2016 - once,
+stores it as an uncompressed Arrow file (see source_data.py) and then builds
+the models concurrently in a pool of worker processes that read the Arrow
+files instead of the Excel/CSV sources. The wall time is close to that of the
+slowest model rather than the sum of all of them.
+
+Each worker converts the Arrow files it reads to its own dataframes, so peak
+memory use grows with the number of workers (roughly one model build's worth
+per worker). Use fewer jobs (--jobs) if a batch runs out of memory.
+
+Usage:
+    python -m electricitylci.batch ELCI_1 ELCI_2 path/to/custom_config.yml
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from electricitylci.model_config import ModelConfig
+from electricitylci.source_data import load_and_share, share_sources
+
+module_logger = logging.getLogger("batch.py")
+
+
+def load_config(config):
+    """
+    Get a ModelConfig from a config object, a model name, or the path to a
+    config yml file.
+    """
+    if isinstance(config, ModelConfig):
+        return config
+    if os.path.isfile(config):
+        return ModelConfig.from_file(config)
+    return ModelConfig(config)
+
+
+def model_sources(config):
+    """
+    List the source datasets read while building a model.
+
+    Parameters
+    ----------
+    config : ModelConfig
+
+    Returns
+    -------
+    list
+        (loader, args) tuples, where loader is a function decorated with
+        source_data.shared_source.
+    """
+    import electricitylci.eia860_facilities as eia860
+    import electricitylci.eia923_generation as eia923
+
+    specs = config.model_specs
+    year = config.eia_gen_year
+    sources = [
+        (eia923.eia923_download_extract, (year,)),
+        (eia860.eia860_plant, (year,)),
+    ]
+    if specs.get("use_alt_gen_process") or config.replace_egrid:
+        import electricitylci.cems_data as cems
+
+        sources += [
+            (eia923.eia923_generation_and_fuel, (year,)),
+            (eia923.eia923_boiler_fuel, (year,)),
+            (eia923.eia923_sched8_aec, (year,)),
+            (eia860.eia860_EnviroAssoc_nox, (year,)),
+            (eia860.eia860_EnviroAssoc_so2, (year,)),
+            (eia860.eia860_boiler_info_design, (year,)),
+            (cems.build_cems_df, (year,)),
+        ]
+    if not config.replace_egrid:
+        from electricitylci.egrid_emissions_and_waste_by_facility import (
+            get_emissions_and_wastes_by_facility,
+            inventories_key,
+        )
+        from electricitylci.egrid_flowbyfacilty import get_egrid_flowbyfacility
+
+        sources += [
+            (get_egrid_flowbyfacility, (config.egrid_year,)),
+            (
+                get_emissions_and_wastes_by_facility,
+                (inventories_key(config.inventories_of_interest),),
+            ),
+        ]
+    return sources
+
+
+def preload_sources(configs, jobs=None):
+    """
+    Load every distinct source dataset used by the models once and write it
+    to a shared Arrow file.
+
+    Parameters
+    ----------
+    configs : list of ModelConfig
+    jobs : int, optional
+        Number of worker processes used to load the datasets, by default the
+        number of CPUs.
+
+    Returns
+    -------
+    dict
+        Shared file paths keyed by source_data.source_key, for
+        source_data.share_sources.
+    """
+    distinct = {}
+    for config in configs:
+        for loader, args in model_sources(config):
+            distinct[(loader.source_name, repr(args))] = (loader, args)
+    module_logger.info(
+        f"Loading {len(distinct)} source datasets for {len(configs)} models"
+    )
+    shared_files = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(load_and_share, loader, args)
+            for loader, args in distinct.values()
+        ]
+        for future in futures:
+            key, path = future.result()
+            if path is not None:
+                shared_files[key] = path
+    return shared_files
+
+
+def _init_worker(shared_files):
+    share_sources(shared_files)
+
+
+def _build_model(config):
+    """Build one model in a worker process. Returns (JSON-LD file, seconds)."""
+    import electricitylci
+    from electricitylci.main import main
+
+    start = time.perf_counter()
+    main(config=config, jobs=1)
+    return electricitylci.namestr, time.perf_counter() - start
+
+
+def build_models(configs, jobs=None):
+    """
+    Build several models, sharing the source data they have in common.
+
+    Parameters
+    ----------
+    configs : list
+        ModelConfig objects, model names (e.g. "ELCI_1") or paths to config
+        yml files.
+    jobs : int, optional
+        Number of worker processes, by default one per model.
+
+    Returns
+    -------
+    dict
+        Path of the JSON-LD file written for each model, keyed by model name.
+    """
+    configs = [load_config(c) for c in configs]
+    names = [c.model_name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Model names must be unique, got {names}")
+    if jobs is None:
+        jobs = len(configs)
+    wall_start = time.perf_counter()
+    shared_files = preload_sources(configs, jobs)
+    outputs = {}
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(shared_files,)
+    ) as executor:
+        futures = {c.model_name: executor.submit(_build_model, c) for c in configs}
+        for name, future in futures.items():
+            outputs[name], elapsed = future.result()
+            module_logger.info(f"Built {name} in {elapsed:.1f} s: {outputs[name]}")
+    module_logger.info(
+        f"Built {len(configs)} models in {time.perf_counter() - wall_start:.1f} s"
+    )
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build several electricity life cycle inventory models, "
+        "loading the source data they share only once."
+    )
+    parser.add_argument(
+        "configs",
+        nargs="+",
+        help="Model names (e.g. ELCI_1) or paths to model config yml files.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default one per model).",
+    )
+    args = parser.parse_args()
+    build_models(args.configs, jobs=args.jobs)
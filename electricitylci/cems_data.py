@@ -21,12 +21,17 @@ import pandas as pd
 #from pudl.settings import SETTINGS
 #import pudl.constants as pc
 from electricitylci.globals import data_dir, output_dir
+from electricitylci.source_data import shared_source
 import logging
 
 data_years = {
     'epacems': tuple(range(1995, 2019)),
 }
 
+# Where the EPA CEMS files are downloaded from. Can be pointed at another
+# FTP or HTTP server with the same layout, e.g. a local mirror.
+epacems_base_url = 'ftp://newftp.epa.gov/dmdnload/emissions/daily/quarterly/'
+
 epacems_columns_to_ignore = {
     "FACILITY_NAME",
     "SO2_RATE (lbs/mmBtu)",
@@ -196,6 +201,21 @@ cems_col_names = {
         'COUNT_OP_TIME':'count_op_time'
 }
 
+# Integer columns of the Parquet dataset; the other numeric columns are stored
+# as floats so that every file has the same types.
+cems_integer_columns = ['plant_id_eia', 'facility_id', 'unit_id_epa', 'op_hour']
+
+# Columns of the plant totals returned by build_cems_df
+cems_summary_keys = ['state', 'plant_id_eia', 'facility_id']
+cems_cols_to_sum = [
+        'gross_load_mwh',
+        'steam_load_1000_lbs',
+        'so2_mass_tons',
+        'nox_mass_tons',
+        'co2_mass_tons',
+        'heat_content_mmbtu'
+]
+
 def get_epacems_dir(year):
     """
     Data directory search for EPA CEMS hourly
@@ -246,36 +266,249 @@ def read_cems_csv(filename):
     return df
 
 
-def extract(epacems_years, states, verbose=True):
+def add_cems_sums(totals, df):
+    """
+    Sum the columns of df by plant and facility and add them to the running
+    totals. Columns that aren't in df are summed as missing values, i.e. to
+    0.
+
+    Args:
+        totals (dataframe): sums of the rows before, or None.
+        df (dataframe): CEMS data with renamed columns (see cems_col_names).
+    Returns:
+        dataframe with the cems_summary_keys and cems_cols_to_sum columns.
+    """
+    sums = df.reindex(columns=cems_summary_keys + cems_cols_to_sum).groupby(
+            by=cems_summary_keys,
+            as_index=False
+            )[cems_cols_to_sum].sum()
+    if totals is None:
+        return sums
+    return pd.concat([totals, sums], ignore_index=True).groupby(
+            by=cems_summary_keys,
+            as_index=False
+            )[cems_cols_to_sum].sum()
+
+
+def get_epacems_parquet_dir():
+    """
+    Folder of the Parquet dataset of the EPA CEMS data, partitioned by year
+    and state (year=<year>/state=<state>/...).
+    """
+    return os.path.join(data_dir, 'epacems_parquet')
+
+
+def get_epacems_parquet_file(year, qtr, state):
+    """Path of the Parquet file converted from one EPA CEMS zipfile."""
+    return os.path.join(
+        get_epacems_parquet_dir(),
+        f'year={year}',
+        f'state={state.upper()}',
+        f'epacems{year}{state.lower()}{qtr}.parquet'
+    )
+
+
+def cems_source_stamp(year, qtr, state):
+    """
+    Size and modification time of an EPA CEMS zipfile, as recorded in the
+    metadata of the Parquet file converted from it.
+    """
+    stat = os.stat(get_epacems_file(year, qtr, state))
+    return {b'source_size': str(stat.st_size).encode(),
+            b'source_mtime_ns': str(stat.st_mtime_ns).encode()}
+
+
+def convert_cems_file(year, qtr, state):
+    """
+    Convert one EPA CEMS zipfile to a Parquet file of the CEMS dataset. The
+    state is kept in the partition rather than in the file, integer columns
+    are stored as int64 and the other numeric columns as float64. The size
+    and modification time of the zipfile are stored in the file's metadata
+    (see cems_source_stamp).
+
+    Returns:
+        path of the Parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = read_cems_csv(get_epacems_file(year, qtr, state))
+    df = df.rename(columns=cems_col_names).drop(columns=['state'],
+                                                errors='ignore')
+    for col in df.columns:
+        if (col not in cems_integer_columns
+                and pd.api.types.is_numeric_dtype(df[col])):
+            df[col] = df[col].astype(float)
+    filename = get_epacems_parquet_file(year, qtr, state)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Files starting with a dot are skipped when reading the dataset, so an
+    # interrupted conversion doesn't leave a partial file in it.
+    tmp_file = os.path.join(os.path.dirname(filename),
+                            '.' + os.path.basename(filename))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update(cems_source_stamp(year, qtr, state))
+    pq.write_table(table.replace_schema_metadata(metadata), tmp_file)
+    os.replace(tmp_file, filename)
+    return filename
+
+
+def is_converted(year, qtr, state):
+    """
+    True if the Parquet file of an EPA CEMS zipfile exists and was converted
+    from the current zipfile, i.e. the zipfile hasn't been downloaded again
+    since. A missing zipfile leaves an existing Parquet file valid.
+    """
+    import pyarrow.parquet as pq
+
+    filename = get_epacems_parquet_file(year, qtr, state)
+    if not os.path.exists(filename):
+        return False
+    try:
+        stamp = cems_source_stamp(year, qtr, state)
+    except (AssertionError, OSError):
+        return True
+    metadata = pq.read_schema(filename).metadata or {}
+    return all(metadata.get(k) == v for k, v in stamp.items())
+
+
+def unconverted_cems_files(epacems_years, states):
+    """
+    (year, qtr, state) of the files that aren't in the Parquet dataset or
+    were downloaded again after being converted.
     """
-    Extract the EPA CEMS hourly data.
+    return [
+        (year, qtr, state)
+        for year in epacems_years
+        for state in states
+        for qtr in range(1, 5)
+        if not is_converted(year, qtr, state)
+    ]
+
+
+def convert_cems_files(epacems_years, states, jobs=None):
+    """
+    Convert the EPA CEMS zipfiles that aren't in the Parquet dataset yet, or
+    that changed since they were converted (see is_converted), in a pool of
+    worker processes.
 
-    This function is the main function of this file. It returns a generator
-    for extracted DataFrames.
+    Args:
+        epacems_years (list): years to convert.
+        states (list): abbreviations of the states to convert.
+        jobs (int): number of worker processes, by default the number of
+            CPUs. With 1 the files are converted in this process.
+    Returns:
+        list of the paths of the converted files.
     """
-    # TODO: this is really slow. Can we do some parallel processing?
-    logging.info("Extracting EPA CEMS data...")
-    dfs=[]
-    for year in epacems_years:
-        # The keys of the us_states dictionary are the state abbrevs
-        for state in states:
-            #dfs = []
-            for qtr in range(1, 5):
-                filename = get_epacems_file(year, qtr, state)
+    todo = unconverted_cems_files(epacems_years, states)
+    if not todo:
+        return []
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(todo))
+    logging.info(
+        f"Converting {len(todo)} EPA CEMS files to Parquet with {jobs} "
+        "processes..."
+    )
+    years, qtrs, states = zip(*todo)
+    if jobs <= 1:
+        return list(map(convert_cems_file, years, qtrs, states))
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(convert_cems_file, years, qtrs, states))
+
+
+def cems_dataset(year, states=None):
+    """
+    The Parquet dataset of the EPA CEMS data of a year, see
+    convert_cems_files. Columns that are missing from some files are null
+    in their rows.
+
+    Args:
+        year (int): the year of data.
+        states (list): abbreviations of the states to include, by default
+            all the converted states.
+    Returns:
+        pyarrow.dataset.Dataset with the columns of the files plus the year
+        and state partition columns.
+    """
+    import glob
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    if states is None:
+        filenames = sorted(glob.glob(os.path.join(
+            get_epacems_parquet_dir(), f'year={year}', 'state=*', '*.parquet'
+        )))
+    else:
+        filenames = [
+            get_epacems_parquet_file(year, qtr, state)
+            for state in states
+            for qtr in range(1, 5)
+        ]
+    assert filenames, f"ERROR: No EPA CEMS data converted for {year}"
+    partitions = pa.schema([('year', pa.int32()), ('state', pa.string())])
+    schema = pa.unify_schemas(
+        [pq.read_schema(f) for f in filenames] + [partitions]
+    )
+    return ds.dataset(
+        filenames,
+        schema=schema,
+        format='parquet',
+        partitioning=ds.partitioning(partitions, flavor='hive'),
+        partition_base_dir=get_epacems_parquet_dir(),
+    )
 
-                logging.info(f"Reading {year} - {state} - qtr {qtr}")
-                dfs.append(read_cems_csv(filename))
-            # Return a dictionary where the key identifies this dataset
-            # (just like the other extract functions), but unlike the
-            # others, this is yielded as a generator (and it's a one-item
-            # dictionary).
-#            yield {
-#                (year, state): pd.concat(dfs, sort=True, copy=False, ignore_index=True)
-#            }
-    return dfs
 
-import urllib
+def stream_cems_sums(year, states=None, batch_size=500000):
+    """
+    Sum the EPA CEMS data of a year by plant and facility, reading the
+    Parquet dataset (see convert_cems_files) batch_size rows at a time and
+    adding each batch to running totals. Only a batch and the totals are in
+    memory at once, whatever the number of states; for several years, call
+    it once per year.
+
+    Args:
+        year (int): the year of data.
+        states (list): abbreviations of the states to read, by default all.
+        batch_size (int): maximum number of rows read at a time.
+    Returns:
+        dataframe with the cems_summary_keys and cems_cols_to_sum columns.
+    """
+    import pyarrow as pa
+
+    dataset = cems_dataset(year, states)
+    totals = None
+    # The batches are at most one file long, so they're gathered up to
+    # batch_size rows before being summed.
+    batches = []
+    rows = 0
+    for batch in dataset.to_batches(
+            columns=cems_summary_keys + cems_cols_to_sum,
+            batch_size=batch_size):
+        if rows + batch.num_rows > batch_size and batches:
+            totals = add_cems_sums(
+                totals, pa.Table.from_batches(batches).to_pandas())
+            batches = []
+            rows = 0
+        batches.append(batch)
+        rows += batch.num_rows
+    if batches or totals is None:
+        totals = add_cems_sums(
+            totals,
+            pa.Table.from_batches(batches, schema=pa.schema(
+                [dataset.schema.field(col)
+                 for col in cems_summary_keys + cems_cols_to_sum]
+            )).to_pandas())
+    return totals
+
+
+import urllib.parse
 import ftplib
+import http.client
+import threading
 import zipfile
 import shutil
 import warnings
@@ -337,7 +570,7 @@ def source_url(source, year, qtr=None, state=None):
     """
     assert_valid_param(source=source, year=year, qtr=qtr, state=state)
 
-    base_url = 'ftp://newftp.epa.gov/dmdnload/emissions/daily/quarterly/'
+    base_url = epacems_base_url
 
     download_url = '{base_url}/{year}/DLY_{year}{state}Q{qtr}.zip'.format(
             base_url=base_url, year=year,
@@ -424,7 +657,7 @@ def path(source, year=0, qtr=None, state=None, file=True, datadir=data_dir):
         if year != 0:
             dstore_path = os.path.join(dstore_path, 'MinesProdQuarterly.zip')
     elif (source == 'epacems'):
-        dstore_path = data_dir
+        dstore_path = datadir
         if(year != 0):
             dstore_path = os.path.join(dstore_path, 'epacems{}'.format(year))
     else:
@@ -471,16 +704,26 @@ def paths_for_year(source, year=0, states=cems_states.keys(),
     return paths
 
 
-def download(source, year, states, datadir=data_dir, verbose=True):
+def download(source, year, states, datadir=data_dir, verbose=True,
+             clobber=False, jobs=4, verify=False):
     """
     Download the original data for the specified data source and year.
 
     Given a data source and the desired year of data, download the original
     data files from the appropriate federal website, and place them in a
     temporary directory within the data store. This function does not do any
-    checking to see whether the file already exists, or needs to be updated,
-    and does not do any of the organization of the datastore after download,
-    it simply gets the requested file.
+    of the organization of the datastore after download.
+
+    The files are fetched concurrently by a few threads, each keeping its FTP
+    or HTTP connection open from one file to the next. A file is downloaded
+    to <file>.part and renamed once its size matches the one given by the
+    server; the size, modification time and SHA-256 of the file are then
+    recorded in the download manifest (see read_download_manifest). An
+    interrupted download is resumed from the end of its .part file, and files
+    that are already complete in the temporary directory or in the
+    datastore, according to the manifest, are skipped unless clobber is True.
+    Complete files are recognized by their size and modification time, or by
+    their checksum if verify is True (see file_matches_manifest).
 
     Args:
         source (str): the data source to retrieve. Must be one of: 'eia860',
@@ -492,6 +735,10 @@ def download(source, year, states, datadir=data_dir, verbose=True):
             function will download all the files for the specified year.
         datadir (str): path to the top level directory of the datastore.
         verbose (bool): If True, print messages about what's happening.
+        clobber (bool): If True, download files that are already present.
+        jobs (int): number of concurrent downloads.
+        verify (bool): If True, check the SHA-256 of the files that are
+            already present.
     Returns:
         outfile (str): path to the local downloaded file.
     """
@@ -511,126 +758,261 @@ def download(source, year, states, datadir=data_dir, verbose=True):
                     for qtr in range(1, 5)]
         tmp_files = [os.path.join(tmp_dir, os.path.basename(f))
                      for f in paths_for_year(source, year, states=states)]
+        dest_files = paths_for_year(source, year, states=states,
+                                    datadir=datadir)
     else:
         src_urls = [source_url(source, year)]
         tmp_files = [os.path.join(
             tmp_dir, os.path.basename(path(source, year)))]
+        dest_files = [path(source, year, datadir=datadir)]
     if(verbose):
         if source != 'epacems':
             print(
                 f"Downloading {source} data for {year}...\n    {src_urls[0]}")
         else:
             print(f"Downloading {source} data for {year}...")
-    url_schemes = {urllib.parse.urlparse(url).scheme for url in src_urls}
-    # Pass all the URLs at once, rather than looping here, because that way
-    # we can use the same FTP connection for all of the src_urls
-    # (without going all the way to a global FTP cache)
-    if url_schemes == {"ftp"}:
-        _download_FTP(src_urls, tmp_files)
-    else:
-        _download_default(src_urls, tmp_files)
+    manifest = read_download_manifest(datadir)
+    if not clobber:
+        to_get = [
+            (url, tmp_file)
+            for url, tmp_file, dest_file in zip(src_urls, tmp_files,
+                                                dest_files)
+            if not (file_matches_manifest(tmp_file, manifest, verify)
+                    or file_matches_manifest(dest_file, manifest, verify))
+        ]
+        if len(to_get) < len(src_urls):
+            logging.info(
+                f"{len(src_urls) - len(to_get)} files already downloaded")
+        if to_get:
+            src_urls, tmp_files = (list(x) for x in zip(*to_get))
+        else:
+            src_urls, tmp_files = [], []
+    if src_urls:
+        _download_concurrent(src_urls, tmp_files, manifest, datadir,
+                             jobs=jobs)
     return tmp_files
 
 
-def _download_FTP(src_urls, tmp_files, allow_retry=True):
-    assert len(src_urls) == len(tmp_files) > 0
-    parsed_urls = [urllib.parse.urlparse(url) for url in src_urls]
-    domains = {url.netloc for url in parsed_urls}
-    within_domain_paths = [url.path for url in parsed_urls]
-    if len(domains) > 1:
-        # This should never be true, but it seems good to check
-        raise NotImplementedError(
-            "I don't yet know how to download from multiple domains")
-    domain = domains.pop()
-    ftp = ftplib.FTP(domain)
-    login_result = ftp.login()
-    assert login_result.startswith("230"), \
-        f"Failed to login to {domain}: {login_result}"
-    url_to_retry = []
-    tmp_to_retry = []
-    error_messages = []
-    for path, tmp_file, src_url in zip(within_domain_paths, tmp_files, src_urls):
-        with open(tmp_file, "wb") as f:
+def download_manifest_path(datadir=data_dir):
+    return os.path.join(datadir, 'download_manifest.json')
+
+
+def read_download_manifest(datadir=data_dir):
+    """
+    The download manifest: the URL, size, modification time (in ns) and
+    SHA-256 of each downloaded file, by file name.
+    """
+    import json
+
+    manifest_file = download_manifest_path(datadir)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+
+def _file_sha256(filename):
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_matches_manifest(filename, manifest, verify=False):
+    """
+    True if the file exists and has the size and modification time recorded
+    in the download manifest. With verify, or for entries without a
+    modification time, its SHA-256 is compared instead of the time, which
+    means reading the whole file.
+    """
+    entry = manifest.get(os.path.basename(filename))
+    if entry is None or not os.path.exists(filename):
+        return False
+    stat = os.stat(filename)
+    if stat.st_size != entry['size']:
+        return False
+    if not verify and 'mtime' in entry:
+        return stat.st_mtime_ns == entry['mtime']
+    return _file_sha256(filename) == entry['sha256']
+
+
+class _Connections(threading.local):
+    """Open FTP and HTTP connections of one download thread, by server."""
+
+    def __init__(self):
+        self.open = {}
+
+    def get(self, url):
+        key = (url.scheme, url.netloc)
+        conn = self.open.get(key)
+        if conn is None:
+            if url.scheme == 'ftp':
+                conn = ftplib.FTP(timeout=60)
+                conn.connect(url.hostname, url.port or 21)
+                login_result = conn.login()
+                assert login_result.startswith("230"), \
+                    f"Failed to login to {url.netloc}: {login_result}"
+                conn.voidcmd('TYPE I')
+            elif url.scheme == 'https':
+                conn = http.client.HTTPSConnection(url.netloc, timeout=60)
+            else:
+                conn = http.client.HTTPConnection(url.netloc, timeout=60)
+            self.open[key] = conn
+        return conn
+
+    def drop(self, url):
+        conn = self.open.pop((url.scheme, url.netloc), None)
+        if conn is not None:
             try:
-                ftp.retrbinary(f"RETR {path}", f.write)
-            except ftplib.all_errors as e:
-                error_messages.append(e)
-                url_to_retry.append(src_url)
-                tmp_to_retry.append(tmp_file)
-    # Now retry failures recursively
-    num_failed = len(url_to_retry)
-    if num_failed > 0:
-        if allow_retry and len(src_urls) == 1:
-            # If there was only one URL and it failed, retry once.
-            return _download_FTP(url_to_retry, tmp_to_retry, allow_retry=False)
-        elif allow_retry and src_urls != url_to_retry:
-            # If there were multiple URLs and at least one didn't fail,
-            # keep retrying until all fail or all succeed.
-            return _download_FTP(url_to_retry, 
-                                 tmp_to_retry, 
-                                 allow_retry=allow_retry
-                                 )
-        if url_to_retry == src_urls:
-            err_msg = (
-                f"Download failed for all {num_failed} URLs. " +
-                "Maybe the server is down?\n" +
-                "Here are the failure messages:\n " +
-                " \n".join(error_messages)
-            )
-        if not allow_retry:
-            err_msg = (
-                f"Download failed for {num_failed} URLs and no more " +
-                "retries are allowed.\n" +
-                "Here are the failure messages:\n " +
-                " \n".join(error_messages)
-            )
-        warnings.warn(err_msg)
-
-
-def _download_default(src_urls, tmp_files, allow_retry=True):
-    """Download URLs to files. Designed to be called by `download` function.
+                conn.close()
+            except Exception:
+                pass
 
-    Args:
-        src_urls (list of str): the source URLs to download.
-        tmp_files (list of str): the corresponding files to save.
-        allow_retry (bool): Should the function call itself again to
-            retry the download? (Default will try twice for a single file, or
-            until all files fail)
-    Returns:
-        None
+    def close(self):
+        for conn in self.open.values():
+            try:
+                if isinstance(conn, ftplib.FTP):
+                    conn.quit()
+                else:
+                    conn.close()
+            except Exception:
+                pass
+        self.open.clear()
 
-    If the file cannot be downloaded, the program will issue a warning.
+
+def _fetch_ftp(ftp, url, part_file):
+    """
+    Download url to part_file, continuing after the bytes already in it.
+    Returns the size of the file on the server, or None if it's unknown.
+    """
+    try:
+        size = ftp.size(url.path)
+    except ftplib.error_perm:
+        size = None
+    offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    if size is not None and offset > size:
+        offset = 0
+    if size is None or offset < size:
+        with open(part_file, 'ab' if offset else 'wb') as f:
+            ftp.retrbinary(f"RETR {url.path}", f.write, rest=offset or None)
+    return size
+
+
+class _PermanentDownloadError(Exception):
+    """A download that fails the same way when it's tried again."""
+
+
+def _fetch_http(conn, url, part_file):
     """
+    Download url to part_file with a Range request for the bytes after
+    those already in it. Returns the size of the file on the server, or None
+    if it's unknown. Raises _PermanentDownloadError for client errors
+    (e.g. 404), which aren't worth retrying.
+    """
+    offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    target = url.path + (f"?{url.query}" if url.query else '')
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    conn.request('GET', target, headers=headers)
+    response = conn.getresponse()
+    content_range = response.getheader('Content-Range', '')
+    total = content_range.rpartition('/')[2]
+    if response.status == 416 and total.isdigit():
+        # The .part file already has all the bytes
+        response.read()
+        return int(total)
+    if response.status == 206 and offset:
+        mode = 'ab'
+        size = int(total) if total.isdigit() else None
+    elif response.status == 200:
+        mode = 'wb'
+        length = response.getheader('Content-Length')
+        size = int(length) if length is not None else None
+    else:
+        response.read()
+        message = (f"HTTP {response.status} {response.reason} for "
+                   f"{url.geturl()}")
+        if 400 <= response.status < 500:
+            raise _PermanentDownloadError(message)
+        raise OSError(message)
+    with open(part_file, mode) as f:
+        shutil.copyfileobj(response, f, 1 << 20)
+    return size
+
+
+def _download_concurrent(src_urls, tmp_files, manifest, datadir=data_dir,
+                         jobs=4, retries=3):
+    """
+    Download URLs to files in a pool of threads, see download. Each file is
+    tried retries more times after a failure, resuming where the last try
+    stopped and reconnecting to the server. Files the server refuses (HTTP
+    4xx, FTP 5xx replies such as a missing file) aren't tried again.
+
+    If a file cannot be downloaded, the program will issue a warning.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from electricitylci.stage_cache import write_json
+
     assert len(src_urls) == len(tmp_files) > 0
-    url_to_retry = []
-    tmp_to_retry = []
-    for src_url, tmp_file in zip(src_urls, tmp_files):
+    connections = _Connections()
+    lock = threading.Lock()
+
+    def fetch(src_url, tmp_file):
+        url = urllib.parse.urlparse(src_url)
+        part_file = tmp_file + '.part'
+        error = None
+        for attempt in range(retries + 1):
+            try:
+                conn = connections.get(url)
+                if url.scheme == 'ftp':
+                    size = _fetch_ftp(conn, url, part_file)
+                else:
+                    size = _fetch_http(conn, url, part_file)
+                break
+            except (_PermanentDownloadError, ftplib.error_perm) as e:
+                return f"{src_url}: {e}"
+            except ftplib.all_errors + (http.client.HTTPException,) as e:
+                error = e
+                connections.drop(url)
+                logging.info(f"Retrying {src_url} after {e}")
+        else:
+            return f"{src_url}: {error}"
+        actual_size = os.path.getsize(part_file)
+        if size is not None and actual_size != size:
+            os.remove(part_file)
+            return f"{src_url}: got {actual_size} of {size} bytes"
+        os.replace(part_file, tmp_file)
+        entry = {
+            'url': src_url,
+            'size': actual_size,
+            'mtime': os.stat(tmp_file).st_mtime_ns,
+            'sha256': _file_sha256(tmp_file),
+        }
+        with lock:
+            manifest[os.path.basename(tmp_file)] = entry
+            write_json(download_manifest_path(datadir), manifest)
+        return None
+
+    def fetch_all(pairs):
+        # Each thread downloads a share of the files over its connections
         try:
-            outfile, _ = urllib.request.urlretrieve(src_url, filename=tmp_file)
-        except urllib.error.URLError:
-            url_to_retry.append(src_url)
-            tmp_to_retry.append(tmp_to_retry)
-    # Now retry failures recursively
-    num_failed = len(url_to_retry)
-    if num_failed > 0:
-        if allow_retry and len(src_urls) == 1:
-            # If there was only one URL and it failed, retry once.
-            return _download_default(url_to_retry, 
-                                     tmp_to_retry, 
-                                     allow_retry=False
-                                     )
-        elif allow_retry and src_urls != url_to_retry:
-            # If there were multiple URLs and at least one didn't fail,
-            # keep retrying until all fail or all succeed.
-            return _download_default(url_to_retry, 
-                                     tmp_to_retry, 
-                                     allow_retry=allow_retry
-                                     )
-        if url_to_retry == src_urls:
-            err_msg = f"ERROR: Download failed for all {num_failed} URLs. Maybe the server is down?"
-        if not allow_retry:
-            err_msg = f"ERROR: Download failed for {num_failed} URLs and no more retries are allowed"
-        warnings.warn(err_msg)
+            return [fetch(src_url, tmp_file) for src_url, tmp_file in pairs]
+        finally:
+            connections.close()
+
+    jobs = max(1, min(jobs, len(src_urls)))
+    pairs = list(zip(src_urls, tmp_files))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(fetch_all, [pairs[i::jobs] for i in range(jobs)])
+        error_messages = [e for result in results for e in result if e]
+    if error_messages:
+        warnings.warn(
+            f"Download failed for {len(error_messages)} of {len(src_urls)} "
+            "URLs. Here are the failure messages:\n " +
+            " \n".join(error_messages)
+        )
 
 
 def organize(source, year, states, unzip=True,
@@ -676,20 +1058,23 @@ def organize(source, year, states, unzip=True,
     destfiles = paths_for_year(
         source, year, states, file=True, datadir=datadir)
 
-    # If we've gotten to this point, we're wiping out the previous version of
-    # the data for this source and year... so lets wipe it! Scary!
+    # If we've gotten to this point, the downloaded files replace the
+    # previous version of the data for this source and year. Files that were
+    # already complete weren't downloaded again (see download) and stay.
     destdir = path(source, year, file=False, datadir=datadir)
     if not no_download:
-        if os.path.exists(destdir):
-            shutil.rmtree(destdir)
         # move the new file from wherever it is, to its rightful home.
         if not os.path.exists(destdir):
             os.makedirs(destdir)
         for newfile, destfile in zip(newfiles, destfiles):
             # paranoid safety check to make sure these files match...
             assert os.path.basename(newfile) == os.path.basename(destfile)
+            if not os.path.exists(newfile):
+                continue
+            if os.path.exists(destfile):
+                os.remove(destfile)
             shutil.move(newfile, destfile)  # works more cases than os.rename
-    # If no_download is True, then we already did this rmtree and move
+    # If no_download is True, then we already did this move
     # The last time this program ran.
 
     # If we're unzipping the downloaded file, then we may have some
@@ -716,18 +1101,24 @@ def organize(source, year, states, unzip=True,
                     shutil.rmtree(td)
 
 
-def check_if_need_update(source, year, states, datadir, clobber, verbose):
+def check_if_need_update(source, year, states, datadir, clobber, verbose,
+                         verify=False):
     """
     Do we really need to download the requested data? Only case in which
-    we don't have to do anything is when the downloaded file already exists
-    and clobber is False.
+    we don't have to do anything is when the downloaded file already exists,
+    matching the download manifest if it's listed there (see
+    file_matches_manifest), and clobber is False.
     """
     paths = paths_for_year(source=source, year=year, states=states,
                            datadir=datadir)
+    manifest = read_download_manifest(datadir)
     need_update = False
     message = None
     for path in paths:
-        if os.path.exists(path):
+        # Files from before the download manifest are taken as they are
+        if os.path.exists(path) and (
+                os.path.basename(path) not in manifest
+                or file_matches_manifest(path, manifest, verify)):
             if clobber:
                 message = f'{source} data for {year} already present, CLOBBERING.'
                 need_update = True
@@ -742,7 +1133,7 @@ def check_if_need_update(source, year, states, datadir, clobber, verbose):
 
 
 def update(source, year, states, clobber=False, unzip=True, verbose=True,
-           datadir=data_dir, no_download=False):
+           datadir=data_dir, no_download=False, jobs=4, verify=False):
     """
     Update the local datastore for the given source and year.
 
@@ -770,6 +1161,10 @@ def update(source, year, states, clobber=False, unzip=True, verbose=True,
             that are already present. If False, do download the files. Either
             way, still obey the unzip and clobber settings. (unzip=False and
             no_download=True will do nothing.)
+        jobs (int): number of concurrent downloads, see download.
+        verify (bool): If True, check the SHA-256 of the files that are
+            already present against the download manifest rather than only
+            their size and modification time.
 
     Returns: nothing
     """
@@ -778,38 +1173,40 @@ def update(source, year, states, clobber=False, unzip=True, verbose=True,
                                        states=states,
                                        datadir=datadir, 
                                        clobber=clobber, 
-                                       verbose=verbose
+                                       verbose=verbose,
+                                       verify=verify
                                        )
     if need_update:
         # Otherwise we're downloading:
         if not no_download:
-            download(source, year, states, datadir=datadir, verbose=verbose)
+            download(source, year, states, datadir=datadir, verbose=verbose,
+                     clobber=clobber, jobs=jobs, verify=verify)
         organize(source, year, states, unzip=unzip, datadir=datadir,
                  verbose=verbose, no_download=no_download)
 
-def build_cems_df(year):
+@shared_source("cems")
+def build_cems_df(year, jobs=None):
+    """
+    Total generation, steam load, emissions and heat input of each CEMS
+    plant and facility for a year.
+
+    The zipped CSV files are downloaded if needed and converted once to a
+    Parquet dataset (see convert_cems_files); later builds only read the
+    summed columns from it, a batch of rows at a time (see
+    stream_cems_sums).
+
+    Args:
+        year (int): the year of data.
+        jobs (int): number of processes converting the files, see
+            convert_cems_files.
+    Returns:
+        dataframe with the cems_summary_keys and cems_cols_to_sum columns.
+    """
     states = cems_states.keys()
-    update('epacems',year,states)
-    raw_dfs = extract(
-            epacems_years=[year],
-            states=states,
-            verbose=True
-        )
-    df = pd.concat(raw_dfs)
-    df.rename(columns=cems_col_names,inplace=True)
-    cols_to_sum=[
-            'gross_load_mwh',
-            'steam_load_1000_lbs',
-            'so2_mass_tons',
-            'nox_mass_tons',
-            'co2_mass_tons',
-            'heat_content_mmbtu'
-    ]
-    summary_df = df.groupby(
-            by=['state','plant_id_eia','facility_id'],
-            group_keys=False,
-            as_index=False
-            )[cols_to_sum].sum()
+    if unconverted_cems_files([year], states):
+        update('epacems',year,states)
+        convert_cems_files([year], states, jobs=jobs)
+    summary_df = stream_cems_sums(year, states=states)
     return summary_df
 
 if __name__ == '__main__':
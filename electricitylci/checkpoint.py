@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints for model builds, so that a failed build can be resumed.
+
+A checkpointed build gets a run id (the model name and the start time) and a
+run directory, output/runs/<run id>. The result of every stage - dataframes as
+well as the process dictionaries returned by write_process_dicts_to_jsonld,
+which carry the UUIDs the later stages link to - is stored there as soon as
+the stage finishes, together with a manifest of the model config, the JSON-LD
+file being written and the finished stages. Whenever a stage has added to the
+JSON-LD file, a copy of the file is kept in the run directory as well.
+
+Resuming a run (main.py --resume RUN_ID) rebuilds it with the config stored
+in the manifest, restores the JSON-LD file to its state after the last
+finished stage and runs the remaining stages, loading the stored results they
+need.
+
+The run directory is only needed to resume a failed build, so it is removed
+once the build finishes, unless it is kept with keep=True
+(main.py --keep-checkpoint).
+"""
+import datetime
+import json
+import logging
+import os
+import shutil
+from os.path import join
+
+from electricitylci.globals import output_dir, set_dir
+from electricitylci.stage_cache import load_result, save_result, write_json
+
+module_logger = logging.getLogger("checkpoint.py")
+
+runs_dir = join(output_dir, "runs")
+
+MANIFEST_NAME = "manifest.json"
+JSONLD_COPY_NAME = "jsonld_checkpoint.zip"
+
+
+def run_dir(run_id):
+    return join(runs_dir, run_id)
+
+
+def new_run_id(model_name):
+    return f"{model_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+def read_manifest(run_id):
+    """
+    Read the manifest of a checkpointed run.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there is no run with this id.
+    """
+    path = join(run_dir(run_id), MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No checkpointed run {run_id} in {runs_dir}")
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(run_id, manifest):
+    write_json(join(run_dir(run_id), MANIFEST_NAME), manifest)
+
+
+def run_config(run_id):
+    """Return the ModelConfig a checkpointed run was started with."""
+    from electricitylci.model_config import ModelConfig
+
+    manifest = read_manifest(run_id)
+    return ModelConfig(manifest["model_name"], manifest["model_specs"])
+
+
+def _file_state(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _restore_jsonld(run_id, jsonld_path):
+    """
+    Put the JSON-LD file back in the state it had after the last finished
+    stage. Processes written by a stage that failed half way would otherwise
+    be written twice.
+    """
+    copy_path = join(run_dir(run_id), JSONLD_COPY_NAME)
+    if os.path.exists(copy_path):
+        shutil.copyfile(copy_path, jsonld_path)
+    elif os.path.exists(jsonld_path):
+        os.remove(jsonld_path)
+
+
+def run_checkpointed(
+    stages, run_id=None, jobs=1, initializer=None, initargs=(), keep=False
+):
+    """
+    Run a model build, storing each stage's result in the run directory, or
+    resume a checkpointed run.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        The stages of the build, see main.model_stages. When resuming, these
+        have to be declared with the config of the run (see run_config).
+    run_id : str, optional
+        Id of a run to resume, by default None (start a new run).
+    jobs : int, optional
+        Number of worker processes, see pipeline.run_stages.
+    initializer : function, optional
+        See pipeline.run_stages.
+    initargs : tuple, optional
+        See pipeline.run_stages.
+    keep : bool, optional
+        Keep the run directory after the build finishes, by default False
+        (remove it).
+
+    Returns
+    -------
+    tuple
+        (run id, dictionary of the results of the stages that ran or were
+        loaded, dictionary of run times in seconds of the stages that ran)
+    """
+    import electricitylci
+    from electricitylci.model_config import model_name, model_specs
+    from electricitylci.pipeline import run_stages
+
+    if run_id is None:
+        run_id = new_run_id(model_name)
+        set_dir(run_dir(run_id))
+        manifest = {
+            "run_id": run_id,
+            "model_name": model_name,
+            "model_specs": model_specs,
+            "jsonld_path": electricitylci.namestr,
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            "finished": None,
+            "stages": {},
+            "jsonld_state": None,
+        }
+        write_manifest(run_id, manifest)
+        print(f"Checkpointing run {run_id} in {run_dir(run_id)}")
+    else:
+        manifest = read_manifest(run_id)
+        if manifest["model_name"] != model_name:
+            raise ValueError(
+                f"Run {run_id} is a build of {manifest['model_name']}, "
+                f"not {model_name}"
+            )
+        electricitylci.set_namestr(manifest["jsonld_path"])
+        _restore_jsonld(run_id, manifest["jsonld_path"])
+        manifest["jsonld_state"] = _file_state(manifest["jsonld_path"])
+        print(
+            f"Resuming run {run_id}: {len(manifest['stages'])} of "
+            f"{len(stages)} stages finished"
+        )
+    folder = join(run_dir(run_id), "stages")
+    finished = set(manifest["stages"])
+    to_run = [s for s in stages if s.name not in finished]
+    needed = {d for s in to_run for d in s.deps if d in finished}
+    loaded = {}
+    for name in needed:
+        module_logger.info(f"Loading the checkpoint of {name}")
+        loaded[name] = load_result(folder, name)
+
+    def store(name, result):
+        save_result(result, folder, name)
+        jsonld_path = manifest["jsonld_path"]
+        state = _file_state(jsonld_path)
+        if state is not None and state != manifest["jsonld_state"]:
+            # The stage wrote to the JSON-LD file
+            copy_path = join(run_dir(run_id), JSONLD_COPY_NAME)
+            shutil.copyfile(jsonld_path, copy_path + ".tmp")
+            os.replace(copy_path + ".tmp", copy_path)
+            manifest["jsonld_state"] = state
+        manifest["stages"][name] = {
+            "finished": datetime.datetime.now().isoformat(timespec="seconds")
+        }
+        write_manifest(run_id, manifest)
+
+    try:
+        results, timings = run_stages(
+            to_run,
+            jobs=jobs,
+            initializer=initializer,
+            initargs=initargs,
+            results=loaded,
+            on_result=store,
+        )
+    except BaseException:
+        print(
+            f"Build failed after {len(manifest['stages'])} of {len(stages)} "
+            f"stages. Resume it with --resume {run_id}"
+        )
+        raise
+    if keep:
+        manifest["finished"] = datetime.datetime.now().isoformat(
+            timespec="seconds"
+        )
+        write_manifest(run_id, manifest)
+    else:
+        shutil.rmtree(run_dir(run_id), ignore_errors=True)
+        module_logger.info(f"Removed the checkpoints of run {run_id}")
+    return run_id, results, timings
@@ -3,11 +3,12 @@ import pandas as pd
 from electricitylci.globals import output_dir, data_dir
 import electricitylci.alt_generation as altg
 import electricitylci.import_impacts as import_impacts
-from electricitylci.model_config import (
-        eia_gen_year, 
-        keep_mixed_plant_category,
-        min_plant_percent_generation_from_primary_fuel_category
-        )
+from electricitylci import model_config
+from electricitylci.schema import (
+    add_categories,
+    concat_categorical,
+    to_categorical,
+)
 import logging
 
 #I added this section to populate a ba_codes variable that could be used
@@ -102,7 +103,7 @@ def fill_nans(df, key_column="FacilityID", target_columns=[], dropna=True):
         df.loc[df[col].isnull(), col] = df.loc[
                 df[col].isnull(), key_column
         ].map(key_df[col])
-    plant_ba = eia860_balancing_authority(eia_gen_year).set_index("Plant Id")
+    plant_ba = eia860_balancing_authority(model_config.eia_gen_year).set_index("Plant Id")
     plant_ba.index = plant_ba.index.astype(int)
     if "State" not in df.columns:
         df["State"]=float("nan")
@@ -228,7 +229,7 @@ def concat_map_upstream_databases(*arg):
     ].str.upper()
     upstream_mapped_df["ElementaryFlowPrimeContext"] = "emission"
     upstream_mapped_df["Source"] = "netl"
-    upstream_mapped_df["Year"] = eia_gen_year
+    upstream_mapped_df["Year"] = model_config.eia_gen_year
     return upstream_mapped_df
 
 
@@ -263,7 +264,7 @@ def concat_clean_upstream_and_plant(pl_df, up_df):
         how="left",
     )
 #    up_df.dropna(subset=region_cols + ["Electricity"], inplace=True)
-    combined_df = pd.concat([pl_df, up_df], ignore_index=True)
+    combined_df = concat_categorical([pl_df, up_df], ignore_index=True)
     combined_df["Balancing Authority Name"] = combined_df[
         "Balancing Authority Code"
     ].map(ba_codes["BA_Name"])
@@ -273,6 +274,9 @@ def concat_clean_upstream_and_plant(pl_df, up_df):
     combined_df["EIA_Region"] = combined_df["Balancing Authority Code"].map(
         ba_codes["EIA_Region"]
     )
+    combined_df = to_categorical(
+        combined_df, ["Balancing Authority Name", "FERC_Region", "EIA_Region"]
+    )
     categories_to_delete = [
         "plant_id",
         "FuelCategory_right",
@@ -298,9 +302,12 @@ def concat_clean_upstream_and_plant(pl_df, up_df):
     # to 0 in the config file allowed the inventory to be kept for generators
     # that are now being tagged as mixed.
     generation_filter = (
-            combined_df["PercentGenerationfromDesignatedFuelCategory"] < min_plant_percent_generation_from_primary_fuel_category/100
+            combined_df["PercentGenerationfromDesignatedFuelCategory"] < model_config.min_plant_percent_generation_from_primary_fuel_category/100
+        )
+    if model_config.keep_mixed_plant_category:
+        combined_df["FuelCategory"] = add_categories(
+            combined_df["FuelCategory"], ["MIXED"]
         )
-    if keep_mixed_plant_category:
         combined_df.loc[generation_filter, "FuelCategory"] = "MIXED"
         combined_df.loc[generation_filter, "PrimaryFuel"] = "Mixed Fuel Type"
     else:
@@ -394,7 +401,7 @@ def add_fuel_inputs(gen_df, upstream_df, upstream_dict):
     fuel_df["FuelCategory"] = fuel_df["FacilityID"].map(
         fuel_cat_key["FuelCategory"]
     )
-    gen_plus_up_df = pd.concat([gen_df, fuel_df], ignore_index=True)
+    gen_plus_up_df = concat_categorical([gen_df, fuel_df], ignore_index=True)
     gen_plus_up_df = fill_nans(gen_plus_up_df)
     return gen_plus_up_df
 
@@ -1,10 +1,12 @@
+import copy
 import openpyxl
 import pandas as pd
 import numpy as np
+from functools import lru_cache
 
 #from electricitylci.egrid_facilities import egrid_subregions
 from electricitylci.globals import data_dir
-from electricitylci.model_config import net_trading, replace_egrid
+from electricitylci import model_config
 from electricitylci.process_dictionary_writer import (
     exchange,
     exchange_table_creation_input_con_mix,
@@ -13,7 +15,23 @@ from electricitylci.process_dictionary_writer import (
     process_table_creation_surplus
 )
 
-if not replace_egrid:
+@lru_cache(maxsize=None)
+def read_consumption_mix_workbook(net_trading):
+    """
+    Read the eGRID consumption mix workbook. The workbook is only read once
+    for each value of net_trading.
+
+    Parameters
+    ----------
+    net_trading : bool
+        Read the net trading (True) or gross trading (False) tables.
+
+    Returns
+    -------
+    tuple
+        Cell ranges for (nerc_region, surplus_pool_trade_in, trade_matrix,
+        generation_quantity, egrid_regions, nerc_region2)
+    """
     wb2 = openpyxl.load_workbook(data_dir+'/eGRID_Consumption_Mix_new.xlsx',data_only=True)
     data = wb2['ConsumptionMixContributions']
 
@@ -32,6 +50,8 @@ if not replace_egrid:
         generation_quantity = data['E36':'E61']
         nerc_region2 = data['H36:H45']
         egrid_regions = data['C36:C61']
+    return (nerc_region, surplus_pool_trade_in, trade_matrix,
+            generation_quantity, egrid_regions, nerc_region2)
 
 
 def surplus_pool_dictionary(nerc_region,surplus_pool_trade_in,trade_matrix,gen_quantity, eGRID_region,nerc_region2):
@@ -229,16 +249,47 @@ def consumption_flows(fuels_mix, flows):
 
 
 
-if not replace_egrid:
+@lru_cache(maxsize=None)
+def get_surplus_and_consumption_dicts(net_trading):
+    """
+    Create the surplus pool and consumption mix dictionaries from the eGRID
+    consumption mix workbook.
+
+    Parameters
+    ----------
+    net_trading : bool
+        Use net (True) or gross (False) trading between regions.
+
+    Returns
+    -------
+    tuple
+        (surplus_dict, consumption_dict)
+    """
+    (nerc_region, surplus_pool_trade_in, trade_matrix, generation_quantity,
+     egrid_regions, nerc_region2) = read_consumption_mix_workbook(net_trading)
     #Creating Surplus Pool dictionary
     surplus_dict = surplus_pool_dictionary(nerc_region,surplus_pool_trade_in,trade_matrix,generation_quantity,egrid_regions,nerc_region2)
     #del surplus_dict['']
 
-
-
-
     #Creating Consumption dictionary
     consumption_dict = consumption_mix_dictionary(nerc_region,surplus_pool_trade_in,trade_matrix,generation_quantity,egrid_regions,nerc_region2)
+    return surplus_dict, consumption_dict
+
+
+def __getattr__(name):
+    # surplus_dict and consumption_dict used to be created when the module was
+    # imported (for eGRID models). They are now created on first use, for the
+    # active model's net_trading setting. The JSON-LD writer fills in the
+    # dictionaries, so each caller gets its own copy of the cached ones.
+    if name in ('surplus_dict', 'consumption_dict'):
+        if model_config.replace_egrid:
+            raise AttributeError(
+                f"{name} is only available for models that use eGRID data")
+        surplus_dict, consumption_dict = get_surplus_and_consumption_dicts(
+            model_config.net_trading)
+        return copy.deepcopy(
+            surplus_dict if name == 'surplus_dict' else consumption_dict)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 #Test distr
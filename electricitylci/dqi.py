@@ -1,4 +1,5 @@
 #Scoring based on USEPA 2016: Guidance on Data Quality Assessment for Life Cycle Inventory Data
+import numpy as np
 
 flow_data_quality_fields = ['Reliability_Score','TemporalCorrelation','GeographicalCorrelation',
                             'TechnologicalCorrelation','DataCollection']
@@ -27,6 +28,35 @@ def lookup_score_with_bound_key(raw_score, bound_to_dqi):
     return score
 
 
+def score_array(values, bound_to_dqi):
+    """
+    Score many values at once, as lookup_score_with_bound_key does one at a
+    time: each value gets the score of the smallest breakpoint it doesn't
+    exceed, and values above all breakpoints or missing get the score of
+    None. Negative values, e.g. the age of data newer than the target year,
+    are below the first breakpoint and get its score.
+
+    Parameters
+    ----------
+    values : array-like
+        Raw scores, e.g. a column of a dataframe.
+    bound_to_dqi : dict
+        Breakpoints and their scores, with None for the rest, e.g.
+        data_collection_lower_bound_to_dqi.
+
+    Returns
+    -------
+    numpy.ndarray
+        The score of each value.
+    """
+    bounds = sorted(k for k in bound_to_dqi if k is not None)
+    scores = np.array([bound_to_dqi[k] for k in bounds] + [bound_to_dqi[None]])
+    values = np.asarray(values, dtype=float)
+    positions = np.searchsorted(np.array(bounds, dtype=float), values, side="left")
+    positions[np.isnan(values)] = len(bounds)
+    return scores[positions]
+
+
 
 
 
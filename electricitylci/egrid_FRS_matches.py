@@ -1,31 +1,42 @@
 import pandas as pd
 import facilitymatcher
-from electricitylci.model_config import inventories
-from electricitylci.egrid_facilities import egrid_facilities
+from electricitylci import model_config
+from functools import lru_cache
+from electricitylci.egrid_facilities import get_egrid_facilities_data
 
-#get egrid program matches from FRS from facility matcher
-egrid_FRS_matches = facilitymatcher.get_matches_for_inventories(["eGRID"])
-egrid_FRS_matches.head()
 
-#Get NAICS info for inventories we're potentially interested in
-egrid_frs_ids = list(pd.unique(egrid_FRS_matches['FRS_ID']))
-egrid_FRS_NAICS = facilitymatcher.get_FRS_NAICSInfo_for_facility_list(egrid_frs_ids,inventories)
+@lru_cache(maxsize=None)
+def get_egrid_facilities_with_FRS_NAICS(egrid_year, inventories):
+    """
+    Match eGRID facilities to FRS ids and their NAICS codes. The matches are
+    made once for each egrid_year and tuple of inventories.
+    """
+    egrid_facilities = get_egrid_facilities_data(egrid_year)['egrid_facilities']
+    #get egrid program matches from FRS from facility matcher
+    egrid_FRS_matches = facilitymatcher.get_matches_for_inventories(["eGRID"])
 
-get_first_4 = lambda x: x[0:4]
-egrid_FRS_NAICS['NAICS_4'] =  egrid_FRS_NAICS['NAICS'].map(get_first_4)
+    #Get NAICS info for inventories we're potentially interested in
+    egrid_frs_ids = list(pd.unique(egrid_FRS_matches['FRS_ID']))
+    egrid_FRS_NAICS = facilitymatcher.get_FRS_NAICSInfo_for_facility_list(egrid_frs_ids,list(inventories))
 
-#import egrid_facilities
-egrid_facilities_w_ids_subregions_fuels = egrid_facilities[['FacilityID','Subregion','PrimaryFuel','FuelCategory']]
-#Merge egrid facilities with facility ids
-egrid_facilities_with_FRS = pd.merge(egrid_facilities_w_ids_subregions_fuels,egrid_FRS_matches,on='FacilityID',how='left')
-#Drop records with no FRS
-egrid_facilities_with_FRS = egrid_facilities_with_FRS[egrid_facilities_with_FRS['FRS_ID'].notnull()]
-len(egrid_facilities_with_FRS)
-#2016:7042
+    get_first_4 = lambda x: x[0:4]
+    egrid_FRS_NAICS['NAICS_4'] =  egrid_FRS_NAICS['NAICS'].map(get_first_4)
+
+    #import egrid_facilities
+    egrid_facilities_w_ids_subregions_fuels = egrid_facilities[['FacilityID','Subregion','PrimaryFuel','FuelCategory']]
+    #Merge egrid facilities with facility ids
+    egrid_facilities_with_FRS = pd.merge(egrid_facilities_w_ids_subregions_fuels,egrid_FRS_matches,on='FacilityID',how='left')
+    #Drop records with no FRS
+    egrid_facilities_with_FRS = egrid_facilities_with_FRS[egrid_facilities_with_FRS['FRS_ID'].notnull()]
+    #2016:7042
+
+    egrid_facilities_with_FRS_NAICS = pd.merge(egrid_facilities_with_FRS,egrid_FRS_NAICS,on='FRS_ID')
+    return egrid_facilities_with_FRS_NAICS
 
-egrid_facilities_with_FRS_NAICS = pd.merge(egrid_facilities_with_FRS,egrid_FRS_NAICS,on='FRS_ID')
 
 def list_FRS_ids_filtered_for_NAICS():
+    egrid_facilities_with_FRS_NAICS = get_egrid_facilities_with_FRS_NAICS(
+        model_config.egrid_year, tuple(model_config.inventories))
     egrid_facilities_with_FRS_NAICS_filtered = egrid_facilities_with_FRS_NAICS[((egrid_facilities_with_FRS_NAICS['NAICS_4'] == '5622')
                                                                                 & (egrid_facilities_with_FRS_NAICS['FuelCategory'] == 'BIOMASS')
                                                                                 & (egrid_facilities_with_FRS_NAICS['PRIMARY_INDICATOR'] == 'PRIMARY'))
@@ -36,6 +47,14 @@ def list_FRS_ids_filtered_for_NAICS():
     return frs_ids
 
 
+def __getattr__(name):
+    # The FRS matches are made on first use, for the active model
+    if name == 'egrid_facilities_with_FRS_NAICS':
+        return get_egrid_facilities_with_FRS_NAICS(
+            model_config.egrid_year, tuple(model_config.inventories))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 #FRS_NAICS_conditions = [{"NAICS_4":"2211","PRIMARY_INDICATOR":"PRIMARY"},{"NAICS_4":"5622","FuelCategory":"BIOMASS","PRIMARY_INDICATOR":"PRIMARY"}]
 # def list_FRS_ids_filtered_for_NAICS():
 #     #create conditions
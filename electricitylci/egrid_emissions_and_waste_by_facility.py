@@ -2,27 +2,73 @@ import pandas as pd
 import stewicombo
 import os
 from electricitylci.globals import data_dir
-from electricitylci.model_config import inventories_of_interest
-
-#Check to see if the stewicombo output of interest is stored as a csv
-stewicombooutputfile = ''
-for k,v in inventories_of_interest.items():
-    stewicombooutputfile = stewicombooutputfile+"{}_{}_".format(k, v)
-stewicombooutputfile = stewicombooutputfile + 'fromstewicombo.csv'
-
-if os.path.exists(data_dir+"/"+stewicombooutputfile):
-    emissions_and_wastes_by_facility = pd.read_csv(data_dir+"/"+stewicombooutputfile,header=0,dtype={"FacilityID":"str","Year":"int","eGRID_ID":"str"})
-else:
-    emissions_and_wastes_by_facility = stewicombo.combineInventoriesforFacilitiesinOneInventory("eGRID",inventories_of_interest,filter_for_LCI=True)
-    #drop SRS fields
-    emissions_and_wastes_by_facility = emissions_and_wastes_by_facility.drop(columns=['SRS_ID','SRS_CAS'])
-    #drop 'Electricity' flow
-    emissions_and_wastes_by_facility = emissions_and_wastes_by_facility[emissions_and_wastes_by_facility['FlowName']!= 'Electricity']
-    #Save it to a csv for the next call
-    emissions_and_wastes_by_facility.to_csv(data_dir+stewicombooutputfile,index=False)
-
-len(emissions_and_wastes_by_facility)
-#with egrid 2016, tri 2016, nei 2016, rcrainfo 2015: 106284
-
-#Get a list of unique years in the emissions data
-years_in_emissions_and_wastes_by_facility = list(pd.unique(emissions_and_wastes_by_facility['Year']))
+from electricitylci import model_config
+
+from functools import lru_cache
+from electricitylci.source_data import shared_source
+
+
+def inventories_key(inventories_of_interest):
+    """
+    Hashable key for a set of inventories, as passed to
+    get_emissions_and_wastes_by_facility. The configured order is kept: it
+    sets the order the inventories are combined in and the name of the
+    stewicombo csv file.
+
+    Parameters
+    ----------
+    inventories_of_interest : dict
+        Inventory -> year, e.g. model_config.inventories_of_interest
+
+    Returns
+    -------
+    tuple
+    """
+    return tuple(inventories_of_interest.items())
+
+
+@lru_cache(maxsize=None)
+@shared_source("emissions_and_wastes_by_facility")
+def get_emissions_and_wastes_by_facility(inventories_of_interest):
+    """
+    Combine the facility inventories of interest with stewicombo. The result
+    is stored as a csv in the data folder and only built once per process for
+    each set of inventories.
+
+    Parameters
+    ----------
+    inventories_of_interest : tuple
+        (inventory, year) pairs, e.g. (("eGRID", "2016"), ("TRI", "2016"))
+    """
+    inventories_of_interest = dict(inventories_of_interest)
+    #Check to see if the stewicombo output of interest is stored as a csv
+    stewicombooutputfile = ''
+    for k,v in inventories_of_interest.items():
+        stewicombooutputfile = stewicombooutputfile+"{}_{}_".format(k, v)
+    stewicombooutputfile = stewicombooutputfile + 'fromstewicombo.csv'
+
+    if os.path.exists(data_dir+"/"+stewicombooutputfile):
+        emissions_and_wastes_by_facility = pd.read_csv(data_dir+"/"+stewicombooutputfile,header=0,dtype={"FacilityID":"str","Year":"int","eGRID_ID":"str"})
+    else:
+        emissions_and_wastes_by_facility = stewicombo.combineInventoriesforFacilitiesinOneInventory("eGRID",inventories_of_interest,filter_for_LCI=True)
+        #drop SRS fields
+        emissions_and_wastes_by_facility = emissions_and_wastes_by_facility.drop(columns=['SRS_ID','SRS_CAS'])
+        #drop 'Electricity' flow
+        emissions_and_wastes_by_facility = emissions_and_wastes_by_facility[emissions_and_wastes_by_facility['FlowName']!= 'Electricity']
+        #Save it to a csv for the next call
+        emissions_and_wastes_by_facility.to_csv(data_dir+stewicombooutputfile,index=False)
+    #with egrid 2016, tri 2016, nei 2016, rcrainfo 2015: 106284
+    return emissions_and_wastes_by_facility
+
+
+def __getattr__(name):
+    # The combined inventories are read on first use for the active model
+    if name in ('emissions_and_wastes_by_facility',
+                'years_in_emissions_and_wastes_by_facility'):
+        emissions_and_wastes_by_facility = get_emissions_and_wastes_by_facility(
+            inventories_key(model_config.inventories_of_interest))
+        if name == 'emissions_and_wastes_by_facility':
+            return emissions_and_wastes_by_facility
+        #Get a list of unique years in the emissions data
+        return list(pd.unique(emissions_and_wastes_by_facility['Year']))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
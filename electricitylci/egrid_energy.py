@@ -1,50 +1,75 @@
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from os.path import join
-from electricitylci.egrid_flowbyfacilty import egrid_flowbyfacility
+from electricitylci.egrid_flowbyfacilty import get_egrid_flowbyfacility
 from electricitylci.globals import data_dir
-from electricitylci.model_config import egrid_year
+from electricitylci import model_config
 
 #Filter warnings to remove warning about setting value on a slide of a df
 import warnings
 warnings.filterwarnings("ignore")
 
-#Get flow by facility data for egrid
-egrid_net_generation = egrid_flowbyfacility[egrid_flowbyfacility['FlowName']=='Electricity']
-#Convert flow amount to MWh
-egrid_net_generation.loc[:,'Electricity'] = egrid_net_generation['FlowAmount']*0.00027778
-#drop unneeded columns
-egrid_net_generation = egrid_net_generation.drop(columns=['ReliabilityScore','FlowName','FlowAmount','Compartment','Unit'])
-#Now just has 'FacilityID' and 'Electricity' in MWh
 
-#Get length
-len(egrid_net_generation)
-#2016:7715
+@lru_cache(maxsize=None)
+def get_egrid_net_generation(egrid_year):
+    egrid_flowbyfacility = get_egrid_flowbyfacility(egrid_year)
+    #Get flow by facility data for egrid
+    egrid_net_generation = egrid_flowbyfacility[egrid_flowbyfacility['FlowName']=='Electricity']
+    #Convert flow amount to MWh
+    egrid_net_generation.loc[:,'Electricity'] = egrid_net_generation['FlowAmount']*0.00027778
+    #drop unneeded columns
+    egrid_net_generation = egrid_net_generation.drop(columns=['ReliabilityScore','FlowName','FlowAmount','Compartment','Unit'])
+    #Now just has 'FacilityID' and 'Electricity' in MWh
+    #2016:7715
+    return egrid_net_generation
+
 
 #Returns list of egrid ids with positive_generation
 def list_egrid_facilities_with_positive_generation():
+    egrid_net_generation = get_egrid_net_generation(model_config.egrid_year)
     egrid_net_generation_above_min = egrid_net_generation[egrid_net_generation['Electricity'] > 0]
     return list(egrid_net_generation_above_min['FacilityID'])
 
-egrid_efficiency = egrid_flowbyfacility[egrid_flowbyfacility['FlowName'].isin(['Electricity','Heat'])]
-egrid_efficiency = egrid_efficiency.pivot(index = 'FacilityID',columns = 'FlowName',values = 'FlowAmount').reset_index()
-egrid_efficiency.sort_values(by='FacilityID',inplace=True)
-egrid_efficiency['Efficiency']= egrid_efficiency['Electricity']*100/egrid_efficiency['Heat']
-egrid_efficiency = egrid_efficiency.replace([np.inf, -np.inf], np.nan)
-egrid_efficiency.dropna(inplace=True)
-egrid_efficiency.head(50)
-len(egrid_efficiency)
+
+@lru_cache(maxsize=None)
+def get_egrid_efficiency(egrid_year):
+    egrid_flowbyfacility = get_egrid_flowbyfacility(egrid_year)
+    egrid_efficiency = egrid_flowbyfacility[egrid_flowbyfacility['FlowName'].isin(['Electricity','Heat'])]
+    egrid_efficiency = egrid_efficiency.pivot(index = 'FacilityID',columns = 'FlowName',values = 'FlowAmount').reset_index()
+    egrid_efficiency.sort_values(by='FacilityID',inplace=True)
+    egrid_efficiency['Efficiency']= egrid_efficiency['Electricity']*100/egrid_efficiency['Heat']
+    egrid_efficiency = egrid_efficiency.replace([np.inf, -np.inf], np.nan)
+    egrid_efficiency.dropna(inplace=True)
+    return egrid_efficiency
+
 
 def list_egrid_facilities_in_efficiency_range(min_efficiency,max_efficiency):
+    egrid_efficiency = get_egrid_efficiency(model_config.egrid_year)
     egrid_efficiency_pass = egrid_efficiency[(egrid_efficiency['Efficiency'] >= min_efficiency) & (egrid_efficiency['Efficiency'] <= max_efficiency)]
     return list(egrid_efficiency_pass['FacilityID'])
 
 
 #Get egrid generation reference data by subregion from the egrid data files ..used for validation
 #import reference data
-path = join(data_dir,
-            'egrid_subregion_generation_by_fuelcategory_reference_{}.csv'.format(egrid_year))
-ref_egrid_subregion_generation_by_fuelcategory = pd.read_csv(path)
-# ref_egrid_subregion_generation_by_fuelcategory = pd.read_csv(data_dir+'egrid_subregion_generation_by_fuelcategory_reference_' + str(egrid_year) + '.csv')
+@lru_cache(maxsize=None)
+def get_ref_egrid_subregion_generation_by_fuelcategory(egrid_year):
+    path = join(data_dir,
+                'egrid_subregion_generation_by_fuelcategory_reference_{}.csv'.format(egrid_year))
+    ref_egrid_subregion_generation_by_fuelcategory = pd.read_csv(path)
+    ref_egrid_subregion_generation_by_fuelcategory = ref_egrid_subregion_generation_by_fuelcategory.rename(columns={'Electricity':'Ref_Electricity_Subregion_FuelCategory'})
+    return ref_egrid_subregion_generation_by_fuelcategory
+
+
+_lazy_data = {
+    'egrid_net_generation': get_egrid_net_generation,
+    'egrid_efficiency': get_egrid_efficiency,
+    'ref_egrid_subregion_generation_by_fuelcategory': get_ref_egrid_subregion_generation_by_fuelcategory,
+}
+
 
-ref_egrid_subregion_generation_by_fuelcategory = ref_egrid_subregion_generation_by_fuelcategory.rename(columns={'Electricity':'Ref_Electricity_Subregion_FuelCategory'})
\ No newline at end of file
+def __getattr__(name):
+    # Module data is built on first use for the active model's egrid_year
+    if name in _lazy_data:
+        return _lazy_data[name](model_config.egrid_year)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,34 +1,9 @@
 import pandas as pd
 import stewi
+from functools import lru_cache
 from os.path import join
 from electricitylci.globals import data_dir
-from electricitylci.model_config import (
-    egrid_year,
-    min_plant_percent_generation_from_primary_fuel_category
-)
-
-#get egrid facility file from stewi
-egrid_facilities = stewi.getInventoryFacilities("eGRID",egrid_year)
-egrid_facilities.rename(columns={'Plant primary coal/oil/gas/ other fossil fuel category':'FuelCategory','Plant primary fuel':'PrimaryFuel','eGRID subregion acronym':'Subregion','NERC region acronym':'NERC'},inplace=True)
-
-#Remove NERC from original egrid output in stewi because there are mismatches in the original data with more than 1 NERC per egrid subregion
-egrid_facilities = egrid_facilities.drop(columns='NERC')
-#Bring in eGRID subregion-NERC mapping
-egrid_nerc = pd.read_csv(join(data_dir, 'egrid_subregion_to_NERC.csv'))
-egrid_facilities = pd.merge(egrid_facilities,egrid_nerc,on='Subregion',how='left')
-
-len(egrid_facilities)
-#2016:9709
-
-egrid_subregions = list(pd.unique(egrid_facilities['Subregion']))
-#Remove nan if present
-egrid_subregions = [x for x in egrid_subregions if str(x) != 'nan']
-len(egrid_subregions)
-
-#2016: 26
-#egrid_subregions = ['AZNM']
-
-egrid_primary_fuel_categories = sorted(pd.unique(egrid_facilities['FuelCategory'].dropna()))
+from electricitylci import model_config
 
 #correspondence between fuel category and percent_gen
 fuel_cat_to_per_gen = {'BIOMASS':'Plant biomass generation percent (resource mix)',
@@ -42,33 +17,85 @@ fuel_cat_to_per_gen = {'BIOMASS':'Plant biomass generation percent (resource mix
                        'OTHF':'Plant other unknown / purchased fuel generation percent (resource mix)',
                        'SOLAR':'Plant solar generation percent (resource mix)',
                        'WIND':'Plant wind generation percent (resource mix)'}
-#get subset of facility file with only these data
-list(fuel_cat_to_per_gen.values())
-cols_to_keep = ['FacilityID','FuelCategory']
-per_gen_cols = list(fuel_cat_to_per_gen.values())
-cols_to_keep = cols_to_keep + per_gen_cols
-egrid_facilities_fuel_cat_per_gen = egrid_facilities[cols_to_keep]
-egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen[egrid_facilities_fuel_cat_per_gen['FuelCategory'].notnull()]
+
 
 def add_percent_generation_from_primary_fuel_category_col(x):
     plant_fuel_category = x['FuelCategory']
     x['PercentGenerationfromDesignatedFuelCategory'] = x[fuel_cat_to_per_gen[plant_fuel_category]]
     return x
 
+
+@lru_cache(maxsize=None)
+def get_egrid_facilities_data(egrid_year):
+    """
+    Read the eGRID facility file from stewi and derive the subregion and fuel
+    category data used throughout the eGRID-based model. The data is read
+    once per egrid_year.
+
+    Parameters
+    ----------
+    egrid_year : int
+
+    Returns
+    -------
+    dict
+        egrid_facilities, egrid_subregions, egrid_primary_fuel_categories
+        and egrid_facilities_fuel_cat_per_gen, keyed by name.
+    """
+    #get egrid facility file from stewi
+    egrid_facilities = stewi.getInventoryFacilities("eGRID",egrid_year)
+    egrid_facilities.rename(columns={'Plant primary coal/oil/gas/ other fossil fuel category':'FuelCategory','Plant primary fuel':'PrimaryFuel','eGRID subregion acronym':'Subregion','NERC region acronym':'NERC'},inplace=True)
+
+    #Remove NERC from original egrid output in stewi because there are mismatches in the original data with more than 1 NERC per egrid subregion
+    egrid_facilities = egrid_facilities.drop(columns='NERC')
+    #Bring in eGRID subregion-NERC mapping
+    egrid_nerc = pd.read_csv(join(data_dir, 'egrid_subregion_to_NERC.csv'))
+    egrid_facilities = pd.merge(egrid_facilities,egrid_nerc,on='Subregion',how='left')
+    #2016:9709
+
+    egrid_subregions = list(pd.unique(egrid_facilities['Subregion']))
+    #Remove nan if present
+    egrid_subregions = [x for x in egrid_subregions if str(x) != 'nan']
+    #2016: 26
+
+    egrid_primary_fuel_categories = sorted(pd.unique(egrid_facilities['FuelCategory'].dropna()))
+
+    #get subset of facility file with only these data
+    cols_to_keep = ['FacilityID','FuelCategory']
+    per_gen_cols = list(fuel_cat_to_per_gen.values())
+    cols_to_keep = cols_to_keep + per_gen_cols
+    egrid_facilities_fuel_cat_per_gen = egrid_facilities[cols_to_keep]
+    egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen[egrid_facilities_fuel_cat_per_gen['FuelCategory'].notnull()]
+
+    #Add the percent generation from primary fuel cat to its own column
+    egrid_facilities_fuel_cat_per_gen['PercentGenerationfromDesignatedFuelCategory'] = 0
+    egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen.apply(add_percent_generation_from_primary_fuel_category_col,axis=1)
+    egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen.drop(columns=per_gen_cols)
+    egrid_facilities = egrid_facilities.drop(columns=per_gen_cols)
+
+    #Merge back into facilities
+    egrid_facilities = pd.merge(egrid_facilities,egrid_facilities_fuel_cat_per_gen,on=['FacilityID','FuelCategory'],how='left')
+    return {
+        'egrid_facilities': egrid_facilities,
+        'egrid_subregions': egrid_subregions,
+        'egrid_primary_fuel_categories': egrid_primary_fuel_categories,
+        'egrid_facilities_fuel_cat_per_gen': egrid_facilities_fuel_cat_per_gen,
+    }
+
+
 def list_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min():
-    passing_facilties = egrid_facilities_fuel_cat_per_gen[egrid_facilities_fuel_cat_per_gen['PercentGenerationfromDesignatedFuelCategory'] > min_plant_percent_generation_from_primary_fuel_category]
+    egrid_facilities_fuel_cat_per_gen = get_egrid_facilities_data(model_config.egrid_year)['egrid_facilities_fuel_cat_per_gen']
+    passing_facilties = egrid_facilities_fuel_cat_per_gen[egrid_facilities_fuel_cat_per_gen['PercentGenerationfromDesignatedFuelCategory'] > model_config.min_plant_percent_generation_from_primary_fuel_category]
     #Delete duplicates by creating a set
     facility_ids_passing = list(set(passing_facilties['FacilityID']))
     return facility_ids_passing
 
-#Add the percent generation from primary fuel cat to its own column
-egrid_facilities_fuel_cat_per_gen['PercentGenerationfromDesignatedFuelCategory'] = 0
-egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen.apply(add_percent_generation_from_primary_fuel_category_col,axis=1)
-egrid_facilities_fuel_cat_per_gen = egrid_facilities_fuel_cat_per_gen.drop(columns=per_gen_cols)
-egrid_facilities = egrid_facilities.drop(columns=per_gen_cols)
-
-
-
 
-#Merge back into facilities
-egrid_facilities = pd.merge(egrid_facilities,egrid_facilities_fuel_cat_per_gen,on=['FacilityID','FuelCategory'],how='left')
+def __getattr__(name):
+    # The facility data is read on first use for the active model's egrid_year
+    # rather than when the module is imported.
+    if name in ('egrid_facilities', 'egrid_subregions',
+                'egrid_primary_fuel_categories',
+                'egrid_facilities_fuel_cat_per_gen'):
+        return get_egrid_facilities_data(model_config.egrid_year)[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,81 +1,156 @@
 ###Creates the data for electricity generation processes by fuel type and eGRID subregion
-###Uses global variables set in the globals file that define fifile:///C:/Users/TGhosh/Dropbox/Electricity_LCI/2. Electric_Refactor after July/ElectricityLCI/electricitylci/%23%23_____code%23for%23developer.pylters
+###Uses the filter parameters in the model config to select facilities
 import warnings
 import pandas as pd
+from functools import lru_cache
 warnings.filterwarnings("ignore")
 
-from electricitylci.model_config import *
-from electricitylci.egrid_facilities import egrid_facilities,list_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min
-from electricitylci.egrid_energy import list_egrid_facilities_with_positive_generation, list_egrid_facilities_in_efficiency_range,egrid_net_generation
-from electricitylci.egrid_emissions_and_waste_by_facility import emissions_and_wastes_by_facility
+from electricitylci import model_config
+from electricitylci.egrid_facilities import get_egrid_facilities_data,list_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min
+from electricitylci.egrid_energy import list_egrid_facilities_with_positive_generation, list_egrid_facilities_in_efficiency_range,get_egrid_net_generation
+from electricitylci.egrid_emissions_and_waste_by_facility import get_emissions_and_wastes_by_facility, inventories_key
 from electricitylci.egrid_FRS_matches import list_FRS_ids_filtered_for_NAICS
 
-#Get lists of egrid facilities
-all_egrid_facility_ids = list(egrid_facilities['FacilityID'])
-len(all_egrid_facility_ids)
-#ELCI_1: 9709
-
-##Facility filtering
-#Start with facilities with a not null generation value
-egrid_facilities_selected_on_generation = list(egrid_net_generation['FacilityID'])
-#Replace this list with just net positive generators if true
-if include_only_egrid_facilities_with_positive_generation:
-    egrid_facilities_selected_on_generation = list_egrid_facilities_with_positive_generation()
-len(egrid_facilities_selected_on_generation)
-#ELCI_1: 7538
-
-#Get facilities in efficiency range
-
-egrid_facilities_in_desired_efficiency_range = all_egrid_facility_ids
-if filter_on_efficiency:
-    egrid_facilities_in_desired_efficiency_range = list_egrid_facilities_in_efficiency_range(egrid_facility_efficiency_filters['lower_efficiency'],
-                                          egrid_facility_efficiency_filters['upper_efficiency'])
-len(egrid_facilities_in_desired_efficiency_range)
-#ELCI_1: 7407
-
-#Get facilities with percent generation over threshold from the fuel category they are assigned to
-egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min = all_egrid_facility_ids
-if filter_on_min_plant_percent_generation_from_primary_fuel and not keep_mixed_plant_category:
-    egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min = list_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min()
-len(egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min)
-#ELCI_1: 7095
-
-#Use a python set to find the intersection
-egrid_facilities_to_include = list(set(egrid_facilities_selected_on_generation)
-                                   & set(egrid_facilities_in_desired_efficiency_range)
-                                   & set(egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min))
-len(egrid_facilities_to_include)
-#ELCI_1:7001
-
-#Get the generation data for these facilities only
-electricity_for_selected_egrid_facilities = egrid_net_generation[egrid_net_generation['FacilityID'].isin(egrid_facilities_to_include)]
-len(electricity_for_selected_egrid_facilities)
-
-###Emissions and wastes filtering
-#Start with all emissions and wastes; these are in this file
-emissions_and_waste_for_selected_egrid_facilities = emissions_and_wastes_by_facility[emissions_and_wastes_by_facility['eGRID_ID'].isin(egrid_facilities_to_include)]
-
-len(pd.unique(emissions_and_wastes_by_facility['eGRID_ID']))
-#len(emissions_and_waste_by_facility_for_selected_egrid_facilities.drop_duplicates())
-
-#emissions_and_waste_by_facility_for_selected_egrid_facilities['eGRID_ID'] = emissions_and_waste_by_facility_for_selected_egrid_facilities['eGRID_ID'].apply(pd.to_numeric, errors = 'coerce')
-
-#NAICS Filtering
-#Apply only to the non-egrid data
-#Pull egrid data out first
-egrid_emissions_for_selected_egrid_facilities = emissions_and_waste_for_selected_egrid_facilities[emissions_and_waste_for_selected_egrid_facilities['Source'] == 'eGRID']
-#2016: 22842
-
-#Separate out nonegrid emissions and wastes
-nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities = emissions_and_waste_for_selected_egrid_facilities[emissions_and_waste_for_selected_egrid_facilities['Source'] != 'eGRID']
-
-#includes only the non_egrid_emissions for facilities not filtered out with NAICS
-if filter_non_egrid_emission_on_NAICS:
-    # Get list of facilities meeting NAICS criteria
-    frs_ids_meeting_NAICS_criteria = list_FRS_ids_filtered_for_NAICS()
-    nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities = nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities[nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities['FRS_ID'].isin(frs_ids_meeting_NAICS_criteria)]
-
-#Join the datasets back together
-emissions_and_waste_for_selected_egrid_facilities = pd.concat([egrid_emissions_for_selected_egrid_facilities, nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities])
-len(emissions_and_waste_for_selected_egrid_facilities)
-#for egrid 2016,TRI 2016,NEI 2016,RCRAInfo 2015: 90792
+# Model config parameters that change the result of the facility filtering
+filter_config_keys = [
+    'egrid_year',
+    'inventories_of_interest',
+    'include_only_egrid_facilities_with_positive_generation',
+    'filter_on_efficiency',
+    'egrid_facility_efficiency_filters',
+    'filter_on_min_plant_percent_generation_from_primary_fuel',
+    'min_plant_percent_generation_from_primary_fuel_category',
+    'keep_mixed_plant_category',
+    'filter_non_egrid_emission_on_NAICS',
+]
+
+# Names of the filtered facility lists and data, available as module attributes
+filtered_names = (
+    'all_egrid_facility_ids',
+    'egrid_facilities_selected_on_generation',
+    'egrid_facilities_in_desired_efficiency_range',
+    'egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min',
+    'egrid_facilities_to_include',
+    'electricity_for_selected_egrid_facilities',
+    'egrid_emissions_for_selected_egrid_facilities',
+    'nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities',
+    'emissions_and_waste_for_selected_egrid_facilities',
+)
+
+
+def _filter_config():
+    """Hashable snapshot of the active model's filter parameters."""
+    config = []
+    for key in filter_config_keys:
+        value = getattr(model_config, key)
+        if key == 'inventories_of_interest':
+            value = inventories_key(value)
+        elif isinstance(value, dict):
+            value = tuple(sorted(value.items()))
+        config.append((key, value))
+    return tuple(config)
+
+
+@lru_cache(maxsize=None)
+def filter_egrid_facilities(filter_config):
+    """
+    Select the eGRID facilities, generation, and emissions to include in the
+    model. The filtering is done once per combination of filter parameters,
+    so models that share them share the result.
+
+    Parameters
+    ----------
+    filter_config : tuple
+        (key, value) pairs for the parameters in filter_config_keys, as
+        returned by _filter_config.
+
+    Returns
+    -------
+    dict
+        The filtered lists and dataframes, keyed by their former module-level
+        names.
+    """
+    config = dict(filter_config)
+    egrid_facilities = get_egrid_facilities_data(config['egrid_year'])['egrid_facilities']
+    egrid_net_generation = get_egrid_net_generation(config['egrid_year'])
+    emissions_and_wastes_by_facility = get_emissions_and_wastes_by_facility(
+        config['inventories_of_interest'])
+
+    #Get lists of egrid facilities
+    all_egrid_facility_ids = list(egrid_facilities['FacilityID'])
+    #ELCI_1: 9709
+
+    ##Facility filtering
+    #Start with facilities with a not null generation value
+    egrid_facilities_selected_on_generation = list(egrid_net_generation['FacilityID'])
+    #Replace this list with just net positive generators if true
+    if config['include_only_egrid_facilities_with_positive_generation']:
+        egrid_facilities_selected_on_generation = list_egrid_facilities_with_positive_generation()
+    #ELCI_1: 7538
+
+    #Get facilities in efficiency range
+    egrid_facility_efficiency_filters = dict(config['egrid_facility_efficiency_filters'])
+    egrid_facilities_in_desired_efficiency_range = all_egrid_facility_ids
+    if config['filter_on_efficiency']:
+        egrid_facilities_in_desired_efficiency_range = list_egrid_facilities_in_efficiency_range(egrid_facility_efficiency_filters['lower_efficiency'],
+                                              egrid_facility_efficiency_filters['upper_efficiency'])
+    #ELCI_1: 7407
+
+    #Get facilities with percent generation over threshold from the fuel category they are assigned to
+    egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min = all_egrid_facility_ids
+    if config['filter_on_min_plant_percent_generation_from_primary_fuel'] and not config['keep_mixed_plant_category']:
+        egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min = list_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min()
+    #ELCI_1: 7095
+
+    #Use a python set to find the intersection
+    egrid_facilities_to_include = list(set(egrid_facilities_selected_on_generation)
+                                       & set(egrid_facilities_in_desired_efficiency_range)
+                                       & set(egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min))
+    #ELCI_1:7001
+
+    #Get the generation data for these facilities only
+    electricity_for_selected_egrid_facilities = egrid_net_generation[egrid_net_generation['FacilityID'].isin(egrid_facilities_to_include)]
+
+    ###Emissions and wastes filtering
+    #Start with all emissions and wastes; these are in this file
+    emissions_and_waste_for_selected_egrid_facilities = emissions_and_wastes_by_facility[emissions_and_wastes_by_facility['eGRID_ID'].isin(egrid_facilities_to_include)]
+
+    #emissions_and_waste_by_facility_for_selected_egrid_facilities['eGRID_ID'] = emissions_and_waste_by_facility_for_selected_egrid_facilities['eGRID_ID'].apply(pd.to_numeric, errors = 'coerce')
+
+    #NAICS Filtering
+    #Apply only to the non-egrid data
+    #Pull egrid data out first
+    egrid_emissions_for_selected_egrid_facilities = emissions_and_waste_for_selected_egrid_facilities[emissions_and_waste_for_selected_egrid_facilities['Source'] == 'eGRID']
+    #2016: 22842
+
+    #Separate out nonegrid emissions and wastes
+    nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities = emissions_and_waste_for_selected_egrid_facilities[emissions_and_waste_for_selected_egrid_facilities['Source'] != 'eGRID']
+
+    #includes only the non_egrid_emissions for facilities not filtered out with NAICS
+    if config['filter_non_egrid_emission_on_NAICS']:
+        # Get list of facilities meeting NAICS criteria
+        frs_ids_meeting_NAICS_criteria = list_FRS_ids_filtered_for_NAICS()
+        nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities = nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities[nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities['FRS_ID'].isin(frs_ids_meeting_NAICS_criteria)]
+
+    #Join the datasets back together
+    emissions_and_waste_for_selected_egrid_facilities = pd.concat([egrid_emissions_for_selected_egrid_facilities, nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities])
+    #for egrid 2016,TRI 2016,NEI 2016,RCRAInfo 2015: 90792
+    return {
+        'all_egrid_facility_ids': all_egrid_facility_ids,
+        'egrid_facilities_selected_on_generation': egrid_facilities_selected_on_generation,
+        'egrid_facilities_in_desired_efficiency_range': egrid_facilities_in_desired_efficiency_range,
+        'egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min': egrid_facilities_w_percent_generation_from_primary_fuel_category_greater_than_min,
+        'egrid_facilities_to_include': egrid_facilities_to_include,
+        'electricity_for_selected_egrid_facilities': electricity_for_selected_egrid_facilities,
+        'egrid_emissions_for_selected_egrid_facilities': egrid_emissions_for_selected_egrid_facilities,
+        'nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities': nonegrid_emissions_and_waste_by_facility_for_selected_egrid_facilities,
+        'emissions_and_waste_for_selected_egrid_facilities': emissions_and_waste_for_selected_egrid_facilities,
+    }
+
+
+def __getattr__(name):
+    # The filtered facilities are selected on first use for the active model,
+    # rather than when the module is imported.
+    if name in filtered_names:
+        return filter_egrid_facilities(_filter_config())[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
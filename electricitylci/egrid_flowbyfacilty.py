@@ -1,11 +1,19 @@
 import stewi
-from electricitylci.model_config import egrid_year
+from functools import lru_cache
+from electricitylci import model_config
+from electricitylci.source_data import shared_source
 
-#Get inventory data to get net generation per facility
-egrid_flowbyfacility = stewi.getInventory("eGRID",egrid_year)
-
-#Peek at it
-egrid_flowbyfacility.head(50)
 
+#Get inventory data to get net generation per facility
+@lru_cache(maxsize=None)
+@shared_source("egrid_flowbyfacility")
+def get_egrid_flowbyfacility(egrid_year):
+    return stewi.getInventory("eGRID",egrid_year)
 
 
+def __getattr__(name):
+    # egrid_flowbyfacility is read on first use for the active model's
+    # egrid_year rather than when the module is imported.
+    if name == 'egrid_flowbyfacility':
+        return get_egrid_flowbyfacility(model_config.egrid_year)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
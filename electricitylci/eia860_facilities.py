@@ -18,7 +18,8 @@ from electricitylci.utils import (
     find_file_in_folder,
     create_ba_region_map,
 )
-from electricitylci.model_config import regional_aggregation
+from electricitylci import model_config
+from electricitylci.source_data import shared_source
 
 
 def _clean_columns(df):
@@ -75,8 +76,11 @@ def load_eia860_excel(eia860_path, sheet="Plant", header=1):
     return eia
 
 
-def eia860_balancing_authority(year):
-
+@shared_source("eia860_plant")
+def eia860_plant(year):
+    """
+    Download (if necessary) and read the EIA-860 plant sheet for a year.
+    """
     expected_860_folder = join(data_dir, "eia860_{}".format(year))
 
     if not os.path.exists(expected_860_folder):
@@ -142,7 +146,12 @@ def eia860_balancing_authority(year):
             csv_fn = eia860_name.split(".")[0] + ".csv"
             csv_path = join(expected_860_folder, csv_fn)
             eia.to_csv(csv_path, index=False)
+    return eia
+
+
+def eia860_balancing_authority(year):
 
+    eia = eia860_plant(year)
     ba_cols = [
         "Plant Id",
         "State",
@@ -153,9 +162,9 @@ def eia860_balancing_authority(year):
     eia_plant_ba_match = eia.loc[:, ba_cols].drop_duplicates()
 
     # Map the balancing authority to a larger region (e.g. FERC or EIA)
-    if regional_aggregation:
-        region_map = create_ba_region_map(region_col=regional_aggregation)
-        eia_plant_ba_match[regional_aggregation] = eia_plant_ba_match[
+    if model_config.regional_aggregation:
+        region_map = create_ba_region_map(region_col=model_config.regional_aggregation)
+        eia_plant_ba_match[model_config.regional_aggregation] = eia_plant_ba_match[
             "Balancing Authority Code"
         ].map(region_map)
 
@@ -167,6 +176,7 @@ def eia860_primary_capacity(year):
     pass
 
 
+@shared_source("eia860_EnviroAssoc_so2")
 def eia860_EnviroAssoc_so2(year):
     expected_860_folder = join(data_dir, "eia860_{}".format(year))
 
@@ -238,6 +248,7 @@ def eia860_EnviroAssoc_so2(year):
     return eia
 
 
+@shared_source("eia860_boiler_info_design")
 def eia860_boiler_info_design(year):
     expected_860_folder = join(data_dir, "eia860_{}".format(year))
 
@@ -303,6 +314,7 @@ def eia860_boiler_info_design(year):
     return eia
 
 
+@shared_source("eia860_EnviroAssoc_nox")
 def eia860_EnviroAssoc_nox(year):
     expected_860_folder = join(data_dir, "eia860_{}".format(year))
 
@@ -373,6 +385,7 @@ def eia860_EnviroAssoc_nox(year):
     eia = _clean_columns(eia)
     return eia
 
+@shared_source("eia860_generator_info")
 def eia860_generator_info(year):
     expected_860_folder = join(data_dir, "eia860_{}".format(year))
 
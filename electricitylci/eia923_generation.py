@@ -6,18 +6,9 @@ from os.path import join
 import requests
 from electricitylci.globals import data_dir, EIA923_BASE_URL, FUEL_CAT_CODES
 from electricitylci.utils import download_unzip, find_file_in_folder
-from electricitylci.model_config import (
-    include_only_egrid_facilities_with_positive_generation,
-    filter_on_efficiency,
-    filter_on_min_plant_percent_generation_from_primary_fuel,
-    min_plant_percent_generation_from_primary_fuel_category,
-    keep_mixed_plant_category,
-    filter_non_egrid_emission_on_NAICS,
-    egrid_facility_efficiency_filters,
-    inventories_of_interest,
-    eia_gen_year,
-)
+from electricitylci import model_config
 from electricitylci.eia860_facilities import eia860_balancing_authority
+from electricitylci.source_data import shared_source
 from functools import lru_cache
 
 EIA923_PAGES = {
@@ -117,6 +108,7 @@ def load_eia923_excel(eia923_path, page="1"):
 # This function is called multiple times by the various upstream modules.
 # lru_cache allows us to only read from the csv only once.
 @lru_cache(maxsize=10)
+@shared_source("eia923_download_extract")
 def eia923_download_extract(
     year,
     group_cols=[
@@ -348,8 +340,8 @@ def calculate_plant_efficiency(gen_fuel_data):
 
 def efficiency_filter(df):
 
-    upper = egrid_facility_efficiency_filters["upper_efficiency"]
-    lower = egrid_facility_efficiency_filters["lower_efficiency"]
+    upper = model_config.egrid_facility_efficiency_filters["upper_efficiency"]
+    lower = model_config.egrid_facility_efficiency_filters["lower_efficiency"]
 
     df = df.loc[(df["efficiency"] >= lower) & (df["efficiency"] <= upper), :]
 
@@ -387,7 +379,7 @@ def build_generation_data(
     if not generation_years:
         # Use the years from inventories of interest
         generation_years = set(
-            list(inventories_of_interest.values()) + [eia_gen_year]
+            list(model_config.inventories_of_interest.values()) + [model_config.eia_gen_year]
         )
 
     df_list = []
@@ -398,16 +390,16 @@ def build_generation_data(
 
         final_gen_df = gen_efficiency.merge(primary_fuel, on="Plant Id")
         if not egrid_facilities_to_include:
-            if include_only_egrid_facilities_with_positive_generation:
+            if model_config.include_only_egrid_facilities_with_positive_generation:
                 final_gen_df = final_gen_df.loc[
                     final_gen_df["Net Generation (Megawatthours)"] >= 0, :
                 ]
-            if filter_on_efficiency:
+            if model_config.filter_on_efficiency:
                 final_gen_df = efficiency_filter(final_gen_df)
-            if filter_on_min_plant_percent_generation_from_primary_fuel and not keep_mixed_plant_category:
+            if model_config.filter_on_min_plant_percent_generation_from_primary_fuel and not model_config.keep_mixed_plant_category:
                 final_gen_df = final_gen_df.loc[
                     final_gen_df["primary fuel percent gen"]
-                    >= min_plant_percent_generation_from_primary_fuel_category,
+                    >= model_config.min_plant_percent_generation_from_primary_fuel_category,
                     :,
                 ]
             # if filter_non_egrid_emission_on_NAICS:
@@ -442,6 +434,7 @@ def build_generation_data(
     return all_years_gen
 
 
+@shared_source("eia923_generation_and_fuel")
 def eia923_generation_and_fuel(year):
     expected_923_folder = join(data_dir, "f923_{}".format(year))
 
@@ -503,6 +496,7 @@ def eia923_generation_and_fuel(year):
     return eia
 
 
+@shared_source("eia923_boiler_fuel")
 def eia923_boiler_fuel(year):
     expected_923_folder = join(data_dir, "f923_{}".format(year))
 
@@ -564,6 +558,7 @@ def eia923_boiler_fuel(year):
     return eia
 
 
+@shared_source("eia923_sched8_aec")
 def eia923_sched8_aec(year):
     expected_923_folder = join(data_dir, "f923_{}".format(year))
 
@@ -20,14 +20,8 @@ from electricitylci.bulk_eia_data import download_EBA, row_to_df, ba_exchange_to
 import electricitylci.eia923_generation as eia923
 import electricitylci.eia860_facilities as eia860
 
-from electricitylci.model_config import (
-    use_primaryfuel_for_coal,
-    fuel_name,
-    replace_egrid,
-    eia_gen_year,
-    # region_column_name,
-    model_specs
-)
+from electricitylci import model_config
+from electricitylci.instrumentation import instrumented
 from electricitylci.process_dictionary_writer import *
 """
     Merge generation and emissions data. Add region designations using either
@@ -43,6 +37,9 @@ from electricitylci.process_dictionary_writer import *
     subregion : str
         Description of a group of regions. Options include 'FERC' for all FERC
         market regions, 'BA' for all balancing authorities.
+    eba_path : str, optional
+        Path of the EIA bulk data zip file (EBA.zip). By default the file in
+        data/bulk_data, which is downloaded if it doesn't exist.
 
     Returns
     -------
@@ -60,12 +57,13 @@ from electricitylci.process_dictionary_writer import *
 
 """
 
-def ba_io_trading_model(year=None, subregion=None):
+@instrumented
+def ba_io_trading_model(year=None, subregion=None, eba_path=None):
 
     if year is None:
-        year = model_specs['NETL_IO_trading_year']
+        year = model_config.model_specs['NETL_IO_trading_year']
     if subregion is None:
-        subregion = model_specs['regional_aggregation']
+        subregion = model_config.model_specs['regional_aggregation']
     if subregion not in ['BA', 'FERC']:
         raise ValueError(
             f'subregion or regional_aggregation must have a value of "BA" or "FERC" '
@@ -90,7 +88,7 @@ def ba_io_trading_model(year=None, subregion=None):
     #Read in the bulk data
 
 #    download_EBA()
-    path = join(data_dir, 'bulk_data', 'EBA.zip')
+    path = eba_path or join(data_dir, 'bulk_data', 'EBA.zip')
 
     try:
         logging.info("Using existing bulk data download")
@@ -98,6 +96,8 @@ def ba_io_trading_model(year=None, subregion=None):
         with z.open('EBA.txt') as f:
             raw_txt = f.readlines()
     except FileNotFoundError:
+        if eba_path is not None:
+            raise
         logging.info("Downloading new bulk data")
         download_EBA()
         z = zipfile.ZipFile(path, 'r')
@@ -526,13 +526,6 @@ def olca_schema_consumption_mix(database, gen_dict, subregion="BA"):
     import numpy as np
     import pandas as pd
 
-    from electricitylci.model_config import (
-        use_primaryfuel_for_coal,
-        fuel_name,
-        replace_egrid,
-        eia_gen_year,
-        # region_column_name,
-    )
     from electricitylci.generation import eia_facility_fuel_region
     from electricitylci.globals import data_dir, output_dir
     from electricitylci.process_dictionary_writer import (
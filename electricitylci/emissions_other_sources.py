@@ -4,12 +4,13 @@ Integration of emissions from data sources that were not included in stewi
 
 import pandas as pd
 from electricitylci.coal_upstream import generate_upstream_coal
-from electricitylci.model_config import eia_gen_year
+from electricitylci import model_config
 
-# Import functions for other upstream fuels and include them in this list
-# with the appropriate input parameters.
+# Import functions for other upstream fuels and include them in this list.
+# Each is called with the model's eia_gen_year when the upstream emissions are
+# combined.
 UPSTREAM_EMISSION_GENERATORS = [
-    generate_upstream_coal(eia_gen_year),
+    generate_upstream_coal,
 ]
 
 
@@ -95,7 +96,9 @@ def combine_upstream_emissions():
         fuel types.
     """
 
-    upstream = pd.concat(fn for fn in UPSTREAM_EMISSION_GENERATORS)
+    upstream = pd.concat(
+        fn(model_config.eia_gen_year) for fn in UPSTREAM_EMISSION_GENERATORS
+    )
 
     return upstream
 
@@ -6,33 +6,37 @@ import warnings
 warnings.filterwarnings("ignore")
 
 from electricitylci.process_dictionary_writer import *
-from electricitylci.egrid_facilities import egrid_facilities,egrid_subregions
-from electricitylci.egrid_emissions_and_waste_by_facility import years_in_emissions_and_wastes_by_facility
+from functools import lru_cache
+from electricitylci.egrid_facilities import get_egrid_facilities_data
 from electricitylci.globals import output_dir, join_with_underscore
-from electricitylci.model_config import (
-    egrid_year,
-    use_primaryfuel_for_coal,
-    fuel_name,
-    replace_egrid,
-    eia_gen_year,
-    # region_column_name,
-    regional_aggregation
-)
+from electricitylci import model_config
 from electricitylci.utils import create_ba_region_map
 # from electricitylci.eia923_generation import eia_download_extract
-from electricitylci.process_exchange_aggregator_uncertainty import compilation,uncertainty,max_min
+from electricitylci.process_exchange_aggregator_uncertainty import compilation_by_group,uncertainty_by_group
 from electricitylci.elementaryflows import map_emissions_to_fedelemflows,map_renewable_heat_flows_to_fedelemflows,map_compartment_to_flow_type,add_flow_direction
-from electricitylci.dqi import lookup_score_with_bound_key
+from electricitylci.dqi import score_array
 from electricitylci.technosphereflows import map_heat_inputs_to_fuel_names
-#Get a subset of the egrid_facilities dataset
-egrid_facilities_w_fuel_region = egrid_facilities[['FacilityID','Subregion','PrimaryFuel','FuelCategory','NERC','PercentGenerationfromDesignatedFuelCategory','Balancing Authority Name','Balancing Authority Code']]
-
-from electricitylci.egrid_energy import ref_egrid_subregion_generation_by_fuelcategory
+from electricitylci.egrid_energy import get_ref_egrid_subregion_generation_by_fuelcategory
 
 from electricitylci.eia923_generation import eia923_primary_fuel
 from electricitylci.eia860_facilities import eia860_balancing_authority
 
 
+#Get a subset of the egrid_facilities dataset
+@lru_cache(maxsize=None)
+def get_egrid_facilities_w_fuel_region(egrid_year):
+    egrid_facilities = get_egrid_facilities_data(egrid_year)['egrid_facilities']
+    return egrid_facilities[['FacilityID','Subregion','PrimaryFuel','FuelCategory','NERC','PercentGenerationfromDesignatedFuelCategory','Balancing Authority Name','Balancing Authority Code']]
+
+
+def __getattr__(name):
+    # egrid_facilities_w_fuel_region is built on first use for the active
+    # model's egrid_year. Callers get a copy they are free to modify.
+    if name == 'egrid_facilities_w_fuel_region':
+        return get_egrid_facilities_w_fuel_region(model_config.egrid_year).copy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def eia_facility_fuel_region(year):
 
     primary_fuel = eia923_primary_fuel(year=year)
@@ -85,7 +89,7 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
         Combined emissions and generation data for each facility
     """
     if subregion is None:
-        subregion = regional_aggregation
+        subregion = model_config.regional_aggregation
 
     emissions_data = emissions_data.drop(columns = ['FacilityID'])
     generation_data["FacilityID"]=generation_data["FacilityID"].astype(int)
@@ -129,8 +133,8 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
     #Dropping unnecessary columns
     emissions_gen_data = combined_data.drop(columns = cols_to_drop_for_final)
     emissions_gen_data["eGRID_ID"]=emissions_gen_data["eGRID_ID"].astype(int)
-    if replace_egrid:
-        year = eia_gen_year
+    if model_config.replace_egrid:
+        year = model_config.eia_gen_year
 
         # This will only add BA labels, not eGRID subregions
         fuel_region = eia_facility_fuel_region(year)
@@ -140,21 +144,22 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
                               how='right')
     else:
         #Merging with the egrid_facilites file to get the subregion information in the database!!!
+        egrid_facilities_w_fuel_region = get_egrid_facilities_w_fuel_region(model_config.egrid_year).copy()
         egrid_facilities_w_fuel_region["FacilityID"]=egrid_facilities_w_fuel_region["FacilityID"].astype(int)
         final_data = pd.merge(egrid_facilities_w_fuel_region,
                               emissions_gen_data, left_on=['FacilityID'],
                               right_on=['eGRID_ID'], how='right')
 
     #Add in reference electricity for subregion and fuel category
-    if not replace_egrid:
+    if not model_config.replace_egrid:
         final_data = pd.merge(
             final_data,
-            ref_egrid_subregion_generation_by_fuelcategory,
+            get_ref_egrid_subregion_generation_by_fuelcategory(model_config.egrid_year),
             on=['Subregion', 'FuelCategory'],
             how='left'
         )
 
-    if replace_egrid is True:
+    if model_config.replace_egrid is True:
         # Subregion shows up all over the place below. If not using egrid
         # sub in the BA name because we don't have the eGRID subregion.
         if subregion:
@@ -187,7 +192,7 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
         except KeyError:
             print(f"Configuration file specifes region column as {subregion}, but it does not exist")
             if subregion == 'eGRID':
-                regions = egrid_subregions
+                regions = get_egrid_facilities_data(model_config.egrid_year)['egrid_subregions']
             elif subregion == 'NERC':
                 regions = list(pd.unique(final_data['NERC']))
             elif subregion == 'BA':
@@ -195,7 +200,7 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
             else:
                 regions = [subregion]
     elif subregion == 'eGRID':
-        regions = egrid_subregions
+        regions = get_egrid_facilities_data(model_config.egrid_year)['egrid_subregions']
     elif subregion == 'NERC':
         regions = list(pd.unique(final_data['NERC']))
     elif subregion == 'BA':
@@ -229,7 +234,7 @@ def combine_gen_emissions_data(generation_data, emissions_data, subregion=None):
 def create_generation_process_df(generation_data, emissions_data, subregion=None):
 
     if subregion is None:
-        subregion = regional_aggregation
+        subregion = model_config.regional_aggregation
 
     final_database = combine_gen_emissions_data(
         generation_data,
@@ -243,7 +248,7 @@ def create_generation_process_df(generation_data, emissions_data, subregion=None
         except KeyError:
             print(f"Configuration file specifes region column as {subregion}, but it does not exist")
             if subregion == 'eGRID':
-                regions = egrid_subregions
+                regions = get_egrid_facilities_data(model_config.egrid_year)['egrid_subregions']
             elif subregion == 'NERC':
                 regions = list(pd.unique(final_data['NERC']))
             elif subregion == 'BA':
@@ -251,7 +256,7 @@ def create_generation_process_df(generation_data, emissions_data, subregion=None
             else:
                 regions = [subregion]
     elif subregion == 'eGRID':
-        regions = egrid_subregions
+        regions = get_egrid_facilities_data(model_config.egrid_year)['egrid_subregions']
     elif subregion == 'NERC':
         regions = list(pd.unique(final_database['NERC']))
     elif subregion == 'BA':
@@ -259,11 +264,6 @@ def create_generation_process_df(generation_data, emissions_data, subregion=None
     else:
         regions = [subregion]
 
-    # Create dfs for storing the output
-    result_database = pd.DataFrame()
-    total_gen_database = pd.DataFrame()
-    # Looping through different subregions to create the files
-
     # Columns to keep in datbase_f2
     database_f2_cols = [
         'Subregion', 'FuelCategory', 'PrimaryFuel', 'eGRID_ID',
@@ -273,123 +273,167 @@ def create_generation_process_df(generation_data, emissions_data, subregion=None
         'Balancing Authority Name','ElementaryFlowPrimeContext',
         'Balancing Authority Code', 'Ref_Electricity_Subregion_FuelCategory'
     ]
-    df_list = []
-    for reg in regions:
-
-        print("Creating generation process database for " + reg + " ...")
-        # Cropping out based on regions
-        if subregion == 'eGRID':
-            database = final_database[final_database['Subregion'] == reg]
-        elif subregion == 'NERC':
-            database = final_database[final_database['NERC'] == reg]
-        elif subregion == 'BA':
-            database = final_database[final_database['Balancing Authority Name'] == reg]
-        elif subregion == 'US':
-            # For entire US use full database
-            database = final_database
-        else:
-            # This should be a egrid subregion
-            database = final_database[final_database['Subregion'] == reg]
-
-        # Initialize values
-        database['TechnologicalCorrelation'] = 5
-        database['TemporalCorrelation'] = 5
-        database['DataCollection'] = 5
-        for index, row in fuel_name.iterrows():
-            # Reading complete fuel name and heat content information
-            fuelname = row['FuelList']
-            fuelheat = float(row['Heatcontent'])
-            # croppping the database according to the current fuel being considered
-            database_f1 = database[database['FuelCategory'] == fuelname]
+    dup_cols = [
+        'Subregion', 'FuelCategory', 'PrimaryFuel', 'eGRID_ID', 'Electricity',
+        'FlowName', 'Compartment', 'Year', 'Unit'
+    ]
 
-            if database_f1.empty == True:
-                database_f1 = database[database['PrimaryFuel'] == fuelname]
-            if database_f1.empty != True:
+    # All regions, fuels, flows and compartments are done together. Each row
+    # gets the position of its region and fuel in the lists of regions and
+    # fuels, the rows are put in the order they were processed region by
+    # region and fuel by fuel, and the results of each group (region, fuel,
+    # flow and compartment) are computed with groupbys.
+    print(f"Creating generation process database for {len(regions)} regions ...")
+    if subregion == 'eGRID':
+        region_col = 'Subregion'
+    elif subregion == 'NERC':
+        region_col = 'NERC'
+    elif subregion == 'BA':
+        region_col = 'Balancing Authority Name'
+    elif subregion == 'US':
+        # For entire US use full database
+        region_col = None
+    else:
+        # This should be a egrid subregion
+        region_col = 'Subregion'
+    if region_col is None:
+        region_codes = pd.Series(0, index=final_database.index)
+    else:
+        region_list = list(dict.fromkeys(r for r in regions if not pd.isna(r)))
+        region_codes = pd.Series(
+            pd.Categorical(
+                final_database[region_col], categories=region_list
+            ).codes,
+            index=final_database.index,
+        )
 
-                database_f1 = database_f1.sort_values(by='Source', ascending=False)
-                exchange_list = list(pd.unique(database_f1['FlowName']))
-                if use_primaryfuel_for_coal:
-                    database_f1['FuelCategory'].loc[database_f1['FuelCategory'] == 'COAL'] = database_f1['PrimaryFuel']
-                for exchange in exchange_list:
-                    database_f2 = database_f1[database_f1['FlowName'] == exchange]
-                    database_f2 = database_f2[database_f2_cols]
+    # Rows of each fuel: those of its fuel category or, in regions without
+    # any, those with it as primary fuel.
+    fuel_frames = []
+    for fuel_order, (_, row) in enumerate(model_config.fuel_name.iterrows()):
+        fuelname = row['FuelList']
+        by_category = (final_database['FuelCategory'] == fuelname) & (region_codes >= 0)
+        by_primary = (
+            (final_database['PrimaryFuel'] == fuelname)
+            & (region_codes >= 0)
+            & ~region_codes.isin(region_codes[by_category].unique())
+        )
+        database_f1 = final_database.loc[by_category | by_primary, database_f2_cols]
+        if database_f1.empty:
+            continue
+        database_f1['region'] = region_codes[by_category | by_primary]
+        database_f1['fuel_order'] = fuel_order
+        database_f1['fuelname'] = fuelname
+        database_f1['fuelheat'] = float(row['Heatcontent'])
+        if model_config.use_primaryfuel_for_coal:
+            coal = database_f1['FuelCategory'] == 'COAL'
+            database_f1.loc[coal, 'FuelCategory'] = database_f1.loc[coal, 'PrimaryFuel']
+        fuel_frames.append(database_f1)
+    database_f1 = pd.concat(fuel_frames).sort_values(
+        by=['region', 'fuel_order', 'Source'],
+        ascending=[True, True, False],
+        kind='mergesort',
+    )
 
-                    compartment_list = list(pd.unique(database_f2['Compartment']))
-                    for compartment in compartment_list:
-                        database_f3 = database_f2[database_f2['Compartment'] == compartment]
-
-                        database_f3 = database_f3.drop_duplicates(
-                            subset=['Subregion', 'FuelCategory', 'PrimaryFuel', 'eGRID_ID', 'Electricity', 'FlowName',
-                                    'Compartment', 'Year', 'Unit'])
-                        sources = list(pd.unique(database_f3['Source']))
-                        # if len(sources) >1:
-                        #    print('Error occured. Duplicate emissions from Different source. Writing an error file error.csv')
-                        #    database_f3.to_csv(output_dir+'error'+reg+fuelname+exchange+'.csv')
-
-                        # Get electricity relevant for this exchange for the denominator in the emissions factors calcs
-                        electricity_source_by_facility_for_region_fuel = database_f1[
-                            ['eGRID_ID', 'Electricity', 'Source']].drop_duplicates()
-                        total_gen, mean, total_facility_considered = total_generation_calculator(sources,
-                                                                                                 electricity_source_by_facility_for_region_fuel)
-
-                        # Add data quality scores
-
-                        database_f3 = add_flow_representativeness_data_quality_scores(database_f3, total_gen)
-                        # Can now drop this
-                        # database_f3 = database_f3.drop(columns='Ref_Electricity_Subregion_FuelCategory')
-
-                        # Add scores for regions to
-                        sources_str = join_with_underscore(sources)
-                        exchange_total_gen = pd.DataFrame(
-                            [[reg, fuelname, exchange, compartment, sources_str, total_gen]],
-                            columns=['Subregion', 'FuelCategory', 'FlowName', 'Compartment', 'Source',
-                                     'Total Generation'])
-                        total_gen_database = total_gen_database.append(exchange_total_gen, ignore_index=True)
-
-                        if exchange == 'Heat' and str(fuelheat) != 'nan':
-                            # Getting Emisssion_factor
-                            database_f3['Emission_factor'] = compilation(database_f3[['Electricity', 'FlowAmount']],
-                                                                         total_gen) / fuelheat
-                            database_f3['Unit'] = 'kg'
-
-                        else:
-                            database_f3['Emission_factor'] = compilation(database_f3[['Electricity', 'FlowAmount']],
-                                                                         total_gen)
-
-                        # Data Quality Scores
-                        database_f3['GeographicalCorrelation'] = 1
-                        #If flow amount sum = 0, then do not average
-                        if sum(database_f3['FlowAmount'])!=0:
-
-                            database_f3['Reliability_Score'] = np.average(database_f3['ReliabilityScore'],
-                                                                          weights=database_f3['FlowAmount'])
-                            database_f3['TemporalCorrelation'] = np.average(database_f3['TemporalCorrelation'],
-                                                                            weights=database_f3['FlowAmount'])
-
-                            database_f3['TechnologicalCorrelation'] = np.average(database_f3['TechnologicalCorrelation'],
-                                                                                 weights=database_f3['FlowAmount'])
-                            database_f3['DataCollection'] = np.average(database_f3['DataCollection'],
-                                                                       weights=database_f3['FlowAmount'])
-
-                        # Uncertainty Calcs
-                        uncertainty_info = uncertainty_creation(database_f3[['Electricity', 'FlowAmount']], exchange,
-                                                                fuelheat, mean, total_gen, total_facility_considered)
-
-                        database_f3['GeomMean'] = uncertainty_info['geomMean']
-                        database_f3['GeomSD'] = uncertainty_info['geomSd']
-                        database_f3['Maximum'] = uncertainty_info['maximum']
-                        database_f3['Minimum'] = uncertainty_info['minimum']
-
-                        database_f3['Source'] = sources_str
-
-                        # Optionally write out electricity
-                        # database_f3['Electricity'] = total_gen
-
-                        # frames = [result_database, database_f3]
-                        # result_database = pd.concat(frames)
-                        df_list.append(database_f3)
-
-    result_database = pd.concat(df_list)
+    # Groups in the order of their flow in the region and fuel, then of their
+    # compartment in the flow
+    database_f3 = database_f1.dropna(subset=['FlowName', 'Compartment'])
+    database_f3['flow_order'] = database_f3.groupby(
+        ['region', 'fuel_order', 'FlowName'], sort=False
+    ).ngroup()
+    database_f3 = database_f3.sort_values(by='flow_order', kind='mergesort')
+    database_f3['group'] = database_f3.groupby(
+        ['flow_order', 'Compartment'], sort=False
+    ).ngroup()
+    database_f3 = database_f3.sort_values(by='group', kind='mergesort')
+    database_f3 = database_f3.drop_duplicates(subset=['group'] + dup_cols)
+    group_codes = database_f3['group'].values
+
+    groups = database_f3.drop_duplicates(subset='group').set_index('group')[
+        ['region', 'fuel_order', 'FlowName', 'fuelheat']
+    ]
+    group_sources = database_f3.drop_duplicates(subset=['group', 'Source'])
+    source_lists = group_sources.groupby('group')['Source'].agg(list)
+    groups['Source'] = source_lists.apply(join_with_underscore)
+    # Groups of a region and fuel with the same sources have the same
+    # electricity totals
+    groups['source_set'] = groups.groupby(
+        ['region', 'fuel_order',
+         source_lists.apply(lambda s: '\x1f'.join(sorted(map(str, s))))],
+        sort=False,
+    ).ngroup()
+
+    # Get electricity relevant for each group for the denominator in the
+    # emissions factors calcs: the first row of each facility of the region
+    # and fuel that reports to one of the sources of the group.
+    set_sources = group_sources[['group', 'region', 'fuel_order', 'Source']].merge(
+        groups[['source_set']], left_on='group', right_index=True
+    ).drop_duplicates(subset=['source_set', 'Source'])
+    electricity_source_by_facility = database_f1[
+        ['region', 'fuel_order', 'eGRID_ID', 'Electricity', 'Source']
+    ].drop_duplicates()
+    set_facilities = electricity_source_by_facility.merge(
+        set_sources[['region', 'fuel_order', 'Source', 'source_set']],
+        on=['region', 'fuel_order', 'Source'],
+        how='inner',
+    ).drop_duplicates(subset=['source_set', 'eGRID_ID'])
+    set_totals = set_facilities.groupby('source_set')['Electricity'].agg(
+        ['sum', 'mean', 'size']
+    )
+    totals = set_totals.reindex(groups['source_set']).values
+    groups['total_gen'] = totals[:, 0]
+    groups['mean'] = totals[:, 1]
+    groups['total_facility_considered'] = totals[:, 2].astype(int)
+    total_gen = groups['total_gen'].values[group_codes]
+
+    # Add data quality scores
+    database_f3 = add_technological_correlation_score(database_f3)
+    database_f3 = add_temporal_correlation_score(database_f3)
+    database_f3 = add_data_collection_score(database_f3, total_gen)
+
+    # Emission factors
+    flow_amount = database_f3['FlowAmount']
+    group_flows = database_f3[['Electricity', 'FlowAmount']].assign(
+        group_id=group_codes
+    )
+    emission_factor = compilation_by_group(
+        group_flows, groups['total_gen']
+    ).values
+    heat = (groups['FlowName'] == 'Heat') & groups['fuelheat'].notna()
+    emission_factor = np.where(
+        heat, emission_factor / groups['fuelheat'], emission_factor
+    )
+    database_f3['Emission_factor'] = emission_factor[group_codes]
+    database_f3.loc[heat.values[group_codes], 'Unit'] = 'kg'
+
+    # Data Quality Scores
+    database_f3['GeographicalCorrelation'] = 1
+    # If flow amount sum = 0, then do not average. Missing flow amounts make
+    # the averages missing.
+    dqi_cols = ['TemporalCorrelation', 'TechnologicalCorrelation', 'DataCollection']
+    weighted = database_f3[dqi_cols].multiply(flow_amount, axis=0)
+    weighted['weight'] = flow_amount
+    weighted['missing'] = flow_amount.isna()
+    sums = weighted.groupby(group_codes).agg(
+        dict({c: 'sum' for c in dqi_cols + ['weight']}, missing='any')
+    )
+    average = sums['missing'] | (sums['weight'] != 0)
+    averaged = average.values[group_codes]
+    for col in dqi_cols:
+        means = (sums[col] / sums['weight']).where(~sums['missing'])
+        database_f3.loc[averaged, col] = means.values[group_codes][averaged]
+
+    # Uncertainty Calcs
+    uncertainty_info = uncertainty_creation_by_group(group_flows, groups)
+    for col, key in [
+        ('GeomMean', 'geomMean'),
+        ('GeomSD', 'geomSd'),
+        ('Maximum', 'maximum'),
+        ('Minimum', 'minimum'),
+    ]:
+        database_f3[col] = uncertainty_info[key].values[group_codes]
+    database_f3['Source'] = groups['Source'].values[group_codes]
+    result_database = database_f3
 
     # drop_cols = [
     #     'eGRID_ID', 'FlowAmount', 'Electricity', 'ReliabilityScore',
@@ -433,106 +477,63 @@ def create_generation_process_df(generation_data, emissions_data, subregion=None
     # return b
 
 
+def uncertainty_creation_by_group(db, groups):
+    """
+    The lognormal uncertainty information of many groups at once, see
+    process_exchange_aggregator_uncertainty.uncertainty_by_group. Heat
+    inputs are divided by the heat content of their fuel (fuelheat).
 
-def total_generation_calculator(source_list,electricity_source_db):
-    electricity_source_by_region = electricity_source_db[electricity_source_db['Source'].isin(source_list)]
-    #drop duplicate facilities
-    electricity_source_by_region = electricity_source_by_region.drop_duplicates(subset='eGRID_ID')
-    total_gen = electricity_source_by_region['Electricity'].sum()
-    mean = electricity_source_by_region['Electricity'].mean()
-    total_facility_considered = len(electricity_source_by_region)
-
-
-    return total_gen,mean,total_facility_considered
-
-
-def uncertainty_creation(data,name,fuelheat,mean,total_gen,total_facility_considered):
-
-    ar = {'':''}
-
-    if name == 'Heat':
-
-            temp_data = data
-            #uncertianty calculations only if database length is more than 3
-            l,b = temp_data.shape
-            minimum,maximum = max_min(temp_data,mean,total_gen,total_facility_considered)
-            if l > 3:
-               u,s = uncertainty(temp_data,mean,total_gen,total_facility_considered)
-
-
-               if str(fuelheat)!='nan':
-
-                  ar['geomMean'] = str(round(math.exp(u),12)/fuelheat);
-                  ar['geomSd']=str(round(math.exp(s),12)/fuelheat);
-               else:
-                  ar['geomMean'] = str(round(math.exp(u),12));
-                  ar['geomSd']=str(round(math.exp(s),12));
-
-            else:
-
-                  ar['geomMean'] = None
-                  ar['geomSd']= None
-
-            if math.isnan(fuelheat) != True:
-
-                  ar['minimum']=minimum/fuelheat;
-                  ar['maximum']=maximum/fuelheat;
+    Parameters
+    ----------
+    db : dataframe
+        group_id, Electricity and FlowAmount of the facilities of each group.
+    groups : dataframe
+        Indexed by group id: FlowName, fuelheat, mean, total_gen and
+        total_facility_considered of each group.
 
+    Returns
+    -------
+    dataframe
+        geomMean, geomSd, minimum and maximum of each group, indexed like
+        groups.
+    """
+    fits = uncertainty_by_group(
+        db, groups.rename(columns={'mean': 'mean_gen'})
+    )
+    heat = (groups['FlowName'] == 'Heat').values
+    fuelheat = groups['fuelheat'].values.astype(float)
+    geom_mean = []
+    geom_sd = []
+    for is_heat, heat_content, n, fitted, u, s in zip(
+        heat, fuelheat, fits['count'], fits['fitted'], fits['log_mean'],
+        fits['log_sd']
+    ):
+        #uncertianty calculations only if database length is more than 3
+        if n <= 3:
+            geom_mean.append(None)
+            geom_sd.append(None)
+        elif not fitted:
+            geom_mean.append(None)
+            geom_sd.append(None if is_heat else float('nan'))
+        elif is_heat and str(heat_content) != 'nan':
+            geom_mean.append(str(round(math.exp(u),12)/heat_content))
+            geom_sd.append(str(round(math.exp(s),12)/heat_content))
+        else:
+            geom_mean.append(str(round(math.exp(u),12)))
+            if is_heat or s:
+                geom_sd.append(str(round(math.exp(s),12)))
             else:
-                  ar['minimum']=minimum
-                  ar['maximum']=maximum
-
-    else:
-                    minimum,maximum = max_min(data,mean,total_gen,total_facility_considered)
-                    #uncertianty calculations
-                    l,b = data.shape
-                    if l > 3:
-
-                       u,s = (uncertainty(data,mean,total_gen,total_facility_considered))
-
-                       if u != None:
-                           ar['geomMean'] = str(round(math.exp(u),12))
-                           ar['geomSd']=str(round(math.exp(s),12))
-                       else:
-                           ar['geomMean'] = None
-                           ar['geomSd'] = None
-
-                       u,s = (uncertainty(data,mean,total_gen,total_facility_considered))
-
-                       if u:
-                           ar['geomMean'] = str(round(math.exp(u),12))
-                       else:
-                           ar['geoMean'] = float('nan')
-                       if s:
-                           ar['geomSd'] = str(round(math.exp(s),12))
-                       else:
-                           ar['geomSd']= float('nan');
-                    else:
-                       ar['geomMean'] = None
-                       ar['geomSd']= None
-
-
-                    ar['minimum']=minimum
-                    ar['maximum']=maximum
-
-
-    ar['distributionType']='Logarithmic Normal Distribution'
-    ar['mean']=''
-    ar['meanFormula']=''
-
-    ar['geomMeanFormula']=''
-
-    ar['minimumFormula']=''
-    ar['sd']=''
-    ar['sdFormula']=''
-    ar['geomSdFormula']=''
-    ar['mode']=''
-    ar['modeFormula']=''
-
-    ar['maximumFormula']='';
-    del ar['']
-
-    return ar;
+                geom_sd.append(float('nan'))
+    scale = np.where(heat & ~np.isnan(fuelheat), fuelheat, 1)
+    return pd.DataFrame(
+        {
+            'geomMean': np.array(geom_mean, dtype=object),
+            'geomSd': np.array(geom_sd, dtype=object),
+            'minimum': fits['minimum'].values/scale,
+            'maximum': fits['maximum'].values/scale,
+        },
+        index=groups.index,
+    )
 
 def add_flow_representativeness_data_quality_scores(db,total_gen):
     db = add_technological_correlation_score(db)
@@ -546,7 +547,7 @@ def add_technological_correlation_score(db):
     from electricitylci.dqi import technological_correlation_lower_bound_to_dqi
     #convert PercentGen to fraction
     db['PercentGenerationfromDesignatedFuelCategory'] = db['PercentGenerationfromDesignatedFuelCategory']/100
-    db['TechnologicalCorrelation'] = db['PercentGenerationfromDesignatedFuelCategory'].apply(lambda x: lookup_score_with_bound_key(x,technological_correlation_lower_bound_to_dqi))
+    db['TechnologicalCorrelation'] = score_array(db['PercentGenerationfromDesignatedFuelCategory'],technological_correlation_lower_bound_to_dqi)
     # db = db.drop(columns='PercentGenerationfromDesignatedFuelCategory')
     return db
 
@@ -557,8 +558,8 @@ def add_temporal_correlation_score(db):
 
     #Could be more precise here with year
     db['Age'] =  electricity_lci_target_year - pd.to_numeric(db['Year'])
-    db['TemporalCorrelation'] = db['Age'].apply(
-        lambda x: lookup_score_with_bound_key(x, temporal_correlation_lower_bound_to_dqi))
+    db['TemporalCorrelation'] = score_array(
+        db['Age'], temporal_correlation_lower_bound_to_dqi)
     # db = db.drop(columns='Age')
     return db
 
@@ -567,8 +568,8 @@ def add_data_collection_score(db,total_gen):
     #Define data collection score based on percentage of the generation as generation for each factor over the total gen for that fuel category
     # db['DataCollection'] = 5
     db['Percent_of_Gen_in_EF_Denominator'] = (total_gen/db['Ref_Electricity_Subregion_FuelCategory'])/100
-    db['DataCollection'] = db['Percent_of_Gen_in_EF_Denominator'].apply(
-        lambda x: lookup_score_with_bound_key(x, data_collection_lower_bound_to_dqi))
+    db['DataCollection'] = score_array(
+        db['Percent_of_Gen_in_EF_Denominator'], data_collection_lower_bound_to_dqi)
     # db = db.drop(columns='Percent_of_Gen_in_EF_Denominator')
     return db
 
@@ -614,7 +615,7 @@ def olcaschema_genprocess(database,subregion):
 
         database_reg = database[database['Subregion'] == reg]
 
-        for index,row in fuel_name.iterrows():
+        for index,row in model_config.fuel_name.iterrows():
            # Reading complete fuel name and heat content information
 
             fuelname = row['Fuelname']
@@ -6,54 +6,53 @@ The functions in this script calculate the fraction of each generating source
 import numpy as np
 import pandas as pd
 from electricitylci.process_dictionary_writer import *
-from electricitylci.egrid_facilities import egrid_facilities, egrid_subregions
-from electricitylci.model_config import (
-    use_primaryfuel_for_coal,
-    fuel_name,
-    replace_egrid,
-    eia_gen_year,
-    keep_mixed_plant_category,
-    min_plant_percent_generation_from_primary_fuel_category,
-    # region_column_name,
-    regional_aggregation
+from functools import lru_cache
+from electricitylci.egrid_facilities import get_egrid_facilities_data
+from electricitylci import model_config
+from electricitylci.generation import (
+    eia_facility_fuel_region,
+    get_egrid_facilities_w_fuel_region,
 )
-from electricitylci.generation import eia_facility_fuel_region
 import logging
 
-# Get a subset of the egrid_facilities dataset
-egrid_facilities_w_fuel_region = egrid_facilities[
-    [
-        "FacilityID",
-        "Subregion",
-        "PrimaryFuel",
-        "FuelCategory",
-        "NERC",
-        "PercentGenerationfromDesignatedFuelCategory",
-        "Balancing Authority Name",
-        "Balancing Authority Code",
+
+@lru_cache(maxsize=None)
+def get_ref_egrid_subregion_generation_by_fuelcategory_with_NERC(egrid_year):
+    """
+    Get reference regional generation data by fuel type from eGRID, with the
+    NERC region of each subregion added. Built once per egrid_year.
+    """
+    from electricitylci.egrid_energy import (
+        get_ref_egrid_subregion_generation_by_fuelcategory,
+    )
+
+    egrid_facilities = get_egrid_facilities_data(egrid_year)["egrid_facilities"]
+    egrid_subregions_NERC = egrid_facilities[["Subregion", "FuelCategory", "NERC"]]
+    egrid_subregions_NERC = egrid_subregions_NERC.drop_duplicates()
+    egrid_subregions_NERC = egrid_subregions_NERC[
+        egrid_subregions_NERC["NERC"].notnull()
     ]
-]
+    ref_egrid_subregion_generation_by_fuelcategory_with_NERC = pd.merge(
+        get_ref_egrid_subregion_generation_by_fuelcategory(egrid_year),
+        egrid_subregions_NERC,
+        on=["Subregion", "FuelCategory"],
+    )
 
-# Get reference regional generation data by fuel type, add in NERC
-from electricitylci.egrid_energy import (
-    ref_egrid_subregion_generation_by_fuelcategory,
-)
+    ref_egrid_subregion_generation_by_fuelcategory_with_NERC = ref_egrid_subregion_generation_by_fuelcategory_with_NERC.rename(
+        columns={"Ref_Electricity_Subregion_FuelCategory": "Electricity"}
+    )
+    return ref_egrid_subregion_generation_by_fuelcategory_with_NERC
 
-egrid_subregions_NERC = egrid_facilities[["Subregion", "FuelCategory", "NERC"]]
-egrid_subregions_NERC = egrid_subregions_NERC.drop_duplicates()
-len(egrid_subregions_NERC)
-egrid_subregions_NERC = egrid_subregions_NERC[
-    egrid_subregions_NERC["NERC"].notnull()
-]
-ref_egrid_subregion_generation_by_fuelcategory_with_NERC = pd.merge(
-    ref_egrid_subregion_generation_by_fuelcategory,
-    egrid_subregions_NERC,
-    on=["Subregion", "FuelCategory"],
-)
 
-ref_egrid_subregion_generation_by_fuelcategory_with_NERC = ref_egrid_subregion_generation_by_fuelcategory_with_NERC.rename(
-    columns={"Ref_Electricity_Subregion_FuelCategory": "Electricity"}
-)
+def __getattr__(name):
+    # Module data is built on first use for the active model's egrid_year
+    if name == "egrid_facilities_w_fuel_region":
+        return get_egrid_facilities_w_fuel_region(model_config.egrid_year)
+    if name == "ref_egrid_subregion_generation_by_fuelcategory_with_NERC":
+        return get_ref_egrid_subregion_generation_by_fuelcategory_with_NERC(
+            model_config.egrid_year
+        )
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def create_generation_mix_process_df_from_model_generation_data(
@@ -80,13 +79,13 @@ def create_generation_mix_process_df_from_model_generation_data(
     """
     from electricitylci.combinator import ba_codes
     if subregion is None:
-        subregion = regional_aggregation
+        subregion = model_config.regional_aggregation
 
     # Converting to numeric for better stability and merging
     generation_data["FacilityID"] = generation_data["FacilityID"].astype(int)
 
-    if replace_egrid:
-        year = eia_gen_year
+    if model_config.replace_egrid:
+        year = model_config.eia_gen_year
         # This will only add BA labels, not eGRID subregions
         fuel_region = eia_facility_fuel_region(year)
         fuel_region["FacilityID"] = fuel_region["FacilityID"].astype(int)
@@ -102,7 +101,9 @@ def create_generation_mix_process_df_from_model_generation_data(
         # )
     else:
         database_for_genmix_final = pd.merge(
-            generation_data, egrid_facilities_w_fuel_region, on="FacilityID"
+            generation_data,
+            get_egrid_facilities_w_fuel_region(model_config.egrid_year),
+            on="FacilityID",
         )
     database_for_genmix_final["Balancing Authority Name"]=database_for_genmix_final["Balancing Authority Code"].map(ba_codes["BA_Name"])
     database_for_genmix_final["FERC_Region"]=database_for_genmix_final["Balancing Authority Code"].map(ba_codes["FERC_Region"])
@@ -128,22 +129,22 @@ def create_generation_mix_process_df_from_model_generation_data(
     elif subregion == "FERC":
         database_for_genmix_final["Subregion"] = database_for_genmix_final["FERC_Region"]
 
-    if use_primaryfuel_for_coal:
+    if model_config.use_primaryfuel_for_coal:
         database_for_genmix_final.loc[
             database_for_genmix_final["FuelCategory"] == "COAL", "FuelCategory"
         ] = database_for_genmix_final.loc[
             database_for_genmix_final["FuelCategory"] == "COAL", "PrimaryFuel"
         ]
-    if keep_mixed_plant_category:
+    if model_config.keep_mixed_plant_category:
         mixed_criteria = (
                 database_for_genmix_final["PercentGenerationfromDesignatedFuelCategory"]
-                < min_plant_percent_generation_from_primary_fuel_category/100)
+                < model_config.min_plant_percent_generation_from_primary_fuel_category/100)
         database_for_genmix_final.loc[mixed_criteria,"FuelCategory"]="MIXED"
     if subregion == "US":
         group_cols = ["FuelCategory"]
     else:
         group_cols = ["Subregion", "FuelCategory"]
-    if keep_mixed_plant_category:
+    if model_config.keep_mixed_plant_category:
         pass
     subregion_fuel_gen = database_for_genmix_final.groupby(
         group_cols, as_index=False
@@ -232,10 +233,15 @@ def create_generation_mix_process_df_from_egrid_ref_data(subregion=None):
         [description]
     """
     if subregion is None:
-        subregion = regional_aggregation
+        subregion = model_config.regional_aggregation
+    ref_egrid_subregion_generation_by_fuelcategory_with_NERC = get_ref_egrid_subregion_generation_by_fuelcategory_with_NERC(
+        model_config.egrid_year
+    )
     # Converting to numeric for better stability and merging
     if subregion == "eGRID":
-        regions = egrid_subregions
+        regions = get_egrid_facilities_data(model_config.egrid_year)[
+            "egrid_subregions"
+        ]
     elif subregion == "NERC":
         regions = list(
             pd.unique(
@@ -292,7 +298,7 @@ def create_generation_mix_process_df_from_egrid_ref_data(subregion=None):
 
 def olcaschema_genmix(database, gen_dict, subregion=None):
     if subregion is None:
-        subregion = regional_aggregation
+        subregion = model_config.regional_aggregation
     generation_mix_dict = {}
 
     if "Subregion" in database.columns:
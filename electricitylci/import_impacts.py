@@ -53,6 +53,7 @@ def generate_canadian_mixes(us_inventory):
             #                    'stage_code',
         ],
         as_index=False,
+        observed=True,
     )["Electricity", "FlowAmount", "quantity"].sum()
     flowuuid_compartment_df = us_inventory[
         ["FlowUUID", "Compartment"]
@@ -98,6 +99,7 @@ def generate_canadian_mixes(us_inventory):
             "FlowUUID",
         ],
         as_index=False,
+        observed=True,
     )[["Electricity", "FlowAmount", "quantity"]].sum()
     ca_mix_inventory["stage_code"] = "life cycle"
     ca_mix_inventory.sort_values(
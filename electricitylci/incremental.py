@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental model builds: rerun only the stages affected by a change.
+
+Every stage of a model build (see main.model_stages) gets a signature made
+from its function's code and the source of the whole package (see
+stage_cache.stage_key), its keyword arguments, the model_specs entries it
+declares (see stage_cache.cached_stage and stage_cache.reads_config), the
+source data files it reads and the signatures of the stages it depends on.
+An incremental build stores the result of each stage and a manifest of the
+signatures in output/incremental/<model name>. The next incremental build of
+the same model reruns the stages whose signature changed - which, because a
+signature includes those of its dependencies, also covers everything
+downstream of a changed stage - and loads the stored results of the other
+stages as far as they are needed. Changing efficiency_of_distribution_grid,
+for example, only rebuilds the distribution processes. Any change to the
+code of the package, on the other hand, reruns every stage.
+
+Stages that write to the JSON-LD file are always rerun, since every build
+writes a new file.
+"""
+import datetime
+import json
+import logging
+import os
+from os.path import join
+
+from electricitylci.globals import output_dir, set_dir
+from electricitylci.stage_cache import (
+    ALL_DATA_FILES,
+    has_result,
+    load_result,
+    save_result,
+    stage_key,
+    write_json,
+)
+
+module_logger = logging.getLogger("incremental.py")
+
+incremental_dir = join(output_dir, "incremental")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def model_dir(model_name):
+    """Folder with the stored results and manifest of a model."""
+    return join(incremental_dir, model_name)
+
+
+def stage_signatures(stages):
+    """
+    Compute the signature of each stage for the active model config.
+
+    Parameters
+    ----------
+    stages : list of Stage
+
+    Returns
+    -------
+    dict
+        Hex digest for each stage name.
+    """
+    from electricitylci.model_config import model_specs
+
+    by_name = {s.name: s for s in stages}
+    signatures = {}
+
+    def signature(name):
+        if name not in signatures:
+            stage = by_name[name]
+            if stage.config_keys is None:
+                config_keys = sorted(model_specs)
+            else:
+                config_keys = stage.config_keys
+            signatures[name] = stage_key(
+                stage.func,
+                [name] + [signature(d) for d in stage.deps],
+                stage.kwargs,
+                config_keys,
+                getattr(stage.func, "data_files", ALL_DATA_FILES),
+            )
+        return signatures[name]
+
+    for s in stages:
+        signature(s.name)
+    return signatures
+
+
+def read_manifest(model_name):
+    """Return the manifest of the last incremental build, or None."""
+    path = join(model_dir(model_name), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(model_name, manifest):
+    """Write the manifest, replacing the old one only once it's complete."""
+    folder = model_dir(model_name)
+    set_dir(folder)
+    write_json(join(folder, MANIFEST_NAME), manifest)
+
+
+def changed_config(old_specs, new_specs):
+    """List the model_specs entries that differ between two configs."""
+    # Compare the json representations, as stored in the manifest
+    old_specs = json.loads(json.dumps(old_specs, default=str))
+    new_specs = json.loads(json.dumps(new_specs, default=str))
+    return sorted(
+        k
+        for k in set(old_specs) | set(new_specs)
+        if old_specs.get(k) != new_specs.get(k)
+    )
+
+
+def plan_build(stages, signatures, manifest):
+    """
+    Decide which stages have to run.
+
+    Parameters
+    ----------
+    stages : list of Stage
+    signatures : dict
+        Returned by stage_signatures.
+    manifest : dict or None
+        Manifest of the last incremental build.
+
+    Returns
+    -------
+    tuple
+        (list of the stages to run, set of the names of the stages whose
+        stored results can be reused)
+    """
+    stored = manifest["stages"] if manifest else {}
+    folder = model_dir(manifest["model_name"]) if manifest else None
+    reusable = {
+        s.name
+        for s in stages
+        if not s.always_run
+        and stored.get(s.name, {}).get("signature") == signatures[s.name]
+        and has_result(folder, s.name)
+    }
+    return [s for s in stages if s.name not in reusable], reusable
+
+
+def run_incremental(stages, jobs=1, initializer=None, initargs=()):
+    """
+    Run a model build, reusing the stored results of the last incremental
+    build of the same model for the stages that haven't changed, and store
+    the results of this build for the next one.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        The stages of the build, see main.model_stages.
+    jobs : int, optional
+        Number of worker processes, see pipeline.run_stages.
+    initializer : function, optional
+        See pipeline.run_stages.
+    initargs : tuple, optional
+        See pipeline.run_stages.
+
+    Returns
+    -------
+    tuple
+        (dictionary of the results of the stages that ran or were loaded,
+        dictionary of run times in seconds of the stages that ran)
+    """
+    from electricitylci.model_config import model_name, model_specs
+    from electricitylci.pipeline import run_stages
+
+    manifest = read_manifest(model_name)
+    signatures = stage_signatures(stages)
+    to_run, reusable = plan_build(stages, signatures, manifest)
+    if manifest is None:
+        print(f"No earlier incremental build of {model_name}, building all stages")
+    else:
+        changed = changed_config(manifest["model_specs"], model_specs)
+        if changed:
+            print(f"Config changes since the last build: {', '.join(changed)}")
+        print(
+            f"Reusing {len(reusable)} stages, running {len(to_run)}: "
+            f"{', '.join(s.name for s in to_run)}"
+        )
+    folder = model_dir(model_name)
+    # Only the stored results that the rerun stages take as input are read
+    needed = {d for s in to_run for d in s.deps if d in reusable}
+    loaded = {}
+    for name in needed:
+        module_logger.info(f"Loading the stored result of {name}")
+        loaded[name] = load_result(folder, name)
+
+    # Keep the entries of the reused stages; the others are added as their
+    # stages finish, so a failed build still leaves its finished stages for
+    # the next one.
+    stored = manifest["stages"] if manifest else {}
+    new_manifest = {
+        "model_name": model_name,
+        "model_specs": model_specs,
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "finished": None,
+        "stages": {name: stored[name] for name in reusable},
+    }
+    write_manifest(model_name, new_manifest)
+    always_run = {s.name for s in stages if s.always_run}
+
+    def store(name, result):
+        if name in always_run:
+            return
+        save_result(result, folder, name)
+        new_manifest["stages"][name] = {"signature": signatures[name]}
+        write_manifest(model_name, new_manifest)
+
+    results, timings = run_stages(
+        to_run,
+        jobs=jobs,
+        initializer=initializer,
+        initargs=initargs,
+        results=loaded,
+        on_result=store,
+    )
+    # Stages may have downloaded source data, which changes the data file
+    # fingerprints. Record the signatures as of the end of the build so that
+    # the next build doesn't rerun everything because of the downloads.
+    final_signatures = stage_signatures(stages)
+    for name, entry in new_manifest["stages"].items():
+        entry["signature"] = final_signatures[name]
+    new_manifest["finished"] = datetime.datetime.now().isoformat(
+        timespec="seconds"
+    )
+    write_manifest(model_name, new_manifest)
+    return results, timings
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timing and memory instrumentation for the stages of a model build.
+
+Functions decorated with instrumented (or code wrapped in the instrument
+context manager) record their wall time, CPU time, peak resident memory and
+the number of rows going in and out. Recording is turned on with the
+"record_stage_metrics" parameter in the model config file, or by calling
+enable_instrumentation. write_report saves the records as a JSON and a CSV
+run report in the output folder.
+
+Peak memory is the high-water mark of the process's resident set size, so it
+can only grow during a run. The increase of the high-water mark during a stage
+(peak_rss_growth_mb) shows which stages are responsible for it.
+"""
+import csv
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os.path import join
+
+import pandas as pd
+
+from electricitylci.globals import output_dir, set_dir
+
+module_logger = logging.getLogger("instrumentation.py")
+
+run_report_dir = join(output_dir, "run_reports")
+
+REPORT_FIELDS = [
+    "stage",
+    "parent",
+    "pid",
+    "start",
+    "wall_s",
+    "cpu_s",
+    "peak_rss_mb",
+    "peak_rss_growth_mb",
+    "rows_in",
+    "rows_out",
+]
+
+_records = []
+_stack = []
+_enabled = None
+
+
+def enable_instrumentation(enabled=True):
+    """Turn recording on or off, overriding the model config."""
+    global _enabled
+    _enabled = enabled
+
+
+def instrumentation_enabled():
+    if _enabled is not None:
+        return _enabled
+    from electricitylci.model_config import model_specs
+
+    return bool(model_specs.get("record_stage_metrics", False))
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None if it can't be
+    determined on this platform.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+def count_rows(obj):
+    """
+    Count the rows in a stage input or output: the length of dataframes and
+    process dictionaries, summed over tuples and lists of them. Anything else
+    counts as 0.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series, dict)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        return sum(count_rows(o) for o in obj)
+    return 0
+
+
+@contextmanager
+def instrument(name, rows_in=0):
+    """
+    Record the run time and memory use of a block of code.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage in the report.
+    rows_in : int, optional
+        Number of input rows, by default 0.
+
+    Yields
+    ------
+    dict
+        The record. Set record["rows_out"] to report the output size.
+    """
+    if not instrumentation_enabled():
+        yield {}
+        return
+    record = {
+        "stage": name,
+        "parent": _stack[-1]["stage"] if _stack else None,
+        "pid": os.getpid(),
+        "start": datetime.datetime.now().isoformat(timespec="seconds"),
+        "rows_in": rows_in,
+        "rows_out": 0,
+    }
+    rss_before = peak_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    _stack.append(record)
+    try:
+        yield record
+    finally:
+        _stack.pop()
+        record["wall_s"] = time.perf_counter() - wall_start
+        record["cpu_s"] = time.process_time() - cpu_start
+        record["peak_rss_mb"] = peak_rss_mb()
+        if rss_before is not None:
+            record["peak_rss_growth_mb"] = record["peak_rss_mb"] - rss_before
+        else:
+            record["peak_rss_growth_mb"] = None
+        _records.append(record)
+        module_logger.info(
+            f"{name}: {record['wall_s']:.1f} s wall, {record['cpu_s']:.1f} s cpu, "
+            f"rows {record['rows_in']} -> {record['rows_out']}"
+        )
+
+
+def instrumented(func):
+    """
+    Decorator that records each call of func with instrument. The rows of
+    dataframe and dictionary arguments are counted as input rows and those
+    of the result as output rows.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not instrumentation_enabled():
+            return func(*args, **kwargs)
+        rows_in = count_rows(list(args) + list(kwargs.values()))
+        with instrument(f"{func.__module__}.{func.__name__}", rows_in) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = count_rows(result)
+        return result
+
+    return wrapper
+
+
+def pop_records():
+    """Return the records made so far in this process and forget them."""
+    records = list(_records)
+    _records.clear()
+    return records
+
+
+def add_records(records):
+    """Add records made in another process (e.g. a pipeline worker)."""
+    _records.extend(records)
+
+
+def write_report(name=None):
+    """
+    Write the records made so far to a JSON and a CSV file in
+    output/run_reports.
+
+    Parameters
+    ----------
+    name : str, optional
+        Base name of the report files, by default the model name and the
+        current time.
+
+    Returns
+    -------
+    str
+        Path of the JSON report, or None if nothing was recorded.
+    """
+    if not _records:
+        return None
+    if name is None:
+        from electricitylci.model_config import model_name
+
+        name = (
+            f"{model_name}_run_"
+            f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+    set_dir(run_report_dir)
+    json_path = join(run_report_dir, f"{name}.json")
+    with open(json_path, "w") as f:
+        json.dump({"stages": _records}, f, indent=2)
+    with open(join(run_report_dir, f"{name}.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(_records)
+    module_logger.info(f"Run report written to {json_path}")
+    return json_path
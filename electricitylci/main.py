@@ -1,101 +1,288 @@
+import argparse
 import electricitylci
 import logging
 
 from electricitylci.globals import output_dir
-from electricitylci.model_config import model_name, model_specs
+from electricitylci.instrumentation import instrumentation_enabled, write_report
+from electricitylci.model_config import get_model_config, set_model_config
+from electricitylci.pipeline import Stage, run_stages
 from electricitylci.utils import fill_default_provider_uuids
 
-def main():
 
-    logger = logging.getLogger("main")
-    # Create dataframe with all generation process data. If the alternate NETL method
-    # is being used this will also include upstream and Canadian data.
-    print("get generation process")
+def _second(items):
+    return items[1]
+
+
+def _fill_providers_and_write(dict_to_fill, *provider_dicts):
+    dict_to_fill = fill_default_provider_uuids(dict_to_fill, *provider_dicts)
+    return electricitylci.write_process_dicts_to_jsonld(dict_to_fill)
+
+
+def model_stages(model_specs):
+    """
+    Declare the stages of a model build as a dependency graph. Each stage
+    gets the results of the stages listed in its dependencies as positional
+    arguments.
+
+    Parameters
+    ----------
+    model_specs : dict
+        The model configuration.
+
+    Returns
+    -------
+    list
+        Stage objects, listed so that dependencies come first.
+    """
+    write_jsonld = electricitylci.write_process_dicts_to_jsonld
+    if model_specs["regional_aggregation"] == "FERC":
+        gen_mix_regions = "BA"
+    else:
+        gen_mix_regions = None
 
-    print("write generation process to dict")
     if model_specs['use_alt_gen_process'] is True:
         # UUID's for upstream processes are created when converting to JSON-LD. This
         # has to be done here if the information is going to be included in final
         # outputs.
         if model_specs['include_upstream_processes'] is True:
-            upstream_df = electricitylci.get_upstream_process_df()
-            upstream_dict = electricitylci.write_upstream_process_database_to_dict(
-                upstream_df
-            )
-            upstream_dict = electricitylci.write_upstream_dicts_to_jsonld(upstream_dict)
+            stages = [
+                Stage("upstream_df", electricitylci.get_upstream_process_df),
+                Stage(
+                    "upstream_dict",
+                    electricitylci.write_upstream_process_database_to_dict,
+                    ["upstream_df"],
+                ),
+                Stage(
+                    "upstream_jsonld",
+                    electricitylci.write_upstream_dicts_to_jsonld,
+                    ["upstream_dict"],
+                    in_parent=True,
+                    always_run=True,
+                ),
+                Stage("gen_df", electricitylci.get_alternate_gen_plus_netl),
+                Stage(
+                    "combined_df",
+                    electricitylci.combine_upstream_and_gen_df,
+                    ["gen_df", "upstream_df"],
+                ),
+                Stage(
+                    "canadian_gen",
+                    _second,
+                    ["combined_df"],
+                    in_parent=True,
+                    config_keys=[],
+                ),
+                Stage(
+                    "gen_plus_fuels",
+                    electricitylci.add_fuels_to_gen,
+                    ["gen_df", "upstream_df", "canadian_gen", "upstream_jsonld"],
+                ),
+                # FERC consumption mixes are built from BAs, so the generation
+                # processes are always aggregated to BA.
+                Stage(
+                    "generation_process_df",
+                    electricitylci.aggregate_gen,
+                    ["gen_plus_fuels"],
+                    kwargs={"subregion": "BA"},
+                ),
+                Stage(
+                    "generation_process_dict",
+                    electricitylci.write_gen_fuel_database_to_dict,
+                    ["generation_process_df", "upstream_jsonld"],
+                ),
+            ]
         else:
-            upstream_dict={}
-            upstream_df=None
-        generation_process_df = electricitylci.get_generation_process_df(
-            upstream_df=upstream_df
-        )
-        generation_process_dict = electricitylci.write_gen_fuel_database_to_dict(
-            generation_process_df, upstream_dict
-        )
+            stages = [
+                Stage("gen_df", electricitylci.get_alternate_gen_plus_netl),
+                Stage(
+                    "generation_process_df",
+                    electricitylci.aggregate_gen,
+                    ["gen_df"],
+                    kwargs={"subregion": "BA"},
+                ),
+                Stage(
+                    "generation_process_dict",
+                    electricitylci.write_gen_fuel_database_to_dict,
+                    ["generation_process_df"],
+                    kwargs={"upstream_dict": {}},
+                ),
+            ]
     else:
-        generation_process_df = electricitylci.get_generation_process_df()
-        generation_process_dict = (
-            electricitylci.write_generation_process_database_to_dict(
-                generation_process_df
-            )
-        )
+        stages = [
+            Stage(
+                "generation_process_df",
+                electricitylci.get_generation_process_df,
+            ),
+            Stage(
+                "generation_process_dict",
+                electricitylci.write_generation_process_database_to_dict,
+                ["generation_process_df"],
+            ),
+        ]
+    stages += [
+        Stage(
+            "generation_process_jsonld",
+            write_jsonld,
+            ["generation_process_dict"],
+            in_parent=True,
+            always_run=True,
+        ),
+        Stage(
+            "generation_mix_df",
+            electricitylci.get_generation_mix_process_df,
+            kwargs={"regions": gen_mix_regions},
+        ),
+        Stage(
+            "generation_mix_dict",
+            electricitylci.write_generation_mix_database_to_dict,
+            ["generation_mix_df", "generation_process_jsonld"],
+        ),
+        Stage(
+            "generation_mix_jsonld",
+            write_jsonld,
+            ["generation_mix_dict"],
+            in_parent=True,
+            always_run=True,
+        ),
+    ]
 
-    print("write gen process to jsonld")
-    generation_process_dict = electricitylci.write_process_dicts_to_jsonld(
-        generation_process_dict
-    )
-    print("get gen mix process")
-    if model_specs["regional_aggregation"]=="FERC":
-        generation_mix_df = electricitylci.get_generation_mix_process_df("BA")
+    # At this point the two methods diverge from underlying functions enough that
+    # it's just easier to split here.
+    if model_specs['use_alt_gen_process'] is True:
+        stages += [
+            Stage("cons_mix_df", electricitylci.get_consumption_mix_df),
+            Stage(
+                "cons_mix_dict",
+                electricitylci.write_consumption_mix_to_dict,
+                ["cons_mix_df", "generation_mix_jsonld"],
+            ),
+            Stage(
+                "cons_mix_jsonld",
+                write_jsonld,
+                ["cons_mix_dict"],
+                in_parent=True,
+                always_run=True,
+            ),
+            Stage(
+                "dist_mix_df",
+                electricitylci.get_distribution_mix_df,
+                ["generation_process_df"],
+            ),
+            Stage(
+                "dist_mix_dict",
+                electricitylci.write_distribution_mix_to_dict,
+                ["dist_mix_df", "cons_mix_jsonld"],
+            ),
+            Stage(
+                "dist_mix_jsonld",
+                write_jsonld,
+                ["dist_mix_dict"],
+                in_parent=True,
+                always_run=True,
+            ),
+        ]
     else:
-        generation_mix_df = electricitylci.get_generation_mix_process_df()
-    print("write gen mix to dict")
-    generation_mix_dict = electricitylci.write_generation_mix_database_to_dict(
-        generation_mix_df, generation_process_dict)
-    print("write gen mix to jsonld")
-    generation_mix_dict = electricitylci.write_process_dicts_to_jsonld(
-        generation_mix_dict
+        stages += [
+            # Get surplus and consumption mix dictionary
+            Stage(
+                "sur_con_mix_dict",
+                electricitylci.write_surplus_pool_and_consumption_mix_dict,
+            ),
+            # Get dist dictionary
+            Stage("dist_dict", electricitylci.write_distribution_dict),
+            Stage(
+                "sur_con_mix_jsonld",
+                _fill_providers_and_write,
+                ["sur_con_mix_dict", "generation_mix_jsonld"],
+                in_parent=True,
+                always_run=True,
+            ),
+            Stage(
+                "sur_con_mix_jsonld_filled",
+                _fill_providers_and_write,
+                [
+                    "sur_con_mix_jsonld",
+                    "sur_con_mix_jsonld",
+                    "generation_mix_jsonld",
+                ],
+                in_parent=True,
+                always_run=True,
+            ),
+            Stage(
+                "dist_jsonld",
+                _fill_providers_and_write,
+                ["dist_dict", "sur_con_mix_jsonld_filled"],
+                in_parent=True,
+                always_run=True,
+            ),
+        ]
+    return stages
+
+
+def main(
+    config=None,
+    jobs=1,
+    incremental=False,
+    resume=None,
+    checkpoint=True,
+    keep_checkpoint=False,
+):
+    """
+    Build a model and write it to JSON-LD.
+
+    Parameters
+    ----------
+    config : ModelConfig or str, optional
+        The model configuration, or the name of a model in the modelconfig
+        folder. By default the model is selected as described in
+        model_config.select_model_name.
+    jobs : int, optional
+        Number of worker processes used to run independent stages
+        concurrently, by default 1.
+    incremental : bool, optional
+        Reuse the stored results of the last incremental build of the model
+        for the stages whose code, config parameters and inputs haven't
+        changed, and store the results of this build for the next one, by
+        default False. See incremental.py.
+    resume : str, optional
+        Id of a checkpointed run to resume, by default None. The run is
+        resumed with the config it was started with, so config is ignored.
+        See checkpoint.py.
+    checkpoint : bool, optional
+        Store the result of each stage in a run directory so the build can be
+        resumed if it fails, by default True. Incremental builds keep their
+        own stored results and aren't checkpointed.
+    keep_checkpoint : bool, optional
+        Keep the run directory once the build has finished, by default False.
+    """
+    logger = logging.getLogger("main")
+    if resume is not None:
+        from electricitylci.checkpoint import run_config
+
+        if incremental:
+            raise ValueError("A checkpointed run can't be resumed incrementally")
+        config = run_config(resume)
+    if config is not None:
+        set_model_config(config)
+    config = get_model_config()
+    stages = model_stages(config.model_specs)
+    build_args = dict(
+        jobs=jobs, initializer=set_model_config, initargs=(config,)
     )
+    if incremental:
+        from electricitylci.incremental import run_incremental
 
+        run_incremental(stages, **build_args)
+    elif checkpoint or resume is not None:
+        from electricitylci.checkpoint import run_checkpointed
 
-    # At this point the two methods diverge from underlying functions enough that
-    # it's just easier to split here.
-    if model_specs['use_alt_gen_process'] is True:
-        print("using alt gen method for consumption mix")
-        cons_mix_df = electricitylci.get_consumption_mix_df()
-        print("write consumption mix to dict")
-        cons_mix_dict = electricitylci.write_consumption_mix_to_dict(
-            cons_mix_df, generation_mix_dict
+        run_checkpointed(
+            stages, run_id=resume, keep=keep_checkpoint, **build_args
         )
-        print("write consumption mix to jsonld")
-        cons_mix_dict = electricitylci.write_process_dicts_to_jsonld(cons_mix_dict)
-        print("get distribution mix")
-        dist_mix_df = electricitylci.get_distribution_mix_df(generation_process_df)
-        print("write dist mix to dict")
-        dist_mix_dict = electricitylci.write_distribution_mix_to_dict(
-            dist_mix_df, cons_mix_dict
-        )
-        print("write dist mix to jsonld")
-        dist_mix_dict = electricitylci.write_process_dicts_to_jsonld(dist_mix_dict)
     else:
-        #Get surplus and consumption mix dictionary
-        sur_con_mix_dict = electricitylci.write_surplus_pool_and_consumption_mix_dict()
-        #Get dist dictionary
-        dist_dict = electricitylci.write_distribution_dict()
-        generation_mix_dict = electricitylci.write_process_dicts_to_jsonld(
-            generation_mix_dict
-        )
-        sur_con_mix_dict = fill_default_provider_uuids(
-            sur_con_mix_dict, generation_mix_dict
-        )
-        sur_con_mix_dict = electricitylci.write_process_dicts_to_jsonld(sur_con_mix_dict)
-        sur_con_mix_dict = fill_default_provider_uuids(
-            sur_con_mix_dict, sur_con_mix_dict, generation_mix_dict
-        )
-        sur_con_mix_dict = electricitylci.write_process_dicts_to_jsonld(sur_con_mix_dict)
-        dist_dict = fill_default_provider_uuids(dist_dict, sur_con_mix_dict)
-        dist_dict = electricitylci.write_process_dicts_to_jsonld(dist_dict)
-
+        run_stages(stages, **build_args)
+    if instrumentation_enabled():
+        write_report()
     logger.info(
         f'JSON-LD files have been saved in the "output" folder with the full path '
         f'{electricitylci.namestr}'
@@ -103,4 +290,52 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Build an electricity life cycle inventory model."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes for running independent stages "
+        "concurrently (default 1).",
+    )
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Name of the model config to build, e.g. ELCI_1. By default the "
+        "ELCI_MODEL environment variable or the model menu is used.",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Only rerun the stages affected by changes since the last "
+        "--rebuild of this model, reusing the stored results of the others.",
+    )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        metavar="RUN_ID",
+        help="Resume a failed build from its last finished stage. The run id "
+        "is printed when a build starts; runs are stored in output/runs.",
+    )
+    parser.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help="Don't store the stage results needed to resume the build.",
+    )
+    parser.add_argument(
+        "--keep-checkpoint",
+        action="store_true",
+        help="Keep the stored stage results in output/runs after the build "
+        "finishes; by default they are removed.",
+    )
+    args = parser.parse_args()
+    main(
+        config=args.model,
+        jobs=args.jobs,
+        incremental=args.rebuild,
+        resume=args.resume,
+        checkpoint=not args.no_checkpoint,
+        keep_checkpoint=args.keep_checkpoint,
+    )
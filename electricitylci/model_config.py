@@ -1,19 +1,108 @@
-import json
+import os
 import pandas as pd
 from os.path import join
 import yaml
 
 from electricitylci.globals import modulepath, data_dir, set_model_name_with_stdin, list_model_names_in_config
 
-#################
-model_name_exists = False
-try:
-    model_name
-    model_name_exists = True
-except NameError:
-    model_name_exists = False
+# Set model_name manually here, or with the ELCI_MODEL environment variable,
+# to skip the model selection menu.
+default_model_name = None
 
-if set_model_name_with_stdin and not model_name_exists:
+#pull in model config vars
+def load_model_specs(model_name):
+
+    path = join(modulepath, 'modelconfig', '{}_config.yml'.format(model_name))
+    with open(path, 'r') as f:
+        specs = yaml.safe_load(f)
+
+    return specs
+
+
+class ModelConfig:
+    """
+    The configuration of a single model, as read from a model config file.
+
+    Config parameters are available as attributes (e.g.
+    config.regional_aggregation). Data referenced by the config, such as the
+    fuel name file, is only read the first time it is used. Nothing is read
+    from stdin, so several models can be configured in one process.
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the model, e.g. "ELCI_1".
+    model_specs : dict, optional
+        The config parameters. By default these are read from
+        modelconfig/<model_name>_config.yml.
+    """
+
+    def __init__(self, model_name, model_specs=None):
+        self.model_name = model_name
+        if model_specs is None:
+            model_specs = load_model_specs(model_name)
+        self.model_specs = model_specs
+        self._fuel_name = None
+
+    @classmethod
+    def from_file(cls, path, model_name=None):
+        """Create a config from a yml file that isn't in the modelconfig folder."""
+        with open(path, 'r') as f:
+            specs = yaml.safe_load(f)
+        if model_name is None:
+            model_name = os.path.basename(path).replace('_config.yml', '')
+        return cls(model_name, specs)
+
+    def __getattr__(self, name):
+        # Only called for names that aren't regular attributes
+        specs = self.__dict__.get('model_specs', {})
+        if name in specs:
+            return specs[name]
+        raise AttributeError(
+            f"Model config {self.__dict__.get('model_name')} has no parameter {name}"
+        )
+
+    def __repr__(self):
+        return f"ModelConfig({self.model_name!r})"
+
+    def __getstate__(self):
+        # Don't send loaded data to worker processes, they can read it again.
+        state = self.__dict__.copy()
+        state['_fuel_name'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @property
+    def inventories(self):
+        return self.inventories_of_interest.keys()
+
+    @property
+    def fuel_name(self):
+        if self._fuel_name is None:
+            self._fuel_name = pd.read_csv(join(data_dir, self.fuel_name_file))
+        return self._fuel_name
+
+    @property
+    def gen_mix_from_model_generation_data(self):
+        return self.model_specs.get('gen_mix_from_model_generation_data', False)
+
+
+_model_config = None
+
+
+def select_model_name():
+    """
+    Get the name of the model to build: default_model_name if set, then the
+    ELCI_MODEL environment variable, then (if set_model_name_with_stdin is
+    True in globals.py) a menu of the models in the modelconfig folder.
+    """
+    model_name = default_model_name or os.environ.get('ELCI_MODEL')
+    if model_name:
+        return model_name
+    if not set_model_name_with_stdin:
+        return 'ELCI_3'
     model_menu = list_model_names_in_config()
     print("Select a model number to use:")
     for k in model_menu.keys():
@@ -22,56 +111,78 @@ if set_model_name_with_stdin and not model_name_exists:
     try:
         model_name = model_menu[int(model_num)]
         print("Model " + model_name + " selected.")
-    except:
-        print('You must select the menu number for an existing model')
-elif not set_model_name_with_stdin:
-    # Set model_name manually here
-    model_name = 'ELCI_3'
-#################
+    except (KeyError, ValueError):
+        raise ValueError('You must select the menu number for an existing model')
+    return model_name
 
-#pull in model config vars
-def load_model_specs(model_name):
 
-    path = join(modulepath, 'modelconfig', '{}_config.yml'.format(model_name))
-    with open(path, 'r') as f:
-        specs = yaml.safe_load(f)
+def set_model_config(config):
+    """
+    Make config the active model configuration, which is read by all of the
+    modules in electricitylci.
 
-    return specs
+    Parameters
+    ----------
+    config : ModelConfig or str
+        A model config, or the name of a model in the modelconfig folder.
+
+    Returns
+    -------
+    ModelConfig
+    """
+    global _model_config
+    if isinstance(config, str):
+        config = ModelConfig(config)
+    _model_config = config
+    return config
+
+
+def get_model_config():
+    """Return the active model configuration, selecting a model if necessary."""
+    if _model_config is None:
+        model_name = select_model_name()
+        try:
+            set_model_config(ModelConfig(model_name))
+        except FileNotFoundError:
+            print("Model specs not found. Create a model specs file for the model of interest.")
+            raise
+    return _model_config
+
+
+# Module-level names that resolve to the active model configuration. These
+# are looked up on every access, so code that reads e.g.
+# model_config.replace_egrid inside a function always sees the active model.
+config_names = [
+    'model_name',
+    'model_specs',
+    'electricity_lci_target_year',
+    'egrid_year',
+    # use 923 and cems rather than egrid, but still use the egrid_year
+    # parameter to determine the data year
+    'replace_egrid',
+    'regional_aggregation',
+    'eia_gen_year',
+    'inventories_of_interest',
+    'inventories',
+    'include_only_egrid_facilities_with_positive_generation',
+    'filter_on_efficiency',
+    'egrid_facility_efficiency_filters',
+    'filter_on_min_plant_percent_generation_from_primary_fuel',
+    'min_plant_percent_generation_from_primary_fuel_category',
+    'keep_mixed_plant_category',
+    'filter_non_egrid_emission_on_NAICS',
+    'efficiency_of_distribution_grid',
+    'net_trading',
+    'fedelemflowlist_version',
+    'use_primaryfuel_for_coal',
+    'fuel_name_file',
+    'fuel_name',
+    'post_process_generation_emission_factors',
+    'gen_mix_from_model_generation_data',
+]
 
 
-try:
-    model_specs = load_model_specs(model_name)
-    # with open(modulepath +'modelconfig/' + model_name + "_config.yml") as cfg:
-    #     model_specs = yaml.safe_load(cfg)
-except FileNotFoundError:
-    print("Model specs not found. Create a model specs file for the model of interest.")
-
-electricity_lci_target_year = model_specs["electricity_lci_target_year"]
-egrid_year = model_specs["egrid_year"]
-
-# use 923 and cems rather than egrid, but still use the egrid_year
-# parameter to determine the data year
-replace_egrid = model_specs["replace_egrid"]
-# try:
-#     region_column_name = model_specs["region_column_name"]
-# except:
-#     region_column_name = False
-regional_aggregation = model_specs["regional_aggregation"]
-eia_gen_year = model_specs["eia_gen_year"]
-inventories_of_interest = model_specs["inventories_of_interest"]
-inventories = inventories_of_interest.keys()
-include_only_egrid_facilities_with_positive_generation = model_specs["include_only_egrid_facilities_with_positive_generation"]
-filter_on_efficiency = model_specs['filter_on_efficiency']
-egrid_facility_efficiency_filters = model_specs["egrid_facility_efficiency_filters"]
-filter_on_min_plant_percent_generation_from_primary_fuel = model_specs['filter_on_min_plant_percent_generation_from_primary_fuel']
-min_plant_percent_generation_from_primary_fuel_category = model_specs["min_plant_percent_generation_from_primary_fuel_category"]
-keep_mixed_plant_category = model_specs['keep_mixed_plant_category']
-filter_non_egrid_emission_on_NAICS = model_specs["filter_non_egrid_emission_on_NAICS"]
-efficiency_of_distribution_grid = model_specs["efficiency_of_distribution_grid"]
-net_trading = model_specs["net_trading"]
-fedelemflowlist_version = model_specs["fedelemflowlist_version"]
-use_primaryfuel_for_coal = model_specs["use_primaryfuel_for_coal"]
-fuel_name_file = model_specs["fuel_name_file"]
-fuel_name = pd.read_csv(join(data_dir, fuel_name_file))
-post_process_generation_emission_factors = model_specs["post_process_generation_emission_factors"]
-gen_mix_from_model_generation_data=False
+def __getattr__(name):
+    if name in config_names:
+        return getattr(get_model_config(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
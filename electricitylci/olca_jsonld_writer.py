@@ -9,7 +9,10 @@ from typing import Optional
 import olca
 import olca.pack as pack
 
+from electricitylci.instrumentation import instrumented
 
+
+@instrumented
 def write(processes: dict, file_path: str):
     """ Write the given process dictionary to a olca-schema zip file with the
         given path.
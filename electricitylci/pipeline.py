@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Dependency-graph scheduler for the model build.
+
+The stages of a model build (see main.model_stages) are declared as a list of
+Stage objects. Each stage names the stages whose results it takes as
+positional arguments, so stages without a data dependency on each other - e.g.
+the EIA trading matrix and the upstream fuel inventories - can run
+concurrently in worker processes. Stages that write to the JSON-LD zip file
+run in the parent process, one at a time, since every write goes to the same
+archive.
+
+A build can also reuse the stored results of an earlier build for the stages
+whose inputs haven't changed, see incremental.py.
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+module_logger = logging.getLogger("pipeline.py")
+
+
+class Stage:
+    """
+    A single step in a model build.
+
+    Parameters
+    ----------
+    name : str
+        Unique name of the stage. Other stages refer to its result by name.
+    func : function
+        Module-level function (it has to be picklable to run in a worker
+        process) that computes the stage result.
+    deps : list of str, optional
+        Names of the stages whose results are passed to func as positional
+        arguments, in order.
+    kwargs : dict, optional
+        Additional keyword arguments for func.
+    in_parent : bool, optional
+        Run the stage in the parent process rather than a worker, by default
+        False. Use this for stages that write the JSON-LD file or that are too
+        cheap to be worth sending to another process.
+    config_keys : list of str, optional
+        The model_specs entries read by the stage. By default those declared
+        on func with stage_cache.cached_stage or stage_cache.reads_config; if
+        func declares none, the stage is assumed to read all of them.
+    always_run : bool, optional
+        Run the stage even when an incremental build could reuse its stored
+        result, by default False. Use this for stages that write to the
+        JSON-LD file, since each build writes a new file.
+    """
+
+    def __init__(
+        self,
+        name,
+        func,
+        deps=None,
+        kwargs=None,
+        in_parent=False,
+        config_keys=None,
+        always_run=False,
+    ):
+        self.name = name
+        self.func = func
+        self.deps = list(deps) if deps else []
+        self.kwargs = kwargs if kwargs else {}
+        self.in_parent = in_parent
+        if config_keys is None:
+            config_keys = getattr(func, "config_keys", None)
+        self.config_keys = list(config_keys) if config_keys is not None else None
+        self.always_run = always_run
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, deps={self.deps})"
+
+
+def _run_stage(func, args, kwargs):
+    """Call func and time it. Used both in the parent and in workers."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _run_stage_in_worker(func, args, kwargs):
+    """Run a stage in a worker and send its instrumentation records back."""
+    from electricitylci.instrumentation import pop_records
+
+    result, elapsed = _run_stage(func, args, kwargs)
+    return result, elapsed, pop_records()
+
+
+def _check_graph(stages, available=()):
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+    for s in stages:
+        missing = [d for d in s.deps if d not in names and d not in available]
+        if missing:
+            raise ValueError(f"Stage {s.name} depends on unknown stages {missing}")
+
+
+def critical_path(stages, timings):
+    """
+    Find the chain of dependent stages with the longest total run time. This
+    is the lower bound on the wall time of a build, however many workers are
+    used.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        Stages in an order where dependencies come first.
+    timings : dict
+        Run time in seconds for each stage name.
+
+    Returns
+    -------
+    tuple
+        (list of stage names along the path, total seconds)
+    """
+    finish = {}
+    previous = {}
+    for s in stages:
+        if s.name not in timings:
+            continue
+        prior = [d for d in s.deps if d in finish]
+        slowest = max(prior, key=lambda d: finish[d]) if prior else None
+        finish[s.name] = timings[s.name] + (finish[slowest] if slowest else 0)
+        previous[s.name] = slowest
+    if not finish:
+        return [], 0.0
+    last = max(finish, key=lambda n: finish[n])
+    total = finish[last]
+    path = []
+    while last is not None:
+        path.append(last)
+        last = previous[last]
+    return path[::-1], total
+
+
+def run_stages(
+    stages, jobs=1, initializer=None, initargs=(), results=None, on_result=None
+):
+    """
+    Run the stages, respecting their dependencies. With jobs > 1, stages
+    whose dependencies are met are started in a pool of worker processes as
+    soon as possible.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        The stages to run. When jobs is 1 they run in this order, so it should
+        list dependencies first.
+    jobs : int, optional
+        Number of worker processes, by default 1 (run everything serially in
+        this process).
+    initializer : function, optional
+        Called with initargs when each worker process starts, e.g. to make the
+        parent's model config active in the worker.
+    initargs : tuple, optional
+        Arguments for initializer.
+    results : dict, optional
+        Results that are already available (e.g. loaded from an earlier
+        build), keyed by stage name. Stages may depend on these without
+        listing a stage for them.
+    on_result : function, optional
+        Called in this process as on_result(name, result) when each stage
+        finishes, e.g. to store the result.
+
+    Returns
+    -------
+    tuple
+        (dictionary of results keyed by stage name, dictionary of run times in
+        seconds keyed by stage name)
+    """
+    results = dict(results) if results else {}
+    _check_graph(stages, results)
+    timings = {}
+    pending = list(stages)
+    running = {}
+    wall_start = time.perf_counter()
+
+    def ready():
+        return [s for s in pending if all(d in results for d in s.deps)]
+
+    def start(stage, executor):
+        pending.remove(stage)
+        args = [results[d] for d in stage.deps]
+        if executor is None or stage.in_parent:
+            module_logger.info(f"Running stage {stage.name}")
+            results[stage.name], timings[stage.name] = _run_stage(
+                stage.func, args, stage.kwargs
+            )
+            if on_result is not None:
+                on_result(stage.name, results[stage.name])
+        else:
+            module_logger.info(f"Starting stage {stage.name} in a worker")
+            future = executor.submit(
+                _run_stage_in_worker, stage.func, args, stage.kwargs
+            )
+            running[future] = stage.name
+
+    def collect(done):
+        from electricitylci.instrumentation import add_records
+
+        for future in done:
+            name = running.pop(future)
+            results[name], timings[name], records = future.result()
+            add_records(records)
+            module_logger.info(f"Finished stage {name} ({timings[name]:.1f} s)")
+            if on_result is not None:
+                on_result(name, results[name])
+
+    if jobs <= 1:
+        while pending:
+            to_start = ready()
+            if not to_start:
+                raise ValueError(
+                    f"Stages {[s.name for s in pending]} can't be scheduled"
+                )
+            start(to_start[0], None)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=initializer, initargs=initargs
+        ) as executor:
+            while pending or running:
+                # Submit the worker stages first so they are busy while a
+                # parent stage runs.
+                for stage in sorted(ready(), key=lambda s: s.in_parent):
+                    start(stage, executor)
+                    if stage.in_parent:
+                        # New results, so re-check what is ready.
+                        break
+                if ready():
+                    continue
+                if running:
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    collect(done)
+                elif pending:
+                    raise ValueError(
+                        f"Stages {[s.name for s in pending]} can't be scheduled"
+                    )
+    path, path_time = critical_path(stages, timings)
+    module_logger.info(
+        f"Ran {len(timings)} stages in {time.perf_counter() - wall_start:.1f} s "
+        f"with {jobs} job(s)"
+    )
+    module_logger.info(
+        f"Critical path ({path_time:.1f} s): {' -> '.join(path)}"
+    )
+    return results, timings
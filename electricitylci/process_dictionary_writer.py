@@ -10,10 +10,7 @@ from electricitylci.globals import (
     electricity_flow_name_generation_and_distribution,
     electricity_flow_name_consumption,
 )
-from electricitylci.model_config import egrid_year
-from electricitylci.egrid_facilities import egrid_subregions
-
-year = egrid_year
+from electricitylci import model_config
 
 # Read in general metadata to be used by all processes
 metadata = pd.read_csv(join(data_dir, "metadata.csv"))
@@ -137,10 +134,13 @@ def con_process_ref(reg, ref_type="generation"):
     # If not, if the region is an egrid regions, its a generation mix process; otherwise its a surplus pool process
     if ref_type == "consumption":
         name = consumption_mix_name +" - "+reg
-    elif reg in egrid_subregions:
-        name = generation_mix_name +" - "+reg
     else:
-        name = surplus_pool_name + " - "+reg
+        from electricitylci.egrid_facilities import egrid_subregions
+
+        if reg in egrid_subregions:
+            name = generation_mix_name +" - "+reg
+        else:
+            name = surplus_pool_name + " - "+reg
     processref = dict()
     processref["name"] = name
     processref["location"] = reg
@@ -192,7 +192,7 @@ def exchange_table_creation_input_con_mix(
     ar["unit"] = unit("MWh")
     ar["pedigreeUncertainty"] = ""
     ar["uncertainty"] = ""
-    ar["comment"] = "eGRID " + str(year) + ". From " + loc
+    ar["comment"] = "eGRID " + str(model_config.egrid_year) + ". From " + loc
     # ar['location'] = location(loc)
     return ar
 
@@ -270,7 +270,6 @@ def location(region):
 
 def process_doc_creation():
 
-    global year
     ar = dict()
     ar["timeDescription"] = ""
     ar["validUntil"] = "12/31/2018"
@@ -402,9 +401,10 @@ def uncertainty_table_creation(data):
 
     ar = dict()
     #    print(data["GeomMean"].iloc[0] + ' - ' +data["GeomSD"].iloc[0])
-    if data["GeomMean"].iloc[0] is not None:
+    # Missing parameters are None or NaN
+    if pd.notna(data["GeomMean"].iloc[0]):
         ar["geomMean"] = str(float(data["GeomMean"].iloc[0]))
-    if data["GeomSD"].iloc[0] is not None:
+    if pd.notna(data["GeomSD"].iloc[0]):
         ar["geomSd"] = str(float(data["GeomSD"].iloc[0]))
     ar["distributionType"] = "Logarithmic Normal Distribution"
     ar["mean"] = ""
@@ -72,7 +72,7 @@ def uncertainty(db,mean_gen,total_gen,total_facility_considered):
         ef = compilation(db,total_gen)
         
         #Endpoints of the range that contains alpha percent of the distribution
-        pi1,pi2 = t.interval(alpha = 0.90,df = l-2, loc = mean, scale = sd)
+        pi1,pi2 = t.interval(0.90, l-2, loc = mean, scale = sd)
         #Converting prediction interval to emission factors
         pi2 = pi2/mean_gen
         pi1 = pi1/mean_gen
@@ -139,3 +139,166 @@ def max_min(db,mean_gen,total_gen,total_facility_considered):
         minimum = (data.iloc[:,1]/data.iloc[:,0]).min();
         
         return minimum,maximum
+
+
+#Group-wise versions of compilation, uncertainty and max_min. The rows of all
+#groups are sorted by group and each group is reduced over its slice of the
+#sorted arrays, instead of calling the functions once per group.
+def _group_slices(group_ids, groups_index):
+        #Order of the rows sorted by group, position of the group of each
+        #sorted row, number of rows and start of the slice of each group
+        positions = groups_index.get_indexer(group_ids)
+        if (positions < 0).any():
+            raise ValueError("db has group ids that are not in the groups")
+        order = np.argsort(positions, kind="stable")
+        positions = positions[order]
+        count = np.bincount(positions, minlength=len(groups_index))
+        starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+        return order, positions, count, starts
+
+
+def _reduce_groups(ufunc, values, count, starts):
+        #ufunc reduced over the slice of each group, NaN for groups without rows
+        result = np.full(len(count), np.nan)
+        nonempty = count > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(values, starts[nonempty])
+        return result
+
+
+def _group_arrays(db, groups_index):
+        order, positions, count, starts = _group_slices(
+            db["group_id"].values, groups_index
+        )
+        electricity = db["Electricity"].values.astype(float)[order]
+        flow_amount = db["FlowAmount"].values.astype(float)[order]
+        return electricity, flow_amount, positions, count, starts
+
+
+def _compilation(electricity, flow_amount, count, starts, total_gen):
+        complete = ~np.isnan(flow_amount) & ~np.isnan(electricity)
+        ef1 = _reduce_groups(
+            np.add, np.where(np.isnan(flow_amount), 0, flow_amount), count, starts
+        )/total_gen
+        ef2 = _reduce_groups(
+            np.add, np.where(complete, flow_amount, 0), count, starts
+        )/total_gen
+        any_complete = _reduce_groups(np.add, complete, count, starts) > 0
+        weight = total_gen/total_gen
+        return np.where(any_complete, ef2*weight + (1-weight)*ef1, ef1)
+
+
+def compilation_by_group(db, total_gen):
+        """
+        Emission factors of many groups at once, as compilation computes them
+        for one.
+
+        Parameters
+        ----------
+        db : dataframe
+            group_id, Electricity and FlowAmount of the facilities of each
+            group.
+        total_gen : series
+            Total generation of each group, indexed by group id.
+
+        Returns
+        -------
+        series
+            Emission factor of each group, indexed like total_gen.
+        """
+        electricity, flow_amount, _, count, starts = _group_arrays(
+            db, total_gen.index
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ef = _compilation(
+                electricity, flow_amount, count, starts,
+                total_gen.values.astype(float)
+            )
+        return pd.Series(ef, index=total_gen.index)
+
+
+def uncertainty_by_group(db, groups):
+        """
+        Lognormal distribution parameters and the smallest and largest
+        emission factor of many groups at once, as uncertainty and max_min
+        compute them for one. Each group is padded with zero flows up to its
+        number of facilities, as in uncertainty.
+
+        Parameters
+        ----------
+        db : dataframe
+            group_id, Electricity and FlowAmount of the facilities of each
+            group.
+        groups : dataframe
+            Indexed by group id: mean_gen, total_gen and
+            total_facility_considered of each group, as passed to
+            uncertainty.
+
+        Returns
+        -------
+        dataframe
+            Indexed like groups: count (number of rows in db), minimum and
+            maximum (see max_min), fitted (False where uncertainty returns
+            None), log_mean and log_sd (NaN where not fitted).
+        """
+        electricity, flow_amount, positions, count, starts = _group_arrays(
+            db, groups.index
+        )
+        mean_gen = groups["mean_gen"].values.astype(float)
+        total_gen = groups["total_gen"].values.astype(float)
+        padding = np.maximum(
+            groups["total_facility_considered"].values.astype(int) - count, 0
+        )
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            ratio = flow_amount/electricity
+            minimum = _reduce_groups(np.fmin, ratio, count, starts)
+            maximum = _reduce_groups(np.fmax, ratio, count, starts)
+
+            #Mean and population standard deviation of the flows, skipping
+            #missing ones, with the padding zeros
+            l = count + padding
+            reported = ~np.isnan(flow_amount)
+            n = _reduce_groups(np.add, reported, count, starts) + padding
+            mean = _reduce_groups(
+                np.add, np.where(reported, flow_amount, 0), count, starts
+            )/n
+            squares = _reduce_groups(
+                np.add,
+                np.where(reported, (flow_amount - mean[positions])**2, 0),
+                count, starts,
+            ) + padding*mean**2
+            sd = np.sqrt(squares/n)/np.sqrt(l)
+            ef = _compilation(electricity, flow_amount, count, starts, total_gen)
+
+            #Upper end of the 90% interval, NaN where scipy rejects the scale
+            #or the degrees of freedom
+            upper = t.ppf(0.95, l - 2)*sd + mean
+            upper = np.where((sd > 0) & (l > 2), upper, np.nan)
+            pi2 = upper/mean_gen
+            pi3 = (pi2 - ef)/ef
+            fitted = ~np.isnan(pi3)
+
+            #Smaller root of 0.5*x*x + b*x + log(1+pi3). uncertainty solves
+            #the equation with b = -1.36*sqrt(2) with sympy beyond 2.8, where
+            #the roots can be complex; those groups aren't fitted.
+            small = pi3 < 2.8
+            a = 0.5
+            b = np.where(small, -(1.16308*np.sqrt(2)), -(1.36*np.sqrt(2)))
+            c = np.log(1 + pi3)
+            discriminant = b**2 - (4*a*c)
+            fitted &= small | (discriminant >= 0)
+            sd1 = (-b + np.sqrt(discriminant))/(2*a)
+            sd2 = (-b - np.sqrt(discriminant))/(2*a)
+            log_sd = np.where(sd1 < sd2, sd1, sd2)
+            log_mean = np.log(ef) - 0.5*(log_sd**2)
+        return pd.DataFrame(
+            {
+                "count": count,
+                "minimum": minimum,
+                "maximum": maximum,
+                "fitted": fitted,
+                "log_mean": np.where(fitted, np.round(log_mean, 12), np.nan),
+                "log_sd": np.where(fitted, np.round(log_sd, 12), np.nan),
+            },
+            index=groups.index,
+        )
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Categorical dtypes for the repeated string columns of the facility emissions
+frames.
+
+The frames built by alt_generation.create_generation_process_df and
+get_alternate_gen_plus_netl repeat a few thousand distinct flow names,
+compartments, fuel categories, sources, regions and flow UUIDs over millions
+of rows. As pandas categoricals each value is stored as a small integer code
+into the list of categories, which takes a fraction of the memory of the
+Python strings and lets merges and groupbys work on the codes.
+
+Frames keep a categorical column when they are concatenated or merged only if
+they have the same categories for it. The categories of each column are
+therefore shared by all frames of a process: they are the union of all the
+values converted so far, sorted and ordered so that sort_values and groupby
+order the rows the same way as for string columns (groupby doesn't sort the
+groups of unordered categoricals when observed=True). concat_categorical
+brings frames to the shared categories before concatenating them.
+
+Groupbys on these columns must pass observed=True, otherwise pandas returns a
+row for every combination of categories.
+"""
+import logging
+
+import pandas as pd
+
+module_logger = logging.getLogger("schema.py")
+
+CATEGORICAL_COLUMNS = [
+    "FlowName",
+    "Compartment",
+    "Compartment_path",
+    "FuelCategory",
+    "Source",
+    "stage_code",
+    "Balancing Authority Name",
+    "FERC_Region",
+    "EIA_Region",
+    "FlowUUID",
+]
+
+# Column name -> sorted categories of all values converted in this process
+_categories = {}
+
+
+def _values(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories
+    return pd.unique(series.dropna())
+
+
+def _update_categories(column, values):
+    """Add values to the shared categories of column and return them."""
+    known = _categories.get(column, [])
+    new = set(values).difference(known)
+    if new:
+        # Sorting by the string keeps mixed types (e.g. a numeric code among
+        # names) from failing; for strings it's the usual order.
+        _categories[column] = sorted(new.union(known), key=str)
+    return _categories.get(column, known)
+
+
+def _with_categories(series, categories):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if series.cat.ordered and list(series.cat.categories) == list(
+            categories
+        ):
+            return series
+        return series.cat.set_categories(categories, ordered=True)
+    return pd.Series(
+        pd.Categorical(series, categories=categories, ordered=True),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def to_categorical(df, columns=None):
+    """
+    Convert string columns of df to categoricals with the shared categories.
+
+    Parameters
+    ----------
+    df : dataframe
+        Modified in place.
+    columns : list, optional
+        Columns to convert, by default CATEGORICAL_COLUMNS. Columns that
+        aren't in df are skipped.
+
+    Returns
+    -------
+    dataframe
+        df
+    """
+    if columns is None:
+        columns = CATEGORICAL_COLUMNS
+    for col in columns:
+        if col in df.columns:
+            categories = _update_categories(col, _values(df[col]))
+            df[col] = _with_categories(df[col], categories)
+    return df
+
+
+def add_categories(series, values):
+    """
+    Add values to the categories of a categorical series, so that they can
+    be assigned to it or used in fillna. Other series are returned as they
+    are.
+
+    Parameters
+    ----------
+    series : series
+    values : list
+
+    Returns
+    -------
+    series
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    categories = _update_categories(
+        series.name, list(series.cat.categories) + list(values)
+    )
+    return _with_categories(series, categories)
+
+
+def concat_categorical(frames, columns=None, **kwargs):
+    """
+    Concatenate dataframes with pd.concat, keeping the categorical columns
+    categorical.
+
+    Parameters
+    ----------
+    frames : list of dataframes
+        Not modified.
+    columns : list, optional
+        Columns to make categorical, by default CATEGORICAL_COLUMNS.
+    **kwargs
+        Passed to pd.concat.
+
+    Returns
+    -------
+    dataframe
+    """
+    if columns is None:
+        columns = CATEGORICAL_COLUMNS
+    frames = [df for df in frames if df is not None]
+    present = [c for c in columns if any(c in df.columns for df in frames)]
+    # All values first, so that every frame gets the final categories
+    for col in present:
+        for df in frames:
+            if col in df.columns:
+                _update_categories(col, _values(df[col]))
+    converted = []
+    for df in frames:
+        df = df.copy(deep=False)
+        for col in present:
+            if col in df.columns:
+                df[col] = _with_categories(df[col], _categories.get(col, []))
+        converted.append(df)
+    return pd.concat(converted, **kwargs)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Source datasets (EIA-923, EIA-860, CEMS, stewi/stewicombo inventories) that
+can be shared between the processes of a batch build.
+
+Loaders decorated with shared_source behave as before unless a copy of their
+result has been registered with share_sources. The batch builder (see
+batch.py) loads each distinct (dataset, arguments) pair once, writes it to an
+uncompressed Arrow file and registers the files in every worker process.
+Workers then read the Arrow files instead of parsing the Excel/CSV sources
+again. Converting the Arrow table to a dataframe copies it, so each worker
+still holds its own copy of the data; what is shared is the loading work.
+
+Loaders that are also memoized with lru_cache must have lru_cache as the
+outer decorator, so that the file is read only on the first call.
+"""
+import logging
+import os
+from functools import wraps
+from os.path import join
+
+from electricitylci.globals import output_dir, set_dir
+
+module_logger = logging.getLogger("source_data.py")
+
+shared_source_dir = join(output_dir, "batch_sources")
+
+# (dataset name, arguments key) -> path of the shared Arrow file
+_shared_files = {}
+
+
+def source_key(name, args, kwargs=None):
+    """
+    Build the registry key for a call to a source loader.
+
+    Parameters
+    ----------
+    name : str
+        Dataset name given to shared_source.
+    args : tuple
+        Positional arguments of the call (usually just the year).
+    kwargs : dict, optional
+        Keyword arguments of the call.
+
+    Returns
+    -------
+    tuple
+    """
+    kwargs = kwargs or {}
+    return (name, repr(tuple(str(a) for a in args)), repr(sorted(kwargs.items())))
+
+
+def write_shared_frame(df, path):
+    """
+    Write a dataframe to an uncompressed Arrow (feather) file that can be
+    memory-mapped by other processes. Returns False if the frame can't be
+    represented in Arrow, e.g. because a column mixes strings and numbers.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    set_dir(os.path.dirname(path))
+    try:
+        feather.write_feather(df, path, compression="uncompressed")
+    except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError, TypeError) as e:
+        module_logger.warning(f"Can't share {os.path.basename(path)}: {e}")
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    return True
+
+
+def read_shared_frame(path, start=None, stop=None):
+    """
+    Memory-map a file written by write_shared_frame and return a dataframe.
+    With start and stop, only those rows are converted to the dataframe.
+    The dataframe is a copy of the data in the file, so every process that
+    reads the file holds its own copy in memory.
+    """
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=True)
+    if start is not None or stop is not None:
+        start = start or 0
+        stop = table.num_rows if stop is None else stop
+        table = table.slice(start, stop - start)
+    return table.to_pandas()
+
+
+def share_sources(shared_files):
+    """
+    Register shared copies of source datasets in this process.
+
+    Parameters
+    ----------
+    shared_files : dict
+        Arrow file paths keyed by source_key.
+    """
+    _shared_files.update(shared_files)
+
+
+def clear_shared_sources():
+    _shared_files.clear()
+
+
+def shared_source(name):
+    """
+    Decorator for source data loaders that return a dataframe. When a shared
+    copy of the result has been registered, it is read from the Arrow file
+    rather than loaded again. Apply it inside lru_cache, if any.
+
+    Parameters
+    ----------
+    name : str
+        Name of the dataset, e.g. "eia923_boiler_fuel".
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            path = _shared_files.get(source_key(name, args, kwargs))
+            if path is not None and os.path.exists(path):
+                module_logger.info(f"Using shared copy of {name} {args}")
+                return read_shared_frame(path)
+            return func(*args, **kwargs)
+
+        wrapper.source_name = name
+        return wrapper
+
+    return decorator
+
+
+def load_and_share(loader, args):
+    """
+    Call a shared_source loader and write the result to a shared Arrow file.
+    Used by the batch builder, in a worker process.
+
+    Parameters
+    ----------
+    loader : function
+        A function decorated with shared_source.
+    args : tuple
+        Arguments for loader.
+
+    Returns
+    -------
+    tuple
+        (source_key, path), path is None if the result can't be shared.
+    """
+    from electricitylci.stage_cache import hash_object
+
+    key = source_key(loader.source_name, args)
+    path = join(
+        shared_source_dir, f"{loader.source_name}_{hash_object(key)[:16]}.arrow"
+    )
+    df = loader(*args)
+    if not write_shared_frame(df, path):
+        path = None
+    return key, path
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache for the pipeline stages in electricitylci/__init__.py.
+
+Each cached stage is keyed by a hash of its source code and of the source of
+the whole electricitylci package (a stage's wrapper in __init__.py mostly
+calls into other modules, so any code change invalidates every stage), its
+arguments, the model_specs entries it reads and the fingerprints (size and
+modification time) of the source data files it depends on. Files the pipeline writes into the
+data folder itself (the CEMS Parquet dataset, download bookkeeping, partial
+downloads) aren't source data and are never fingerprinted, and the raw CEMS
+downloads only count for the stages that declare CEMS_DATA_FILES. DataFrame results are stored as
+Parquet; anything that can't be represented as Parquet (process dictionaries,
+frames with list/dict cells) is pickled. An unchanged stage is loaded from
+the cache rather than rebuilt, and changing a config key only changes the keys
+of the stages that declare it - or that receive a changed result as input.
+
+The cache is enabled with the "use_stage_cache" parameter in the model
+config file.
+"""
+import fnmatch
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+from functools import lru_cache, wraps
+from os.path import join
+
+import pandas as pd
+
+from electricitylci.globals import output_dir, data_dir, modulepath, set_dir
+
+module_logger = logging.getLogger("stage_cache.py")
+
+stage_cache_dir = join(output_dir, "stage_cache")
+
+# Every file in the data folder, including downloaded EIA data, but not the
+# CEMS downloads (see CEMS_DATA_FILES) or the GENERATED_DATA_FILES.
+ALL_DATA_FILES = ("**/*",)
+
+# The quarterly CEMS zip files, for the stages that read them. They are
+# several thousand files per year, added to by cems_data.download.
+CEMS_DATA_FILES = ("epacems[0-9]*/*",)
+
+# Files written to the data folder while building a model: caches derived
+# from other data files (cems_data.convert_cems_files), download bookkeeping
+# and partial downloads. fnmatch patterns on the path relative to the data
+# folder, where * also matches "/".
+GENERATED_DATA_FILES = (
+    "epacems_parquet/*",
+    "tmp/*",
+    "download_manifest.json",
+    "*.part",
+    "*.tmp",
+)
+
+
+def cache_enabled():
+    """Return True if the model config turns on the stage cache."""
+    from electricitylci.model_config import model_specs
+
+    return bool(model_specs.get("use_stage_cache", False))
+
+
+def _update_hash(hasher, obj):
+    """Recursively feed a python object into a hashlib hasher.
+
+    DataFrames and Series are hashed by value with pandas' own hashing, which
+    is much faster than pickling large frames. Cells that can't be hashed by
+    pandas (lists, dicts) fall back to hashing the pickled frame.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        hasher.update(type(obj).__name__.encode())
+        if isinstance(obj, pd.DataFrame):
+            hasher.update(repr(list(obj.columns)).encode())
+            hasher.update(repr(list(obj.dtypes.astype(str))).encode())
+        else:
+            hasher.update(repr((obj.name, str(obj.dtype))).encode())
+        try:
+            hasher.update(
+                pd.util.hash_pandas_object(obj, index=True).values.tobytes()
+            )
+        except TypeError:
+            hasher.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    elif isinstance(obj, dict):
+        hasher.update(b"dict")
+        for key in sorted(obj.keys(), key=repr):
+            _update_hash(hasher, key)
+            _update_hash(hasher, obj[key])
+    elif isinstance(obj, (list, tuple, set)):
+        hasher.update(type(obj).__name__.encode())
+        items = sorted(obj, key=repr) if isinstance(obj, set) else obj
+        for item in items:
+            _update_hash(hasher, item)
+    else:
+        hasher.update(repr(obj).encode())
+
+
+def hash_object(obj):
+    """Return a hex digest identifying the contents of obj."""
+    hasher = hashlib.sha256()
+    _update_hash(hasher, obj)
+    return hasher.hexdigest()
+
+
+def fingerprint_data_files(patterns=ALL_DATA_FILES):
+    """
+    Fingerprint the source data files matching the glob patterns (relative to
+    the data folder) using their relative path, size, and modification time.
+    GENERATED_DATA_FILES are skipped, and so are the CEMS downloads unless
+    CEMS_DATA_FILES is one of the patterns.
+
+    Parameters
+    ----------
+    patterns : iterable of str, optional
+        Glob patterns relative to data_dir, by default every file.
+
+    Returns
+    -------
+    str
+        Hex digest of the fingerprints.
+    """
+    skipped = GENERATED_DATA_FILES
+    if not set(CEMS_DATA_FILES).intersection(patterns):
+        skipped = skipped + CEMS_DATA_FILES
+    fingerprints = []
+    for pattern in patterns:
+        for path in glob.glob(join(data_dir, pattern), recursive=True):
+            relpath = os.path.relpath(path, data_dir).replace(os.sep, "/")
+            if any(fnmatch.fnmatch(relpath, p) for p in skipped):
+                continue
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            fingerprints.append((relpath, stat.st_size, stat.st_mtime_ns))
+    return hash_object(sorted(set(fingerprints)))
+
+
+@lru_cache(maxsize=None)
+def package_source_hash():
+    """
+    Hex digest of the source of every module of the electricitylci package,
+    computed once per process.
+    """
+    hasher = hashlib.sha256()
+    skipped = {"output", "data", "__pycache__"}
+    for root, dirs, files in os.walk(modulepath):
+        dirs[:] = sorted(d for d in dirs if d not in skipped)
+        for fn in sorted(files):
+            if fn.endswith(".py"):
+                path = join(root, fn)
+                hasher.update(os.path.relpath(path, modulepath).encode())
+                with open(path, "rb") as f:
+                    hasher.update(hashlib.sha256(f.read()).digest())
+    return hasher.hexdigest()
+
+
+def stage_key(func, args, kwargs, config_keys=(), data_files=ALL_DATA_FILES):
+    """
+    Build the cache key for a call to a stage function.
+
+    Parameters
+    ----------
+    func : function
+        The undecorated stage function.
+    args : tuple
+        Positional arguments for the call.
+    kwargs : dict
+        Keyword arguments for the call.
+    config_keys : iterable of str, optional
+        The model_specs entries read by the stage.
+    data_files : iterable of str, optional
+        Glob patterns for the source data files read by the stage.
+
+    Returns
+    -------
+    str
+    """
+    from electricitylci.model_config import model_specs
+
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = func.__qualname__
+    config = {k: model_specs.get(k) for k in config_keys}
+    return hash_object(
+        [
+            func.__module__,
+            func.__qualname__,
+            source,
+            package_source_hash(),
+            args,
+            kwargs,
+            config,
+            fingerprint_data_files(data_files),
+        ]
+    )
+
+
+def _save_part(obj, path_base):
+    """Save one object, as Parquet if possible, and return the file name."""
+    if isinstance(obj, pd.DataFrame):
+        try:
+            obj.to_parquet(path_base + ".parquet")
+            return os.path.basename(path_base) + ".parquet"
+        except (ImportError, ValueError, TypeError, NotImplementedError) as e:
+            module_logger.debug(
+                f"Could not store {path_base} as parquet, pickling instead: {e}"
+            )
+            if os.path.exists(path_base + ".parquet"):
+                os.remove(path_base + ".parquet")
+    with open(path_base + ".pkl", "wb") as handle:
+        pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    return os.path.basename(path_base) + ".pkl"
+
+
+def _load_part(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
+
+
+def save_result(result, folder, name):
+    """
+    Store a stage result in folder. Tuples (e.g. the two dataframes returned
+    by combine_upstream_and_gen_df) are stored one element per file. A small
+    json manifest records the files so the result can be read back with
+    load_result.
+
+    Parameters
+    ----------
+    result : object
+        Stage result - dataframe, dictionary, or tuple of these.
+    folder : str
+        Folder to write to. Created if necessary.
+    name : str
+        Base name for the stored files.
+    """
+    set_dir(folder)
+    is_tuple = isinstance(result, tuple)
+    parts = result if is_tuple else (result,)
+    files = [
+        _save_part(part, join(folder, f"{name}_{i}"))
+        for i, part in enumerate(parts)
+    ]
+    manifest = {"tuple": is_tuple, "files": files}
+    # The manifest is written last so that a partially written result is
+    # never picked up.
+    with open(join(folder, f"{name}.json"), "w") as f:
+        json.dump(manifest, f)
+
+
+def write_json(path, obj):
+    """Write obj as json, replacing an existing file only once it's complete."""
+    with open(path + ".tmp", "w") as f:
+        json.dump(obj, f, indent=2, default=str)
+    os.replace(path + ".tmp", path)
+
+
+def has_result(folder, name):
+    return os.path.exists(join(folder, f"{name}.json"))
+
+
+def load_result(folder, name):
+    """Read a result stored with save_result."""
+    with open(join(folder, f"{name}.json"), "r") as f:
+        manifest = json.load(f)
+    parts = [_load_part(join(folder, fn)) for fn in manifest["files"]]
+    if manifest["tuple"]:
+        return tuple(parts)
+    return parts[0]
+
+
+def cached_stage(config_keys=(), data_files=ALL_DATA_FILES):
+    """
+    Decorator that stores and reuses the result of a pipeline stage.
+
+    Parameters
+    ----------
+    config_keys : iterable of str, optional
+        The model_specs entries the stage reads, directly or through the
+        modules it calls.
+    data_files : iterable of str, optional
+        Glob patterns (relative to the data folder) for the source data files
+        the stage reads, by default ALL_DATA_FILES. Stages that read CEMS data
+        add CEMS_DATA_FILES.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not cache_enabled():
+                return func(*args, **kwargs)
+            key = stage_key(func, args, kwargs, config_keys, data_files)
+            folder = join(stage_cache_dir, func.__name__)
+            if has_result(folder, key):
+                module_logger.info(f"Loading {func.__name__} from stage cache")
+                try:
+                    return load_result(folder, key)
+                except (OSError, ValueError, pickle.UnpicklingError) as e:
+                    module_logger.warning(
+                        f"Could not read cached {func.__name__} ({e}), rebuilding"
+                    )
+            result = func(*args, **kwargs)
+            save_result(result, folder, key)
+            return result
+
+        wrapper.config_keys = list(config_keys)
+        wrapper.data_files = list(data_files)
+        return wrapper
+
+    return decorator
+
+
+def reads_config(config_keys, data_files=ALL_DATA_FILES):
+    """
+    Decorator that declares the model_specs entries and source data files
+    read by a stage that isn't cached, for incremental builds (see
+    incremental.py). Cached stages declare them with cached_stage.
+
+    Parameters
+    ----------
+    config_keys : iterable of str
+        The model_specs entries the stage reads, directly or through the
+        modules it calls.
+    data_files : iterable of str, optional
+        Glob patterns for the source data files the stage reads, see
+        cached_stage.
+    """
+
+    def decorator(func):
+        func.config_keys = list(config_keys)
+        func.data_files = list(data_files)
+        return func
+
+    return decorator
+
+
+def clear_stage_cache(stage=None):
+    """
+    Remove cached results, either for a single stage or for all stages.
+
+    Parameters
+    ----------
+    stage : str, optional
+        Name of the stage function, by default None (clear everything)
+    """
+    import shutil
+
+    folder = stage_cache_dir if stage is None else join(stage_cache_dir, stage)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
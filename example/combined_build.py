@@ -89,4 +89,6 @@ else:
     with open("dist_mix_dict.pickle", "wb") as handle:
         pkl.dump(dist_mix_dict, handle, protocol=pkl.HIGHEST_PROTOCOL)
     
-    
\ No newline at end of file
+    
+# Writes the stage timings if record_stage_metrics is on in the model config
+electricitylci.instrumentation.write_report()
@@ -20,6 +20,7 @@ setup(
         'sympy>=1.2',
         'xlrd>=1.1',
         'pyyaml>=5.1',
+        'pyarrow>=0.15',
         ],
     long_description = open('README.md').read(),
     classifiers = [